@@ -13,3 +13,4 @@
 # limitations under the License.
 
 from .app import EMBEDDING_MODEL_NAME, init_app, parse_config
+from .embeddings import create_embeddings, parse_backend
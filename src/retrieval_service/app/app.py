@@ -12,19 +12,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 from contextlib import asynccontextmanager
 from ipaddress import IPv4Address, IPv6Address
-from typing import Optional
-import os
+from typing import Any, Optional
 
 import yaml
 from fastapi import FastAPI
-from langchain_google_vertexai import VertexAIEmbeddings
 from pydantic import BaseModel
 
 import datastore
+from datastore import cache as datastore_cache
 
+from . import embeddings, metrics
 from .routes import routes
+from .server_timing import ServerTimingMiddleware
 
 EMBEDDING_MODEL_NAME = "text-embedding-004"
 
@@ -33,11 +35,14 @@ class AppConfig(BaseModel):
     host: IPv4Address | IPv6Address = IPv4Address("127.0.0.1")
     port: int = 8080
     datastore: datastore.Config
+    cache: Optional[datastore_cache.Config] = None
+    embedding_backend: embeddings.Backend = "vertexai"
+    embedding_cache: embeddings.CacheConfig = embeddings.CacheConfig()
     clientId: Optional[str] = None
 
 
 def parse_config(path: str) -> AppConfig:
-    config = {}
+    config: dict[str, Any] = {}
     config["host"] = os.environ.get("APP_HOST", "127.0.0.1")
     config["port"] = os.environ.get("APP_PORT", 8080)
     config["datastore"] = {}
@@ -48,6 +53,13 @@ def parse_config(path: str) -> AppConfig:
     config["datastore"]["database"] = os.environ.get("DB_NAME", "assistantdemo")
     config["datastore"]["user"] = os.environ.get("DB_USER", "postgres")
     config["datastore"]["password"] = os.environ.get("DB_PASSWORD", "password")
+    if os.environ.get("DATASTORE_CACHE", "false").lower() == "true":
+        config["cache"] = {}
+    config["embedding_backend"] = embeddings.parse_backend(
+        os.environ.get("EMBEDDING_BACKEND", "vertexai")
+    )
+    if "EMBEDDING_CACHE_PATH" in os.environ:
+        config["embedding_cache"] = {"path": os.environ["EMBEDDING_CACHE_PATH"]}
 
     return AppConfig(**config)
 
@@ -55,9 +67,35 @@ def parse_config(path: str) -> AppConfig:
 # gen_init is a wrapper to initialize the datastore during app startup
 def gen_init(cfg: AppConfig):
     async def initialize_datastore(app: FastAPI):
-        app.state.datastore = await datastore.create(cfg.datastore)
-        app.state.embed_service = VertexAIEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        registry: metrics.Registry = app.state.metrics
+        ds = await datastore.create(cfg.datastore, cfg.cache)
+        app.state.datastore = metrics.instrument_datastore(
+            ds, cfg.datastore.kind, registry
+        )
+        # Statistics kept by the providers that have them
+        for prefix, name in (
+            ("datastore_pool", "pool_stats"),
+            ("datastore_statements", "statement_stats"),
+            ("datastore_cache", "cache_stats"),
+        ):
+            collect = getattr(ds, name, None)
+            if collect is not None:
+                registry.add_collector(prefix, collect)
+
+        embed_service = embeddings.create_embeddings(
+            cfg.embedding_backend, EMBEDDING_MODEL_NAME
+        )
+        batching = embeddings.BatchingEmbeddings(embed_service)
+        cached = embeddings.CachedEmbeddings(
+            batching,
+            getattr(embed_service, "model_name", EMBEDDING_MODEL_NAME),
+            cfg.embedding_cache,
+        )
+        registry.add_collector("embedding_batch", batching.stats)
+        registry.add_collector("embedding_cache", cached.stats)
+        app.state.embed_service = metrics.instrument_embeddings(cached, registry)
         yield
+        await app.state.embed_service.close()
         await app.state.datastore.close()
 
     return asynccontextmanager(initialize_datastore)
@@ -65,6 +103,9 @@ def gen_init(cfg: AppConfig):
 
 def init_app(cfg: AppConfig) -> FastAPI:
     app = FastAPI(lifespan=gen_init(cfg))
+    app.state.metrics = metrics.Registry()
+    app.add_middleware(metrics.MetricsMiddleware, metrics=app.state.metrics)
+    app.add_middleware(ServerTimingMiddleware)
     app.state.client_id = cfg.clientId
     app.include_router(routes)
     return app
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 from datetime import datetime
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -22,12 +23,18 @@ import datastore
 import models
 
 from . import init_app
+from .app import AppConfig
+from .embeddings import CacheConfig
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
 
 
 @pytest.fixture(scope="module")
 def app():
     mock_cfg = MagicMock()
     mock_cfg.clientId = "fake client id"
+    mock_cfg.embedding_backend = "hashing"
+    mock_cfg.embedding_cache = CacheConfig()
     app = init_app(mock_cfg)
     if app is None:
         raise TypeError("app did not initialize")
@@ -417,6 +424,62 @@ def test_amenities_search(m_datastore, app, method_name, params, mock_return, ex
     assert models.Amenity.model_validate(output[0])
 
 
+@patch.object(datastore, "create")
+def test_amenities_search_batch(m_datastore, app):
+    amenity = models.Amenity(
+        id=1,
+        name="foo",
+        description="bar",
+        location="baz",
+        terminal="qux",
+        category="food",
+        hour="all day",
+    )
+    with TestClient(app) as client:
+        with patch.object(
+            m_datastore.return_value,
+            "amenities_search_many",
+            AsyncMock(return_value=[[amenity], []]),
+        ) as mock_method:
+            response = client.post(
+                "/amenities/search/batch",
+                json={"queries": ["coffee", "luxury goods"], "top_k": 1},
+            )
+    assert response.status_code == 200
+    output = response.json()["results"]
+    assert [[a["id"] for a in r] for r in output] == [[1], []]
+    query_embeddings = mock_method.await_args.args[0]
+    assert len(query_embeddings) == 2
+    assert query_embeddings[0] != query_embeddings[1]
+
+
+@pytest.mark.parametrize(
+    "path, method_name",
+    [
+        pytest.param("/amenities/search", "amenities_hybrid_search", id="amenities"),
+        pytest.param("/policies/search", "policies_hybrid_search", id="policies"),
+    ],
+)
+@patch.object(datastore, "create")
+def test_hybrid_search(m_datastore, app, path, method_name):
+    policy = models.Policy(id=1, content="foo bar")
+    with TestClient(app) as client:
+        with patch.object(
+            m_datastore.return_value,
+            method_name,
+            AsyncMock(return_value=[policy]),
+        ) as mock_method:
+            response = client.get(
+                path, params={"query": "foo", "top_k": 1, "mode": "hybrid"}
+            )
+    assert response.status_code == 200
+    # Same keys as the vector mode; fused results have no single query
+    assert response.json() == {"results": [policy.model_dump()], "sql": None}
+    query, embed, similarity_threshold, top_k = mock_method.await_args.args
+    assert (query, similarity_threshold, top_k) == ("foo", 0.5, 1)
+    assert callable(embed)
+
+
 get_flight_params = [
     pytest.param(
         "get_flight",
@@ -783,3 +846,160 @@ def test_policies_search(m_datastore, app, method_name, params, mock_return, exp
     assert len(output) == params["top_k"]
     assert output == expected
     assert models.Policy.model_validate(output[0])
+
+
+batch_params = [
+    pytest.param(
+        "/airports/batch",
+        "get_airports_by_ids",
+        [
+            models.Airport(id=2, iata="FOO", name="foo", city="BAR", country="BAZ"),
+            models.Airport(id=1, iata="BAR", name="bar", city="BAZ", country="FOO"),
+        ],
+        id="airports",
+    ),
+    pytest.param(
+        "/flights/batch",
+        "get_flights_by_ids",
+        [
+            models.Flight(
+                id=2,
+                airline="UA",
+                flight_number="1158",
+                departure_airport="SFO",
+                arrival_airport="ORD",
+                departure_time=datetime(2024, 1, 1, 5, 57),
+                arrival_time=datetime(2024, 1, 1, 12, 13),
+                departure_gate="C38",
+                arrival_gate="D30",
+            ),
+        ],
+        id="flights",
+    ),
+]
+
+
+@pytest.mark.parametrize("path, method_name, mock_return", batch_params)
+@patch.object(datastore, "create")
+def test_batch(m_datastore, app, path, method_name, mock_return):
+    with TestClient(app) as client:
+        with patch.object(
+            m_datastore.return_value,
+            method_name,
+            AsyncMock(return_value=mock_return),
+        ) as mock_method:
+            response = client.post(path, json={"ids": [2, 1]})
+    assert response.status_code == 200
+    output = response.json()["results"]
+    assert [o["id"] for o in output] == [m.id for m in mock_return]
+    mock_method.assert_awaited_once_with([2, 1])
+
+
+@patch.object(datastore, "create")
+def test_batch_too_many_ids(m_datastore, app):
+    with TestClient(app) as client:
+        response = client.post("/airports/batch", json={"ids": list(range(101))})
+    assert response.status_code == 422
+
+
+@patch.object(datastore, "create")
+def test_incremental_import(m_datastore, app):
+    changes = {
+        "airports": datastore.TableChanges(),
+        "amenities": datastore.TableChanges(deleted=[3]),
+        "flights": datastore.TableChanges(inserted=[7], updated=[1, 2]),
+    }
+    with TestClient(app) as client:
+        with patch.object(
+            m_datastore.return_value,
+            "sync_dataset",
+            AsyncMock(return_value=changes),
+        ) as mock_method:
+            response = client.get("/data/import", params={"mode": "incremental"})
+    assert response.status_code == 200
+    output = response.json()["results"]
+    assert output["flights"] == {"inserted": [7], "updated": [1, 2], "deleted": []}
+    assert output["amenities"]["deleted"] == [3]
+    mock_method.assert_awaited_once()
+    m_datastore.return_value.import_dataset.assert_not_called()
+
+
+def test_routes_with_memory_datastore(tmp_path):
+    flights_ds_path = str(tmp_path / "flights_dataset.csv")
+    datastore.save_dataset(
+        flights_ds_path,
+        models.Flight,
+        [
+            models.Flight(
+                id=1,
+                airline="UA",
+                flight_number="1158",
+                departure_airport="SFO",
+                arrival_airport="ORD",
+                departure_time=datetime(2024, 1, 1, 5, 57),
+                arrival_time=datetime(2024, 1, 1, 12, 13),
+                departure_gate="C38",
+                arrival_gate="D30",
+            )
+        ],
+    )
+    cfg = AppConfig(
+        datastore={
+            "kind": "memory",
+            "airports_ds_path": os.path.join(DATA_DIR, "airport_dataset.csv"),
+            "amenities_ds_path": os.path.join(DATA_DIR, "amenity_dataset.csv"),
+            "flights_ds_path": flights_ds_path,
+            "policies_ds_path": os.path.join(DATA_DIR, "cymbalair_policy.csv"),
+        },
+        embedding_backend="hashing",
+    )
+    user_info = {"user_id": "1", "user_name": "foo", "user_email": "foo@bar.com"}
+    flight = {
+        "airline": "UA",
+        "flight_number": "1158",
+        "departure_airport": "SFO",
+        "departure_time": "2024-01-01 05:57:00",
+    }
+    with TestClient(init_app(cfg)) as client, patch(
+        "app.routes.get_user_info", AsyncMock(return_value=user_info)
+    ):
+        for path, params in [
+            ("/airports", {"id": 1}),
+            ("/airports", {"iata": "sfo"}),
+            ("/airports/search", {"city": "san francisco"}),
+            ("/amenities", {"id": 1}),
+            ("/amenities/search", {"query": "coffee", "top_k": 3}),
+            ("/amenities/search", {"query": "coffee", "top_k": 3, "mode": "hybrid"}),
+            ("/flights", {"flight_id": 1}),
+            ("/flights/search", {"airline": "UA", "flight_number": "1158"}),
+            ("/flights/search", {"departure_airport": "SFO", "date": "2024-01-01"}),
+            ("/tickets/validate", flight),
+            ("/policies/search", {"query": "checked bags", "top_k": 3}),
+            (
+                "/policies/search",
+                {"query": "checked bags", "mode": "hybrid", "top_k": 3},
+            ),
+        ]:
+            # Searches may find nothing, as the query embeddings are hashed
+            assert client.get(path, params=params).status_code == 200, path
+
+        response = client.get("/airports", params={"iata": "sfo"})
+        assert response.json() == {
+            "results": {
+                "id": 3270,
+                "iata": "SFO",
+                "name": "San Francisco International Airport",
+                "city": "San Francisco",
+                "country": "United States",
+            },
+            "sql": None,
+        }
+
+        params = flight | {
+            "arrival_airport": "ORD",
+            "arrival_time": "2024-01-01 12:13:00",
+        }
+        assert client.post("/tickets/insert", params=params).status_code == 200
+        response = client.get("/tickets/list")
+    assert response.status_code == 200
+    assert [t["flight_number"] for t in response.json()["results"]] == ["1158"]
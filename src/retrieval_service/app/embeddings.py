@@ -0,0 +1,309 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import hashlib
+import math
+import os
+import re
+import time
+from typing import Literal, Optional, get_args
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_google_vertexai import VertexAIEmbeddings
+from pydantic import BaseModel
+
+from datastore.cache import LRUCache
+
+# Dimensions of the amenities and policies embedding columns
+EMBEDDING_DIMENSIONS = 768
+
+Backend = Literal["vertexai", "hashing"]
+
+
+class CacheConfig(BaseModel):
+    max_entries: int = 4096
+    # Optional .npz file the cache is loaded from and saved to on shutdown
+    path: Optional[str] = None
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic embeddings that need no network or model.
+
+    Words and their character trigrams are hashed into a fixed number of
+    signed buckets and the result is L2-normalized, so texts sharing words
+    get a high cosine similarity. Meant for tests and benchmarks only.
+    """
+
+    model_name: str
+    __dimensions: int
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.model_name = f"hashing-{dimensions}"
+        self.__dimensions = dimensions
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.__embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.__embed(text)
+
+    def __embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.__dimensions, dtype=np.float32)
+        for word in re.findall(r"\w+", normalize_query(text)):
+            padded = f"<{word}>"
+            trigrams = [padded[i : i + 3] for i in range(len(padded) - 2)]
+            self.__add(vector, word, 1.0)
+            for trigram in trigrams:
+                self.__add(vector, trigram, 1.0 / len(trigrams))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def __add(self, vector: np.ndarray, feature: str, weight: float) -> None:
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        h = int.from_bytes(digest, "little")
+        sign = 1.0 if h >> 63 else -1.0
+        vector[h % self.__dimensions] += sign * weight
+
+
+def parse_backend(value: str) -> Backend:
+    """Returns value as a Backend, e.g. from the EMBEDDING_BACKEND variable."""
+    for backend in get_args(Backend):
+        if value == backend:
+            return backend
+    choices = ", ".join(get_args(Backend))
+    raise ValueError(f"Unknown embedding backend '{value}', expected one of: {choices}")
+
+
+def create_embeddings(backend: Backend, model_name: str) -> Embeddings:
+    """Returns the embeddings for backend; model_name is used by Vertex AI."""
+    if backend == "vertexai":
+        return VertexAIEmbeddings(model_name=model_name)
+    if backend == "hashing":
+        return HashingEmbeddings()
+    raise ValueError(f"Unknown embedding backend '{backend}'")
+
+
+class BatchingEmbeddings(Embeddings):
+    """Embeds concurrent queries together, off the event loop.
+
+    aembed_query waits up to max_wait seconds for other queries to arrive,
+    then embeds up to max_batch_size of them with a single call in a worker
+    thread. The synchronous methods go straight to the wrapped embeddings.
+    """
+
+    __embeddings: Embeddings
+    __max_batch_size: int
+    __max_wait: float
+    __queue: Optional[asyncio.Queue]
+    __worker: Optional[asyncio.Task]
+    __batches: set[asyncio.Task]
+    __stats: dict[str, float]
+
+    def __init__(
+        self, embeddings: Embeddings, max_batch_size: int = 32, max_wait: float = 0.005
+    ):
+        self.__embeddings = embeddings
+        self.__max_batch_size = max_batch_size
+        self.__max_wait = max_wait
+        self.__queue = None
+        self.__worker = None
+        self.__batches = set()
+        self.__stats = {
+            "batches": 0,
+            "queries": 0,
+            "max_batch_size": 0,
+            "queue_delay_seconds": 0.0,
+            "max_queue_delay_seconds": 0.0,
+            "embed_seconds": 0.0,
+        }
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.__embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.__embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        if self.__queue is None or self.__worker is None or self.__worker.done():
+            self.__queue = asyncio.Queue()
+            self.__worker = asyncio.create_task(self.__run())
+        future: asyncio.Future[list[float]] = loop.create_future()
+        self.__queue.put_nowait((text, future, loop.time()))
+        return await future
+
+    def stats(self) -> dict[str, float]:
+        """Returns batch counts and sizes, time queued and time embedding."""
+        return dict(self.__stats)
+
+    async def close(self) -> None:
+        if self.__worker is not None:
+            self.__worker.cancel()
+        await asyncio.gather(*self.__batches, return_exceptions=True)
+
+    async def __run(self) -> None:
+        assert self.__queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.__queue.get()]
+            deadline = loop.time() + self.__max_wait
+            while len(batch) < self.__max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.__queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Embed in the background so the next batch can start filling up
+            task = asyncio.create_task(self.__embed_batch(batch))
+            self.__batches.add(task)
+            task.add_done_callback(self.__batches.discard)
+
+    async def __embed_batch(
+        self, batch: list[tuple[str, asyncio.Future, float]]
+    ) -> None:
+        now = asyncio.get_running_loop().time()
+        delays = [now - enqueued_at for _, _, enqueued_at in batch]
+        self.__stats["batches"] += 1
+        self.__stats["queries"] += len(batch)
+        self.__stats["max_batch_size"] = max(self.__stats["max_batch_size"], len(batch))
+        self.__stats["queue_delay_seconds"] += sum(delays)
+        self.__stats["max_queue_delay_seconds"] = max(
+            self.__stats["max_queue_delay_seconds"], *delays
+        )
+
+        texts = [text for text, _, _ in batch]
+        start = time.perf_counter()
+        try:
+            vectors = await asyncio.to_thread(self.__embed_texts, texts)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.__stats["embed_seconds"] += time.perf_counter() - start
+        for (_, future, _), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def __embed_texts(self, texts: list[str]) -> list[list[float]]:
+        # Vertex AI embeds documents and queries differently; keep the query
+        # task type that embed_query would have used.
+        if isinstance(self.__embeddings, VertexAIEmbeddings):
+            return self.__embeddings.embed(
+                texts, embeddings_task_type="RETRIEVAL_QUERY"
+            )
+        return self.__embeddings.embed_documents(texts)
+
+
+class CachedEmbeddings(Embeddings):
+    """Caches query embeddings by model name and normalized query text.
+
+    Document embeddings are not cached. If a path is given, the cache is
+    loaded from it when created and written back to it on close.
+    """
+
+    __embeddings: Embeddings
+    __model_name: str
+    __path: Optional[str]
+    __cache: LRUCache[tuple[str, str], list[float]]
+
+    def __init__(self, embeddings: Embeddings, model_name: str, config: CacheConfig):
+        self.__embeddings = embeddings
+        self.__model_name = model_name
+        self.__path = config.path
+        self.__cache = LRUCache(config.max_entries)
+        if self.__path is not None and os.path.exists(self.__path):
+            self.__load(self.__path)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.__embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = (self.__model_name, normalize_query(text))
+        _, vector = self.__cache.get(key)
+        if vector is None:
+            vector = self.__embeddings.embed_query(text)
+            self.__cache.put(key, vector, math.inf)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = (self.__model_name, normalize_query(text))
+        _, vector = self.__cache.get(key)
+        if vector is None:
+            vector = await self.__embeddings.aembed_query(text)
+            self.__cache.put(key, vector, math.inf)
+        return vector
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Embeds several queries, looking each one up in the cache first.
+
+        The misses are embedded concurrently, so a BatchingEmbeddings below
+        embeds them together in one call.
+        """
+        unique: dict[str, str] = {}
+        for text in texts:
+            unique.setdefault(normalize_query(text), text)
+        vectors = await asyncio.gather(
+            *[self.aembed_query(text) for text in unique.values()]
+        )
+        by_query = dict(zip(unique, vectors))
+        return [by_query[normalize_query(text)] for text in texts]
+
+    def stats(self) -> dict[str, float]:
+        stats: dict[str, float] = dict(self.__cache.stats())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    async def close(self) -> None:
+        if self.__path is not None:
+            await asyncio.to_thread(self.__save, self.__path)
+        close = getattr(self.__embeddings, "close", None)
+        if close is not None:
+            await close()
+
+    def __load(self, path: str) -> None:
+        with np.load(path) as f:
+            if str(f["model_name"]) != self.__model_name:
+                return
+            for text, vector in zip(f["texts"], f["vectors"]):
+                key = (self.__model_name, str(text))
+                self.__cache.put(key, vector.tolist(), math.inf)
+
+    def __save(self, path: str) -> None:
+        items = self.__cache.items()
+        if not items:
+            return
+        # Written to a temporary file first so a crash never leaves a
+        # truncated cache behind.
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                model_name=np.array(self.__model_name),
+                texts=np.array([text for (_, text), _ in items]),
+                vectors=np.asarray([vector for _, vector in items], dtype=np.float32),
+            )
+        os.replace(tmp_path, path)
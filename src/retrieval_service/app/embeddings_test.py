@@ -0,0 +1,150 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from .embeddings import (
+    EMBEDDING_DIMENSIONS,
+    BatchingEmbeddings,
+    CacheConfig,
+    CachedEmbeddings,
+    HashingEmbeddings,
+    create_embeddings,
+    parse_backend,
+)
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls: list[list[str]] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(texts)
+        if "fail" in texts:
+            raise ValueError("embedding failure")
+        return [[float(len(t))] for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_share_a_batch():
+    fake = FakeEmbeddings()
+    embeddings = BatchingEmbeddings(fake, max_batch_size=8, max_wait=0.05)
+
+    vectors = await asyncio.gather(
+        *[embeddings.aembed_query(t) for t in ["a", "bb", "ccc"]]
+    )
+    await embeddings.close()
+
+    assert vectors == [[1.0], [2.0], [3.0]]
+    assert fake.calls == [["a", "bb", "ccc"]]
+    stats = embeddings.stats()
+    assert stats["batches"] == 1
+    assert stats["queries"] == 3
+    assert stats["max_batch_size"] == 3
+
+
+@pytest.mark.asyncio
+async def test_batches_are_capped_and_errors_propagate():
+    fake = FakeEmbeddings()
+    embeddings = BatchingEmbeddings(fake, max_batch_size=2, max_wait=0.05)
+
+    results = await asyncio.gather(
+        *[embeddings.aembed_query(t) for t in ["a", "bb", "fail"]],
+        return_exceptions=True,
+    )
+    await embeddings.close()
+
+    assert results[:2] == [[1.0], [2.0]]
+    assert isinstance(results[2], ValueError)
+    assert fake.calls == [["a", "bb"], ["fail"]]
+
+
+@pytest.mark.asyncio
+async def test_cache_normalizes_queries():
+    fake = FakeEmbeddings()
+    embeddings = CachedEmbeddings(fake, "fake-model", CacheConfig())
+
+    assert await embeddings.aembed_query("Coffee  Shop") == [12.0]
+    assert await embeddings.aembed_query(" coffee shop") == [12.0]
+    assert embeddings.embed_query("COFFEE SHOP") == [12.0]
+
+    assert fake.calls == [["Coffee  Shop"]]
+    stats = embeddings.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 2 / 3
+
+
+@pytest.mark.asyncio
+async def test_cache_embeds_missing_queries_in_one_batch():
+    fake = FakeEmbeddings()
+    embeddings = CachedEmbeddings(
+        BatchingEmbeddings(fake, max_batch_size=8, max_wait=0.05),
+        "fake-model",
+        CacheConfig(),
+    )
+    await embeddings.aembed_query("tea")
+
+    vectors = await embeddings.aembed_queries(["coffee", "tea", "Coffee", "juice"])
+    await embeddings.close()
+
+    assert vectors == [[6.0], [3.0], [6.0], [5.0]]
+    assert fake.calls == [["tea"], ["coffee", "juice"]]
+
+
+@pytest.mark.asyncio
+async def test_cache_persists_per_model(tmp_path):
+    path = str(tmp_path / "embeddings.npz")
+    fake = FakeEmbeddings()
+    embeddings = CachedEmbeddings(fake, "fake-model", CacheConfig(path=path))
+    await embeddings.aembed_query("tea")
+    await embeddings.close()
+
+    warm = CachedEmbeddings(fake, "fake-model", CacheConfig(path=path))
+    assert await warm.aembed_query("tea") == [3.0]
+    other = CachedEmbeddings(fake, "other-model", CacheConfig(path=path))
+    assert await other.aembed_query("tea") == [3.0]
+
+    assert fake.calls == [["tea"], ["tea"]]
+
+
+def test_hashing_embeddings_are_deterministic_and_normalized():
+    embeddings = create_embeddings("hashing", "unused")
+    assert isinstance(embeddings, HashingEmbeddings)
+
+    vector = embeddings.embed_query("Where can I get coffee?")
+    assert len(vector) == EMBEDDING_DIMENSIONS
+    assert vector == HashingEmbeddings().embed_query("where can i get COFFEE")
+    assert np.linalg.norm(vector) == pytest.approx(1.0)
+    assert embeddings.embed_query("") == [0.0] * EMBEDDING_DIMENSIONS
+
+
+def test_hashing_embeddings_rank_shared_words_higher():
+    coffee, shop, flights = HashingEmbeddings().embed_documents(
+        ["coffee near gate", "coffee shop", "flight delays"]
+    )
+    assert np.dot(coffee, shop) > np.dot(coffee, flights)
+
+
+def test_parse_backend():
+    assert parse_backend("hashing") == "hashing"
+    with pytest.raises(ValueError, match="expected one of: vertexai, hashing"):
+        parse_backend("openai")
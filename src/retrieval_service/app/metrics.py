@@ -0,0 +1,271 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import inspect
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Optional
+
+# Upper bounds in seconds, from sub-millisecond cache hits to slow searches
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict[str, Any]) -> Labels:
+    return tuple((k, str(v)) for k, v in labels.items())
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        self.values[_labels(labels)] = value
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # Per label set: one count per bucket plus +Inf, then sum
+        self.values: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(labels)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                bucket = _format_labels((*labels, ("le", _format_value(bound))))
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(
+                f"{self.name}_sum{_format_labels(labels)} {_format_value(total[0])}"
+            )
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds the metrics of one app and renders them in Prometheus format.
+
+    Collectors are called at scrape time only, so statistics that providers
+    already keep (pool sizes, cache hits) cost nothing per request.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.http_duration = Histogram(
+            "retrieval_http_request_duration_seconds",
+            "Time spent handling HTTP requests.",
+            buckets,
+        )
+        self.http_in_flight = Gauge(
+            "retrieval_http_requests_in_flight",
+            "HTTP requests currently being handled.",
+        )
+        self.datastore_duration = Histogram(
+            "retrieval_datastore_call_duration_seconds",
+            "Time spent in datastore client calls.",
+            buckets,
+        )
+        self.datastore_errors = Counter(
+            "retrieval_datastore_call_errors_total",
+            "Datastore client calls that raised.",
+        )
+        self.embedding_duration = Histogram(
+            "retrieval_embedding_call_duration_seconds",
+            "Time spent computing embeddings, including cache hits.",
+            buckets,
+        )
+        self.__collectors: list[tuple[str, Callable[[], Any]]] = []
+
+    def add_collector(self, prefix: str, collect: Callable[[], Any]) -> None:
+        """Exports the numeric values of collect() as retrieval_<prefix>_<key>."""
+        self.__collectors.append((prefix, collect))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in (
+            self.http_duration,
+            self.http_in_flight,
+            self.datastore_duration,
+            self.datastore_errors,
+            self.embedding_duration,
+        ):
+            lines.extend(metric.render())
+        for prefix, collect in self.__collectors:
+            stats = collect()
+            if not isinstance(stats, dict):
+                continue
+            for key, value in stats.items():
+                if isinstance(value, (int, float)):
+                    name = f"retrieval_{prefix}_{key}"
+                    lines.append(f"# TYPE {name} gauge")
+                    lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and in-flight requests per route."""
+
+    def __init__(self, app, metrics: Registry):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        method = scope["method"]
+        self.metrics.http_in_flight.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.http_in_flight.dec(method=method)
+            # The router stores the matched route in the scope; label by its
+            # path template to keep the number of series bounded.
+            route = scope.get("route")
+            self.metrics.http_duration.observe(
+                time.perf_counter() - start,
+                method=method,
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+
+
+class _Timed:
+    """Times the coroutine methods of a wrapped object into a histogram."""
+
+    def __init__(
+        self,
+        target: Any,
+        histogram: Histogram,
+        errors: Optional[Counter],
+        labels: dict[str, Any],
+    ):
+        self._target = target
+        self._histogram = histogram
+        self._errors = errors
+        self._labels = labels
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if inspect.isawaitable(result):
+                return self._timed(name, result)
+            return result
+
+        return call
+
+    async def _timed(self, name: str, result: Awaitable) -> Any:
+        start = time.perf_counter()
+        try:
+            return await result
+        except Exception:
+            if self._errors is not None:
+                self._errors.inc(method=name, **self._labels)
+            raise
+        finally:
+            self._histogram.observe(
+                time.perf_counter() - start, method=name, **self._labels
+            )
+
+
+def instrument_datastore(client: Any, kind: str, metrics: Registry) -> Any:
+    """Wraps a datastore client so each call is timed per method and kind."""
+    return _Timed(
+        client, metrics.datastore_duration, metrics.datastore_errors, {"kind": kind}
+    )
+
+
+def instrument_embeddings(embeddings: Any, metrics: Registry) -> Any:
+    """Wraps embeddings so each async call is timed per method."""
+    return _Timed(embeddings, metrics.embedding_duration, None, {})
@@ -0,0 +1,103 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import datastore
+import models
+
+from . import init_app
+from .embeddings import CacheConfig
+from .metrics import Registry, instrument_datastore
+
+
+def test_histogram_render():
+    registry = Registry(buckets=(0.1, 1.0))
+    registry.http_duration.observe(0.05, method="GET", route="/airports", status=200)
+    registry.http_duration.observe(0.5, method="GET", route="/airports", status=200)
+    registry.http_duration.observe(5, method="GET", route="/airports", status=200)
+    registry.add_collector("datastore_pool", lambda: {"size": 4, "idle": 1})
+
+    lines = registry.render().splitlines()
+
+    labels = 'method="GET",route="/airports",status="200"'
+    assert (
+        f'retrieval_http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1'
+        in lines
+    )
+    assert (
+        f'retrieval_http_request_duration_seconds_bucket{{{labels},le="1.0"}} 2'
+        in lines
+    )
+    assert (
+        f'retrieval_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3'
+        in lines
+    )
+    assert f"retrieval_http_request_duration_seconds_sum{{{labels}}} 5.55" in lines
+    assert f"retrieval_http_request_duration_seconds_count{{{labels}}} 3" in lines
+    assert "retrieval_datastore_pool_size 4.0" in lines
+
+
+@pytest.mark.asyncio
+async def test_instrument_datastore():
+    registry = Registry()
+    client = AsyncMock()
+    client.get_flight.return_value = None
+    client.get_amenity.side_effect = ValueError("boom")
+    ds = instrument_datastore(client, "memory", registry)
+
+    assert await ds.get_flight(1) is None
+    with pytest.raises(ValueError):
+        await ds.get_amenity(1)
+
+    rendered = registry.render()
+    labels = 'method="get_flight",kind="memory"'
+    assert f"retrieval_datastore_call_duration_seconds_count{{{labels}}} 1" in rendered
+    assert (
+        'retrieval_datastore_call_errors_total{method="get_amenity",kind="memory"} 1'
+        in rendered
+    )
+
+
+@patch.object(datastore, "create")
+def test_metrics_endpoint(m_datastore):
+    mock_cfg = MagicMock()
+    mock_cfg.clientId = "fake client id"
+    mock_cfg.datastore.kind = "memory"
+    mock_cfg.embedding_backend = "hashing"
+    mock_cfg.embedding_cache = CacheConfig()
+    app = init_app(mock_cfg)
+    airport = models.Airport(id=1, iata="FOO", name="foo", city="BAR", country="BAZ")
+    with TestClient(app) as client:
+        with patch.object(
+            m_datastore.return_value,
+            "get_airport_by_id",
+            AsyncMock(return_value=(airport, None)),
+        ):
+            assert client.get("/airports", params={"id": 1}).status_code == 200
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert (
+        'retrieval_http_request_duration_seconds_count{method="GET",'
+        'route="/airports",status="200"} 1' in response.text
+    )
+    assert (
+        'retrieval_datastore_call_duration_seconds_count{method="get_airport_by_id",'
+        'kind="memory"} 1' in response.text
+    )
+    assert 'retrieval_http_requests_in_flight{method="GET"} 1.0' in response.text
@@ -13,16 +13,46 @@
 # limitations under the License.
 
 import os
-from typing import Any, Mapping, Optional
+from typing import Any, Awaitable, Callable, Literal, Mapping, Optional
 
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from google.auth.transport import requests  # type:ignore
 from google.oauth2 import id_token  # type:ignore
 from langchain_core.embeddings import Embeddings
+from pydantic import BaseModel, Field
 
 import datastore
+from datastore import timing
 
-routes = APIRouter()
+from .embeddings import CachedEmbeddings
+from .server_timing import TimedRoute
+
+routes = APIRouter(route_class=TimedRoute)
+
+# Upper bound on the ids resolved by one batch lookup
+MAX_BATCH_SIZE = 100
+
+
+# Upper bound on the queries answered by one batch search
+MAX_SEARCH_BATCH_SIZE = 32
+
+
+SearchMode = Literal["vector", "hybrid"]
+
+# "full" recreates the tables, "incremental" only applies changed rows
+ImportMode = Literal["full", "incremental"]
+
+
+class BatchRequest(BaseModel):
+    ids: list[int] = Field(max_length=MAX_BATCH_SIZE)
+
+
+class SearchBatchRequest(BaseModel):
+    queries: list[str] = Field(min_length=1, max_length=MAX_SEARCH_BATCH_SIZE)
+    top_k: int
+    ef_search: Optional[int] = None
+    probes: Optional[int] = None
 
 
 def _ParseUserIdToken(headers: Mapping[str, Any]) -> Optional[str]:
@@ -43,9 +73,10 @@ async def get_user_info(request):
     headers = request.headers
     token = _ParseUserIdToken(headers)
     try:
-        id_info = id_token.verify_oauth2_token(
-            token, requests.Request(), audience=request.app.state.client_id
-        )
+        with timing.span("auth"):
+            id_info = id_token.verify_oauth2_token(
+                token, requests.Request(), audience=request.app.state.client_id
+            )
 
         return {
             "user_id": id_info.get("sub"),
@@ -57,11 +88,24 @@ async def get_user_info(request):
         print(e)
 
 
+def _timed_embed(embed_service: Embeddings) -> Callable[[str], Awaitable[list[float]]]:
+    async def embed(query: str) -> list[float]:
+        with timing.span("embedding"):
+            return await embed_service.aembed_query(query)
+
+    return embed
+
+
 @routes.get("/")
 async def root():
     return {"message": "Hello World"}
 
 
+@routes.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(request: Request):
+    return request.app.state.metrics.render()
+
+
 @routes.get("/airports")
 async def get_airport(
     request: Request,
@@ -81,6 +125,13 @@ async def get_airport(
     return {"results": results, "sql": sql}
 
 
+@routes.post("/airports/batch")
+async def get_airports_batch(body: BatchRequest, request: Request):
+    ds: datastore.Client = request.app.state.datastore
+    results = await ds.get_airports_by_ids(body.ids)
+    return {"results": results}
+
+
 @routes.get("/airports/search")
 async def search_airports(
     request: Request,
@@ -106,17 +157,63 @@ async def get_amenity(id: int, request: Request):
     return {"results": results, "sql": sql}
 
 
+@routes.post("/amenities/batch")
+async def get_amenities_batch(body: BatchRequest, request: Request):
+    ds: datastore.Client = request.app.state.datastore
+    results = await ds.get_amenities_by_ids(body.ids)
+    return {"results": results}
+
+
 @routes.get("/amenities/search")
-async def amenities_search(query: str, top_k: int, request: Request):
+async def amenities_search(
+    query: str,
+    top_k: int,
+    request: Request,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    mode: SearchMode = "vector",
+):
     ds: datastore.Client = request.app.state.datastore
 
     embed_service: Embeddings = request.app.state.embed_service
-    query_embedding = embed_service.embed_query(query)
+    if mode == "hybrid":
+        fused = await ds.amenities_hybrid_search(
+            query,
+            _timed_embed(embed_service),
+            0.5,
+            top_k,
+            ef_search=ef_search,
+            probes=probes,
+        )
+        return {"results": fused, "sql": None}
+
+    with timing.span("embedding"):
+        query_embedding = await embed_service.aembed_query(query)
 
-    results, sql = await ds.amenities_search(query_embedding, 0.5, top_k)
+    results, sql = await ds.amenities_search(
+        query_embedding, 0.5, top_k, ef_search=ef_search, probes=probes
+    )
     return {"results": results, "sql": sql}
 
 
+@routes.post("/amenities/search/batch")
+async def amenities_search_batch(body: SearchBatchRequest, request: Request):
+    ds: datastore.Client = request.app.state.datastore
+
+    embed_service: CachedEmbeddings = request.app.state.embed_service
+    with timing.span("embedding"):
+        query_embeddings = await embed_service.aembed_queries(body.queries)
+
+    results = await ds.amenities_search_many(
+        query_embeddings,
+        0.5,
+        body.top_k,
+        ef_search=body.ef_search,
+        probes=body.probes,
+    )
+    return {"results": results}
+
+
 @routes.get("/flights")
 async def get_flight(flight_id: int, request: Request):
     ds: datastore.Client = request.app.state.datastore
@@ -124,6 +221,13 @@ async def get_flight(flight_id: int, request: Request):
     return {"results": results, "sql": sql}
 
 
+@routes.post("/flights/batch")
+async def get_flights_batch(body: BatchRequest, request: Request):
+    ds: datastore.Client = request.app.state.datastore
+    results = await ds.get_flights_by_ids(body.ids)
+    return {"results": results}
+
+
 @routes.get("/flights/search")
 async def search_flights(
     request: Request,
@@ -213,18 +317,29 @@ async def list_tickets(
 
 
 @routes.get("/policies/search")
-async def policies_search(query: str, top_k: int, request: Request):
+async def policies_search(
+    query: str, top_k: int, request: Request, mode: SearchMode = "vector"
+):
     ds: datastore.Client = request.app.state.datastore
 
     embed_service: Embeddings = request.app.state.embed_service
-    query_embedding = embed_service.embed_query(query)
+    if mode == "hybrid":
+        fused = await ds.policies_hybrid_search(
+            query, _timed_embed(embed_service), 0.5, top_k
+        )
+        return {"results": fused, "sql": None}
+
+    with timing.span("embedding"):
+        query_embedding = await embed_service.aembed_query(query)
 
     results, sql = await ds.policies_search(query_embedding, 0.5, top_k)
     return {"results": results, "sql": sql}
 
+
 @routes.get("/data/import")
 async def import_data(
     request: Request,
+    mode: ImportMode = "full",
 ):
     airports_ds_path = "./data/airport_dataset.csv"
     amenities_ds_path = "./data/amenity_dataset.csv"
@@ -232,11 +347,16 @@ async def import_data(
 
     # cfg = parse_config()
     ds: datastore.Client = request.app.state.datastore
+    if mode == "incremental":
+        # The datastore stays open and in use; only changed rows are written
+        changes = await ds.sync_dataset(
+            airports_ds_path, amenities_ds_path, flights_ds_path
+        )
+        datastore.print_changes(changes)
+        return {"results": changes}
+
     # ds = datastore.Client
-    airports, amenities, flights = await ds.load_dataset(
-        airports_ds_path, amenities_ds_path, flights_ds_path
-    )
-    await ds.initialize_data(airports, amenities, flights)
+    await ds.import_dataset(airports_ds_path, amenities_ds_path, flights_ds_path)
     await ds.close()
 
     print("database init done.")
@@ -0,0 +1,90 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import time
+from typing import Any, Callable
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+
+from datastore import timing
+
+# Query parameter that adds the timings collected so far to the response body
+TIMINGS_PARAM = "timings"
+
+
+def _wants_timings(query_string: bytes) -> bool:
+    if TIMINGS_PARAM.encode() not in query_string:
+        return False
+    values = parse_qs(query_string.decode()).get(TIMINGS_PARAM, [])
+    return any(v.lower() in ("1", "true", "yes") for v in values)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware adding a Server-Timing header to every response.
+
+    Phases are recorded with datastore.timing.span while the request is
+    handled; serialize is the time between the endpoint returning and the
+    response starting, and total covers the whole request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = timing.start()
+        start = time.perf_counter()
+        scope["state"] = scope.get("state", {})
+        scope["state"]["include_timings"] = _wants_timings(scope["query_string"])
+
+        async def send_with_timings(message):
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                handled = scope["state"].get("handled_at")
+                if handled is not None:
+                    timings.add("serialize", now - handled)
+                timings.add("total", now - start)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.header().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_timings)
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    @functools.wraps(endpoint)
+    async def timed(*args, **kwargs) -> Any:
+        result = await endpoint(*args, **kwargs)
+        timings = timing.current()
+        request = kwargs.get("request")
+        if timings is not None and request is not None:
+            request.state.handled_at = time.perf_counter()
+            if request.state.include_timings and isinstance(result, dict):
+                result = {**result, "timings": timings.as_dict()}
+        return result
+
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """Route that marks when its endpoint returns, for the serialize phase."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
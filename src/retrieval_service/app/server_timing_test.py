@@ -0,0 +1,93 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import datastore
+import models
+from datastore import timing
+
+from . import init_app
+from .embeddings import CacheConfig
+
+
+@pytest.fixture(scope="module")
+def app():
+    mock_cfg = MagicMock()
+    mock_cfg.clientId = "fake client id"
+    mock_cfg.embedding_backend = "hashing"
+    mock_cfg.embedding_cache = CacheConfig()
+    return init_app(mock_cfg)
+
+
+def test_span_without_request():
+    assert timing.current() is None
+    with timing.span("db"):
+        pass
+    assert timing.current() is None
+
+
+def test_span_accumulates():
+    timings = timing.start()
+    with timing.span("db"):
+        pass
+    with timing.span("db"):
+        pass
+    timings.add("validate", 0.0015)
+
+    assert list(timings.durations) == ["db", "validate"]
+    assert timings.as_dict()["validate"] == 1.5
+    assert "validate;dur=1.5" in timings.header()
+
+
+@patch.object(datastore, "create")
+def test_server_timing_header(m_datastore, app):
+    amenity = models.Amenity(
+        id=1,
+        name="foo",
+        description="bar",
+        location="baz",
+        terminal="qux",
+        category="food",
+        hour="all day",
+    )
+
+    async def amenities_search(*args, **kwargs):
+        with timing.span("db"):
+            return [amenity], None
+
+    with TestClient(app) as client:
+        with patch.object(
+            m_datastore.return_value, "amenities_search", AsyncMock()
+        ) as search:
+            search.side_effect = amenities_search
+            response = client.get(
+                "/amenities/search", params={"query": "food", "top_k": 1}
+            )
+            timed = client.get(
+                "/amenities/search",
+                params={"query": "food", "top_k": 1, "timings": "true"},
+            )
+
+    assert response.status_code == 200
+    header = response.headers["server-timing"]
+    for name in ("embedding", "db", "serialize", "total"):
+        assert f"{name};dur=" in header
+    assert "timings" not in response.json()
+
+    assert timed.status_code == 200
+    assert set(timed.json()["timings"]) >= {"embedding", "db"}
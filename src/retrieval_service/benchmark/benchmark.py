@@ -0,0 +1,254 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import csv
+import random
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Optional
+
+import httpx
+import numpy as np
+from pydantic import BaseModel
+
+from app import init_app
+from app.app import AppConfig
+
+from .dataset import Dataset
+
+AMENITY_QUERIES = [
+    "coffee",
+    "where can I get a burger",
+    "luxury shopping",
+    "vegetarian restaurant near gate",
+    "bar with cocktails",
+    "quiet place to work",
+]
+
+POLICY_QUERIES = [
+    "how many checked bags can I bring",
+    "can I change my flight",
+    "refund for cancelled ticket",
+    "traveling with a pet",
+    "what happens if my flight is overbooked",
+]
+
+
+class Request(BaseModel):
+    method: str
+    path: str
+    params: dict[str, Any]
+
+
+class Operation(BaseModel):
+    """A named kind of request, e.g. one route with one set of parameters."""
+
+    name: str
+    requests: Callable[[random.Random], Request]
+
+
+class RouteStats(BaseModel):
+    requests: int
+    errors: int
+    statuses: dict[str, int]
+    throughput_rps: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+class Report(BaseModel):
+    scale: int
+    concurrency: int
+    requests_per_route: int
+    routes: dict[str, RouteStats]
+
+
+def _read_csv(path: str) -> list[dict[str, str]]:
+    with open(path, "r") as f:
+        return list(csv.DictReader(f))
+
+
+def build_operations(dataset: Dataset) -> list[Operation]:
+    """Returns one operation per route, with parameters drawn from dataset.
+
+    /tickets/list is left out since it needs a signed-in user's ID token.
+    """
+    airports = _read_csv(dataset.airports_ds_path)
+    cities = [a for a in airports if a["city"]]
+    amenity_ids = [r["id"] for r in _read_csv(dataset.amenities_ds_path)]
+    flights = _read_csv(dataset.flights_ds_path)
+
+    def airport_by_id(rng: random.Random) -> Request:
+        return Request(
+            method="GET", path="/airports", params={"id": rng.choice(airports)["id"]}
+        )
+
+    def airport_by_iata(rng: random.Random) -> Request:
+        iata = rng.choice(dataset.hubs).lower()
+        return Request(method="GET", path="/airports", params={"iata": iata})
+
+    def search_airports(rng: random.Random) -> Request:
+        airport = rng.choice(cities)
+        params = {"city": airport["city"], "country": airport["country"]}
+        return Request(method="GET", path="/airports/search", params=params)
+
+    def amenity(rng: random.Random) -> Request:
+        params = {"id": rng.choice(amenity_ids)}
+        return Request(method="GET", path="/amenities", params=params)
+
+    def search_amenities(rng: random.Random) -> Request:
+        params = {"query": rng.choice(AMENITY_QUERIES), "top_k": 5}
+        return Request(method="GET", path="/amenities/search", params=params)
+
+    def flight(rng: random.Random) -> Request:
+        params = {"flight_id": rng.choice(flights)["id"]}
+        return Request(method="GET", path="/flights", params=params)
+
+    def search_flights_by_airports(rng: random.Random) -> Request:
+        params = {
+            "departure_airport": rng.choice(dataset.hubs),
+            "arrival_airport": rng.choice(dataset.hubs),
+            "date": rng.choice(dataset.dates),
+        }
+        return Request(method="GET", path="/flights/search", params=params)
+
+    def search_flights_by_number(rng: random.Random) -> Request:
+        f = rng.choice(flights)
+        params = {"airline": f["airline"], "flight_number": f["flight_number"]}
+        return Request(method="GET", path="/flights/search", params=params)
+
+    def validate_ticket(rng: random.Random) -> Request:
+        f = rng.choice(flights)
+        params = {
+            "airline": f["airline"],
+            "flight_number": f["flight_number"],
+            "departure_airport": f["departure_airport"],
+            "departure_time": f["departure_time"],
+        }
+        return Request(method="GET", path="/tickets/validate", params=params)
+
+    def search_policies(rng: random.Random) -> Request:
+        params = {"query": rng.choice(POLICY_QUERIES), "top_k": 5}
+        return Request(method="GET", path="/policies/search", params=params)
+
+    return [
+        Operation(name="GET /airports?id", requests=airport_by_id),
+        Operation(name="GET /airports?iata", requests=airport_by_iata),
+        Operation(name="GET /airports/search", requests=search_airports),
+        Operation(name="GET /amenities", requests=amenity),
+        Operation(name="GET /amenities/search", requests=search_amenities),
+        Operation(name="GET /flights", requests=flight),
+        Operation(
+            name="GET /flights/search?airports", requests=search_flights_by_airports
+        ),
+        Operation(name="GET /flights/search?number", requests=search_flights_by_number),
+        Operation(name="GET /tickets/validate", requests=validate_ticket),
+        Operation(name="GET /policies/search", requests=search_policies),
+    ]
+
+
+def _route_stats(
+    latencies: list[float], statuses: list[int], elapsed: float
+) -> RouteStats:
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return RouteStats(
+        requests=len(latencies),
+        errors=sum(1 for s in statuses if not 200 <= s < 300),
+        statuses={str(s): n for s, n in sorted(Counter(statuses).items())},
+        throughput_rps=len(latencies) / elapsed,
+        mean_ms=float(ms.mean()),
+        p50_ms=float(p50),
+        p95_ms=float(p95),
+        p99_ms=float(p99),
+        max_ms=float(ms.max()),
+    )
+
+
+async def run_operation(
+    client: httpx.AsyncClient,
+    operation: Operation,
+    requests: int,
+    concurrency: int,
+    rng: random.Random,
+) -> RouteStats:
+    """Sends requests for operation from concurrency workers at once."""
+    pending = [operation.requests(rng) for _ in range(requests)]
+    pending.reverse()
+    latencies: list[float] = []
+    statuses: list[int] = []
+
+    async def worker() -> None:
+        while pending:
+            r = pending.pop()
+            start = time.perf_counter()
+            response = await client.request(r.method, r.path, params=r.params)
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return _route_stats(latencies, statuses, time.perf_counter() - start)
+
+
+async def run_benchmark(
+    client: httpx.AsyncClient,
+    operations: list[Operation],
+    scale: int,
+    requests_per_route: int,
+    concurrency: int,
+    seed: int = 0,
+) -> Report:
+    """Runs each operation in turn and reports per-route latencies."""
+    rng = random.Random(seed)
+    routes = {}
+    for operation in operations:
+        routes[operation.name] = await run_operation(
+            client, operation, requests_per_route, concurrency, rng
+        )
+    return Report(
+        scale=scale,
+        concurrency=concurrency,
+        requests_per_route=requests_per_route,
+        routes=routes,
+    )
+
+
+@asynccontextmanager
+async def serve(
+    cfg: AppConfig, dataset: Optional[Dataset] = None
+) -> AsyncIterator[httpx.AsyncClient]:
+    """Runs the app in process and yields a client that calls it directly.
+
+    If dataset is given it is imported into the datastore first, for
+    providers that do not load their data on creation.
+    """
+    app = init_app(cfg)
+    async with app.router.lifespan_context(app):
+        if dataset is not None:
+            await app.state.datastore.import_dataset(
+                dataset.airports_ds_path,
+                dataset.amenities_ds_path,
+                dataset.flights_ds_path,
+            )
+        transport = httpx.ASGITransport(app=app)  # type: ignore
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            yield client
@@ -0,0 +1,72 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import os
+
+import pytest
+
+from app.app import AppConfig
+
+from . import build_operations, generate_dataset, run_benchmark, serve
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def test_generate_dataset(tmp_path):
+    dataset = generate_dataset(DATA_DIR, str(tmp_path), scale=2, seed=0)
+
+    with open(dataset.flights_ds_path, "r") as f:
+        flights = list(csv.DictReader(f))
+    assert len(flights) == 2000
+    assert {f["departure_airport"] for f in flights} <= set(dataset.hubs)
+
+    with open(os.path.join(DATA_DIR, "amenity_dataset.csv"), "r") as f:
+        amenities = list(csv.DictReader(f))
+    with open(dataset.amenities_ds_path, "r") as f:
+        scaled = list(csv.DictReader(f))
+    assert len(scaled) == 2 * len(amenities)
+    assert len({a["id"] for a in scaled}) == len(scaled)
+
+    again = generate_dataset(DATA_DIR, str(tmp_path / "again"), scale=2, seed=0)
+    assert again.hubs == dataset.hubs
+
+
+@pytest.mark.asyncio
+async def test_run_benchmark(tmp_path):
+    dataset = generate_dataset(DATA_DIR, str(tmp_path), scale=1, seed=0)
+    cfg = AppConfig(
+        datastore={
+            "kind": "memory",
+            "airports_ds_path": dataset.airports_ds_path,
+            "amenities_ds_path": dataset.amenities_ds_path,
+            "flights_ds_path": dataset.flights_ds_path,
+            "policies_ds_path": dataset.policies_ds_path,
+        },
+        embedding_backend="hashing",
+    )
+    operations = build_operations(dataset)
+
+    async with serve(cfg) as client:
+        report = await run_benchmark(
+            client, operations, scale=1, requests_per_route=4, concurrency=2
+        )
+
+    assert list(report.routes) == [o.name for o in operations]
+    for stats in report.routes.values():
+        assert stats.requests == 4
+        assert sum(stats.statuses.values()) == 4
+        assert all(200 <= int(status) < 300 for status in stats.statuses)
+        assert stats.errors == 0
+        assert 0 < stats.p50_ms <= stats.p99_ms <= stats.max_ms
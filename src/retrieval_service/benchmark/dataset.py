@@ -0,0 +1,117 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import os
+import random
+from datetime import datetime, timedelta
+
+from pydantic import BaseModel
+
+import models
+
+AIRLINES = ["UA", "AA", "DL", "CY"]
+# Flights generated per unit of scale
+FLIGHTS_PER_SCALE = 1000
+# Number of airports that generated flights fly between
+HUB_COUNT = 30
+START_DATE = datetime(2024, 1, 1)
+DAYS = 7
+
+
+class Dataset(BaseModel):
+    airports_ds_path: str
+    amenities_ds_path: str
+    flights_ds_path: str
+    policies_ds_path: str
+    hubs: list[str]
+    dates: list[str]
+
+
+def _hubs(airports_ds_path: str) -> list[str]:
+    with open(airports_ds_path, "r") as f:
+        codes = [line["iata"] for line in csv.DictReader(f) if line["iata"]]
+    return sorted(codes)[:HUB_COUNT]
+
+
+def _write_amenities(src_path: str, dst_path: str, scale: int) -> None:
+    # Each copy of the amenities gets its own id range so the vector search
+    # scans scale times as many rows.
+    with open(src_path, "r") as f:
+        reader = csv.DictReader(f)
+        fieldnames = list(reader.fieldnames or [])
+        rows = list(reader)
+    stride = max(int(r["id"]) for r in rows) + 1
+    with open(dst_path, "w") as f:
+        writer = csv.DictWriter(f, fieldnames)
+        writer.writeheader()
+        for copy in range(scale):
+            for r in rows:
+                writer.writerow(r | {"id": int(r["id"]) + copy * stride})
+
+
+def _write_flights(
+    dst_path: str, hubs: list[str], scale: int, rng: random.Random
+) -> None:
+    with open(dst_path, "w") as f:
+        writer = csv.DictWriter(f, list(models.Flight.model_fields))
+        writer.writeheader()
+        for id in range(scale * FLIGHTS_PER_SCALE):
+            departure_airport, arrival_airport = rng.sample(hubs, 2)
+            departure_time = START_DATE + timedelta(
+                minutes=rng.randrange(DAYS * 24 * 60)
+            )
+            flight = models.Flight(
+                id=id,
+                airline=rng.choice(AIRLINES),
+                flight_number=str(rng.randrange(100, 10000)),
+                departure_airport=departure_airport,
+                arrival_airport=arrival_airport,
+                departure_time=departure_time,
+                arrival_time=departure_time + timedelta(minutes=rng.randrange(60, 600)),
+                departure_gate=f"{rng.choice('ABCDE')}{rng.randrange(1, 41)}",
+                arrival_gate=f"{rng.choice('ABCDE')}{rng.randrange(1, 41)}",
+            )
+            writer.writerow(flight.model_dump())
+
+
+def generate_dataset(data_dir: str, out_dir: str, scale: int, seed: int) -> Dataset:
+    """Writes a benchmark dataset of the given scale into out_dir.
+
+    Airports and policies are used as shipped in data_dir. Amenities are
+    copied scale times, and scale * FLIGHTS_PER_SCALE flights between the
+    hub airports are generated, since no flights dataset is shipped.
+    """
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    airports_ds_path = os.path.join(data_dir, "airport_dataset.csv")
+    hubs = _hubs(airports_ds_path)
+
+    amenities_ds_path = os.path.join(out_dir, "amenity_dataset.csv")
+    _write_amenities(
+        os.path.join(data_dir, "amenity_dataset.csv"), amenities_ds_path, scale
+    )
+    flights_ds_path = os.path.join(out_dir, "flights_dataset.csv")
+    _write_flights(flights_ds_path, hubs, scale, rng)
+
+    return Dataset(
+        airports_ds_path=airports_ds_path,
+        amenities_ds_path=amenities_ds_path,
+        flights_ds_path=flights_ds_path,
+        policies_ds_path=os.path.join(data_dir, "cymbalair_policy.csv"),
+        hubs=hubs,
+        dates=[
+            (START_DATE + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(DAYS)
+        ],
+    )
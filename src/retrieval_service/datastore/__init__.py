@@ -14,13 +14,35 @@
 
 from typing import Union
 
-from . import providers
-from .datastore import Client, create
+from . import cache, fusion, parquet, providers
+from .datastore import (
+    Client,
+    TableChanges,
+    create,
+    print_changes,
+    read_dataset,
+    save_dataset,
+    write_dataset,
+)
 
 Config = Union[
     providers.firestore.Config,
     providers.postgres.Config,
     providers.cloudsql_postgres.Config,
+    providers.memory.Config,
 ]
 
-__ALL__ = [Client, Config, create, providers]
+__ALL__ = [
+    Client,
+    Config,
+    cache,
+    create,
+    fusion,
+    parquet,
+    print_changes,
+    providers,
+    read_dataset,
+    save_dataset,
+    TableChanges,
+    write_dataset,
+]
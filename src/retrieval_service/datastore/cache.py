@@ -0,0 +1,220 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Optional, TypeVar
+
+from pydantic import BaseModel
+
+
+class Config(BaseModel):
+    max_entries: int = 4096
+    # TTLs in seconds; airports and amenities are reference data that only
+    # change on a reload, flight times and gates change more often.
+    airports_ttl: float = 3600
+    amenities_ttl: float = 3600
+    flights_ttl: float = 60
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Bounded mapping whose entries expire after a per-entry TTL."""
+
+    __entries: OrderedDict[K, tuple[float, V]]
+    __max_entries: int
+    __clock: Callable[[], float]
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.__entries = OrderedDict()
+        self.__max_entries = max_entries
+        self.__clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(self, key: K) -> tuple[bool, Optional[V]]:
+        """Returns (found, value); expired entries count as misses."""
+        entry = self.__entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > self.__clock():
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return True, value
+            del self.__entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key: K, value: V, ttl: float) -> None:
+        self.__entries[key] = (self.__clock() + ttl, value)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.__max_entries:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def items(self) -> list[tuple[K, V]]:
+        """Returns the live entries, least recently used first."""
+        now = self.__clock()
+        return [
+            (key, value)
+            for key, (expires_at, value) in self.__entries.items()
+            if expires_at > now
+        ]
+
+    def clear(self) -> None:
+        self.__entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.__entries),
+        }
+
+
+class Client:
+    """Read-through cache in front of another datastore client.
+
+    Lookups and searches of reference data are served from an LRU cache;
+    every other attribute is delegated to the wrapped client unchanged.
+    Results found are cached for the TTL of their table, misses are not.
+    Reloading the data through the wrapper clears the cache.
+    """
+
+    __client: Any
+    __config: Config
+    __cache: LRUCache[Hashable, Any]
+
+    def __init__(
+        self,
+        client: Any,
+        config: Config,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.__client = client
+        self.__config = config
+        self.__cache = LRUCache(config.max_entries, clock)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.__client, name)
+
+    def cache_stats(self) -> dict[str, int]:
+        return self.__cache.stats()
+
+    async def __cached(self, ttl: float, method: str, *args) -> Any:
+        key = (method, *args)
+        found, value = self.__cache.get(key)
+        if found:
+            return value
+        value = await getattr(self.__client, method)(*args)
+        # Misses, lookups of None and searches of [] alike, are not cached,
+        # so a row inserted after them is found by the next call instead of
+        # after the TTL.
+        result, _ = value
+        if result is not None and result != []:
+            self.__cache.put(key, value, ttl)
+        return value
+
+    async def __cached_many(
+        self, ttl: float, method: str, batch_method: str, ids: list[int]
+    ) -> list[Any]:
+        # Batch lookups share the (result, sql) entries of the single-id
+        # method, so only the ids missing from the cache are fetched, in one
+        # batch call.
+        ids = list(dict.fromkeys(ids))
+        values: dict[int, Any] = {}
+        missing = []
+        for id in ids:
+            _, value = self.__cache.get((method, id))
+            if value is not None:
+                values[id], _ = value
+            else:
+                missing.append(id)
+        if missing:
+            fetched = {
+                v.id: v for v in await getattr(self.__client, batch_method)(missing)
+            }
+            for id in missing:
+                values[id] = fetched.get(id)
+                if values[id] is not None:
+                    self.__cache.put((method, id), (values[id], None), ttl)
+        return [values[id] for id in ids if values[id] is not None]
+
+    async def initialize_data(self, *args, **kwargs) -> None:
+        await self.__client.initialize_data(*args, **kwargs)
+        self.__cache.clear()
+
+    async def import_dataset(self, *args, **kwargs) -> None:
+        await self.__client.import_dataset(*args, **kwargs)
+        self.__cache.clear()
+
+    async def sync_dataset(self, *args, **kwargs) -> Any:
+        changes = await self.__client.sync_dataset(*args, **kwargs)
+        self.__cache.clear()
+        return changes
+
+    async def get_airport_by_id(self, id: int):
+        return await self.__cached(self.__config.airports_ttl, "get_airport_by_id", id)
+
+    async def get_airport_by_iata(self, iata: str):
+        return await self.__cached(
+            self.__config.airports_ttl, "get_airport_by_iata", iata
+        )
+
+    async def get_airports_by_ids(self, ids: list[int]):
+        return await self.__cached_many(
+            self.__config.airports_ttl, "get_airport_by_id", "get_airports_by_ids", ids
+        )
+
+    async def search_airports(
+        self,
+        country: Optional[str] = None,
+        city: Optional[str] = None,
+        name: Optional[str] = None,
+    ):
+        return await self.__cached(
+            self.__config.airports_ttl, "search_airports", country, city, name
+        )
+
+    async def get_amenity(self, id: int):
+        return await self.__cached(self.__config.amenities_ttl, "get_amenity", id)
+
+    async def get_amenities_by_ids(self, ids: list[int]):
+        return await self.__cached_many(
+            self.__config.amenities_ttl, "get_amenity", "get_amenities_by_ids", ids
+        )
+
+    async def get_flight(self, flight_id: int):
+        return await self.__cached(self.__config.flights_ttl, "get_flight", flight_id)
+
+    async def get_flights_by_ids(self, ids: list[int]):
+        return await self.__cached_many(
+            self.__config.flights_ttl, "get_flight", "get_flights_by_ids", ids
+        )
+
+    async def search_flights_by_number(self, airline: str, number: str):
+        return await self.__cached(
+            self.__config.flights_ttl, "search_flights_by_number", airline, number
+        )
@@ -0,0 +1,155 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+
+import models
+
+from . import cache
+from .datastore import TableChanges
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_lru_cache_evicts_least_recently_used():
+    lru = cache.LRUCache(max_entries=2)
+    lru.put("a", 1, ttl=10)
+    lru.put("b", 2, ttl=10)
+    assert lru.get("a") == (True, 1)
+    lru.put("c", 3, ttl=10)
+
+    assert lru.get("b") == (False, None)
+    assert lru.get("a") == (True, 1)
+    assert lru.get("c") == (True, 3)
+    assert lru.stats() == {"hits": 3, "misses": 1, "evictions": 1, "size": 2}
+
+
+def test_lru_cache_expires_entries():
+    clock = FakeClock()
+    lru = cache.LRUCache(max_entries=2, clock=clock)
+    lru.put("a", None, ttl=10)
+    assert lru.get("a") == (True, None)
+
+    clock.now = 10
+    assert lru.get("a") == (False, None)
+    assert len(lru) == 0
+
+
+@pytest.mark.asyncio
+async def test_client_reads_through():
+    airport = models.Airport(id=1, iata="SFO", name="foo", city="bar", country="baz")
+    inner = AsyncMock()
+    inner.get_airport_by_id.return_value = (airport, None)
+    inner.get_flight.return_value = (None, None)
+    clock = FakeClock()
+    ds = cache.Client(inner, cache.Config(airports_ttl=100, flights_ttl=5), clock)
+
+    assert await ds.get_airport_by_id(1) == (airport, None)
+    assert await ds.get_airport_by_id(1) == (airport, None)
+    assert await ds.get_flight(2) == (None, None)
+    assert await ds.get_flight(2) == (None, None)
+    clock.now = 100
+    assert await ds.get_airport_by_id(1) == (airport, None)
+
+    assert inner.get_airport_by_id.await_count == 2
+    assert inner.get_flight.await_count == 2
+    assert ds.cache_stats() == {"hits": 1, "misses": 4, "evictions": 0, "size": 1}
+
+
+@pytest.mark.asyncio
+async def test_client_does_not_cache_empty_searches():
+    flight = models.Flight(
+        id=1,
+        airline="UA",
+        flight_number="1158",
+        departure_airport="SFO",
+        arrival_airport="ORD",
+        departure_time=datetime(2024, 1, 1, 5, 57),
+        arrival_time=datetime(2024, 1, 1, 12, 13),
+        departure_gate="C38",
+        arrival_gate="D30",
+    )
+    inner = AsyncMock()
+    inner.search_flights_by_number.side_effect = [([], None), ([flight], None)]
+    ds = cache.Client(inner, cache.Config())
+
+    assert await ds.search_flights_by_number("UA", "1158") == ([], None)
+    assert await ds.search_flights_by_number("UA", "1158") == ([flight], None)
+    assert await ds.search_flights_by_number("UA", "1158") == ([flight], None)
+    assert inner.search_flights_by_number.await_count == 2
+    assert ds.cache_stats() == {"hits": 1, "misses": 2, "evictions": 0, "size": 1}
+
+
+@pytest.mark.asyncio
+async def test_client_delegates_and_clears_on_reload():
+    amenity = models.Amenity(
+        id=1,
+        name="foo",
+        description="bar",
+        location="baz",
+        terminal="qux",
+        category="shop",
+        hour="daily",
+    )
+    inner = AsyncMock()
+    inner.get_amenity.return_value = (amenity, None)
+    inner.sync_dataset.return_value = {"amenities": TableChanges()}
+    ds = cache.Client(inner, cache.Config())
+
+    await ds.get_amenity(1)
+    await ds.get_amenity(1)
+    await ds.initialize_data([], [], [])
+    await ds.get_amenity(1)
+    assert await ds.sync_dataset("a", "m", "f") == {"amenities": TableChanges()}
+    await ds.get_amenity(1)
+    await ds.list_tickets("user")
+
+    assert inner.get_amenity.await_count == 3
+    inner.initialize_data.assert_awaited_once_with([], [], [])
+    inner.sync_dataset.assert_awaited_once_with("a", "m", "f")
+    inner.list_tickets.assert_awaited_once_with("user")
+
+
+@pytest.mark.asyncio
+async def test_client_batches_missing_ids():
+    airports = {
+        id: models.Airport(id=id, iata="SFO", name="foo", city="bar", country="baz")
+        for id in (1, 2, 3)
+    }
+    inner = AsyncMock()
+    inner.get_airport_by_id.return_value = (airports[1], None)
+    inner.get_airports_by_ids.side_effect = lambda ids: [
+        airports[id] for id in ids if id in airports
+    ]
+    ds = cache.Client(inner, cache.Config())
+
+    assert await ds.get_airport_by_id(1) == (airports[1], None)
+    assert await ds.get_airports_by_ids([3, 1, 4, 3]) == [airports[3], airports[1]]
+    assert await ds.get_airports_by_ids([4, 3]) == [airports[3]]
+    assert await ds.get_airport_by_id(3) == (airports[3], None)
+
+    assert [c.args for c in inner.get_airports_by_ids.await_args_list] == [
+        ([3, 4],),
+        ([4],),
+    ]
+    assert inner.get_airport_by_id.await_count == 1
@@ -12,19 +12,245 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import csv
+import hashlib
 from abc import ABC, abstractmethod
+from contextlib import aclosing
 from datetime import datetime
-from typing import Generic, List, Optional, TypeVar
+from itertools import islice
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Generic,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    TextIO,
+    TypeVar,
+    Union,
+)
+
+from pydantic import BaseModel
 
 import models
 
+from . import cache, fusion, parquet, sidecar
+
+# Computes the embedding of a search query; only awaited when needed.
+Embed = Callable[[str], Awaitable[list[float]]]
+
+# Number of rows validated and written per chunk when importing datasets.
+DEFAULT_CHUNK_SIZE = 1000
+
+# Columns of the datasets, in file order
+AIRPORT_COLUMNS = list(models.Airport.model_fields)
+AMENITY_COLUMNS = list(models.Amenity.model_fields)
+FLIGHT_COLUMNS = list(models.Flight.model_fields)
+
+Table = Literal["airports", "amenities", "flights"]
+
+TABLE_MODELS: dict[str, type[BaseModel]] = {
+    "airports": models.Airport,
+    "amenities": models.Amenity,
+    "flights": models.Flight,
+}
+
+TABLE_COLUMNS: dict[str, list[str]] = {
+    table: list(model.model_fields) for table, model in TABLE_MODELS.items()
+}
+
+
+class TableChanges(BaseModel):
+    """Ids of the rows an incremental import inserted, updated and deleted."""
+
+    inserted: list[int] = []
+    updated: list[int] = []
+    deleted: list[int] = []
+
+
+def print_changes(changes: dict[str, TableChanges]) -> None:
+    """Prints each row an incremental import changed, then a summary per table."""
+    for table, c in changes.items():
+        for action, ids in (
+            ("inserted", c.inserted),
+            ("updated", c.updated),
+            ("deleted", c.deleted),
+        ):
+            for id in ids:
+                print(f"{table} {id}: {action}")
+        print(
+            f"{table}: {len(c.inserted)} inserted, {len(c.updated)} updated, "
+            f"{len(c.deleted)} deleted"
+        )
+
+
+def row_hash(row: BaseModel) -> str:
+    """Content hash of a dataset row, stored to detect changes on import."""
+    return hashlib.blake2b(row.model_dump_json().encode(), digest_size=16).hexdigest()
+
 
 class AbstractConfig(ABC):
     kind: str
 
 
 C = TypeVar("C", bound=AbstractConfig)
+M = TypeVar("M", bound=BaseModel)
+
+
+def _read_csv_rows(path: str, chunk_size: int) -> Iterator[list[dict[str, Any]]]:
+    embeddings = sidecar.load_embeddings(path)
+
+    def with_embedding(line: dict) -> dict:
+        # Vectors from the sidecar take precedence over the textual column.
+        # This saves parsing the text; the models hold lists, so each vector
+        # is still copied out of the memory map here.
+        if embeddings is not None:
+            embedding = embeddings.get(int(line["id"]))
+            if embedding is not None:
+                line["embedding"] = embedding.tolist()
+        return line
+
+    with open(path, "r") as f:
+        reader = csv.DictReader(f, delimiter=",")
+        while chunk := [with_embedding(line) for line in islice(reader, chunk_size)]:
+            yield chunk
+
+
+def _read_chunks(path: str, model: type[M], chunk_size: int) -> Iterator[list[M]]:
+    if parquet.is_parquet(path):
+        rows = parquet.read_rows(path, chunk_size)
+    else:
+        rows = _read_csv_rows(path, chunk_size)
+    for chunk in rows:
+        yield [model.model_validate(row) for row in chunk]
+
+
+async def read_dataset(
+    path: str, model: type[M], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> AsyncIterator[list[M]]:
+    """Yields validated rows of a dataset in chunks of at most chunk_size.
+
+    The format is picked from the file extension: Parquet for .parquet
+    files, CSV otherwise. The next chunk is parsed in a worker thread while
+    the caller consumes the current one, so only two chunks are held in
+    memory at a time.
+    """
+    chunks = _read_chunks(path, model, chunk_size)
+    next_chunk = asyncio.ensure_future(asyncio.to_thread(next, chunks, None))
+    while (chunk := await next_chunk) is not None:
+        next_chunk = asyncio.ensure_future(asyncio.to_thread(next, chunks, None))
+        yield chunk
+
+
+async def read_all(path: str, model: type[M]) -> list[M]:
+    """Returns every row of a dataset, read with read_dataset."""
+    rows: list[M] = []
+    async for chunk in read_dataset(path, model):
+        rows.extend(chunk)
+    return rows
+
+
+class _CsvWriter:
+    """Writes rows to a CSV dataset, and their embeddings to its sidecar."""
+
+    __file: TextIO
+    __writer: csv.DictWriter
+    __embeddings: Optional[sidecar.EmbeddingsWriter]
+
+    def __init__(self, path: str, model: type[BaseModel]):
+        columns = list(model.model_fields)
+        self.__file = open(path, "w")
+        self.__writer = csv.DictWriter(self.__file, columns, delimiter=",")
+        self.__writer.writeheader()
+        self.__embeddings = (
+            sidecar.EmbeddingsWriter(path) if "embedding" in columns else None
+        )
+
+    def __enter__(self) -> "_CsvWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.__file.close()
+        if self.__embeddings is not None:
+            self.__embeddings.__exit__(exc_type, exc_value, traceback)
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        self.__writer.writerows(rows)
+        if self.__embeddings is not None:
+            with_embedding = [row for row in rows if row.get("embedding")]
+            self.__embeddings.write(
+                [row["id"] for row in with_embedding],
+                [row["embedding"] for row in with_embedding],
+            )
+
+
+def _open_dataset(
+    path: str, model: type[BaseModel]
+) -> Union[_CsvWriter, parquet.Writer]:
+    if parquet.is_parquet(path):
+        return parquet.Writer(path, model)
+    return _CsvWriter(path, model)
+
+
+def _write_chunk(
+    writer: Union[_CsvWriter, parquet.Writer], chunk: list[dict[str, Any]]
+) -> None:
+    writer.write(
+        [
+            (
+                row | {"embedding": list(map(float, row["embedding"]))}
+                if row.get("embedding") is not None
+                else row
+            )
+            for row in chunk
+        ]
+    )
+
+
+async def write_dataset(
+    path: str,
+    model: type[BaseModel],
+    chunks: AsyncGenerator[list[dict[str, Any]], None],
+) -> None:
+    """Writes chunks of model rows to a dataset as they are produced.
+
+    The format is picked from the file extension, as in read_dataset. Each
+    chunk is written in a worker thread while the next one is fetched, so
+    only two chunks are held in memory at a time.
+    """
+    with _open_dataset(path, model) as writer:
+        pending: Optional[asyncio.Future] = None
+        try:
+            async with aclosing(chunks):
+                async for chunk in chunks:
+                    if pending is not None:
+                        await pending
+                    pending = asyncio.ensure_future(
+                        asyncio.to_thread(_write_chunk, writer, chunk)
+                    )
+        finally:
+            if pending is not None:
+                await pending
+
+
+def save_dataset(
+    path: str,
+    model: type[M],
+    items: Sequence[M],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> None:
+    """Writes models to a dataset, in the format of the file extension."""
+    with _open_dataset(path, model) as writer:
+        for i in range(0, len(items), chunk_size):
+            _write_chunk(
+                writer, [item.model_dump() for item in items[i : i + chunk_size]]
+            )
 
 
 class classproperty:
@@ -36,6 +262,12 @@ class classproperty:
 
 
 class Client(ABC, Generic[C]):
+    """A datastore the routes read from and write tickets to.
+
+    Lookups and searches answered by a single route return (results, sql),
+    where sql is the query shown alongside the results, or None.
+    """
+
     @classproperty
     @abstractmethod
     def kind(cls):
@@ -49,21 +281,101 @@ class Client(ABC, Generic[C]):
     async def load_dataset(
         self, airports_ds_path, amenities_ds_path, flights_ds_path
     ) -> tuple[List[models.Airport], List[models.Amenity], List[models.Flight]]:
-        airports: List[models.Airport] = []
-        with open(airports_ds_path, "r") as f:
-            reader = csv.DictReader(f, delimiter=",")
-            airports = [models.Airport.model_validate(line) for line in reader]
-
-        amenities: list[models.Amenity] = []
-        with open(amenities_ds_path, "r") as f:
-            reader = csv.DictReader(f, delimiter=",")
-            amenities = [models.Amenity.model_validate(line) for line in reader]
-
-        flights: List[models.Flight] = []
-        with open(flights_ds_path, "r") as f:
-            reader = csv.DictReader(f, delimiter=",")
-            flights = [models.Flight.model_validate(line) for line in reader]
-        return airports, amenities, flights
+        """Reads the datasets fully into memory, all three concurrently.
+
+        Only for providers that hold every row; import_dataset streams the
+        files instead where the provider can write in chunks.
+        """
+        return await asyncio.gather(
+            read_all(airports_ds_path, models.Airport),
+            read_all(amenities_ds_path, models.Amenity),
+            read_all(flights_ds_path, models.Flight),
+        )
+
+    async def import_dataset(
+        self,
+        airports_ds_path,
+        amenities_ds_path,
+        flights_ds_path,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        """Replaces the datastore contents with the CSV datasets.
+
+        Providers that can write incrementally override this to stream the
+        files in chunks instead of loading them fully into memory first.
+        """
+        airports, amenities, flights = await self.load_dataset(
+            airports_ds_path, amenities_ds_path, flights_ds_path
+        )
+        await self.initialize_data(airports, amenities, flights)
+
+    async def sync_dataset(
+        self,
+        airports_ds_path,
+        amenities_ds_path,
+        flights_ds_path,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> dict[str, TableChanges]:
+        """Applies only the differences between the datasets and the datastore.
+
+        Each row is hashed and compared with the hash stored when it was last
+        written. New and changed rows are upserted and rows missing from the
+        dataset are deleted, in batches of chunk_size. Everything else, such
+        as tickets and vector indexes, is left in place.
+        """
+        paths: list[tuple[Table, str]] = [
+            ("airports", airports_ds_path),
+            ("amenities", amenities_ds_path),
+            ("flights", flights_ds_path),
+        ]
+        changes = await asyncio.gather(
+            *(self.__sync_table(table, path, chunk_size) for table, path in paths)
+        )
+        return {table: c for (table, _), c in zip(paths, changes)}
+
+    async def __sync_table(
+        self, table: Table, path: str, chunk_size: int
+    ) -> TableChanges:
+        stored = await self.row_hashes(table)
+        changes = TableChanges()
+        seen: set[int] = set()
+        async for chunk in read_dataset(path, TABLE_MODELS[table], chunk_size):
+            rows, hashes = [], []
+            for row in chunk:
+                id = getattr(row, "id")
+                seen.add(id)
+                digest = row_hash(row)
+                if id not in stored:
+                    changes.inserted.append(id)
+                elif stored[id] != digest:
+                    changes.updated.append(id)
+                else:
+                    continue
+                rows.append(row)
+                hashes.append(digest)
+            if rows:
+                await self.upsert_rows(table, rows, hashes)
+
+        changes.deleted = [id for id in stored if id not in seen]
+        for i in range(0, len(changes.deleted), chunk_size):
+            await self.delete_rows(table, changes.deleted[i : i + chunk_size])
+        return changes
+
+    async def row_hashes(self, table: Table) -> dict[int, Optional[str]]:
+        """Returns the stored hash of every row of table by id.
+
+        Rows written before hashes were stored map to None.
+        """
+        raise NotImplementedError("Incremental import is not supported.")
+
+    async def upsert_rows(
+        self, table: Table, rows: Sequence[BaseModel], hashes: Sequence[str]
+    ) -> None:
+        """Inserts or replaces rows by id, storing their hashes."""
+        raise NotImplementedError("Incremental import is not supported.")
+
+    async def delete_rows(self, table: Table, ids: Sequence[int]) -> None:
+        raise NotImplementedError("Incremental import is not supported.")
 
     async def export_dataset(
         self,
@@ -74,60 +386,16 @@ class Client(ABC, Generic[C]):
         amenities_new_path,
         flights_new_path,
     ) -> None:
-        with open(airports_new_path, "w") as f:
-            col_names = ["id", "iata", "name", "city", "country"]
-            writer = csv.DictWriter(f, col_names, delimiter=",")
-            writer.writeheader()
-            for a in airports:
-                writer.writerow(a.model_dump())
-
-        with open(amenities_new_path, "w") as f:
-            col_names = [
-                "id",
-                "name",
-                "description",
-                "location",
-                "terminal",
-                "category",
-                "hour",
-                "sunday_start_hour",
-                "sunday_end_hour",
-                "monday_start_hour",
-                "monday_end_hour",
-                "tuesday_start_hour",
-                "tuesday_end_hour",
-                "wednesday_start_hour",
-                "wednesday_end_hour",
-                "thursday_start_hour",
-                "thursday_end_hour",
-                "friday_start_hour",
-                "friday_end_hour",
-                "saturday_start_hour",
-                "saturday_end_hour",
-                "content",
-                "embedding",
-            ]
-            writer = csv.DictWriter(f, col_names, delimiter=",")
-            writer.writeheader()
-            for a in amenities:
-                writer.writerow(a.model_dump())
-
-        with open(flights_new_path, "w") as f:
-            col_names = [
-                "id",
-                "airline",
-                "flight_number",
-                "departure_airport",
-                "arrival_airport",
-                "departure_time",
-                "arrival_time",
-                "departure_gate",
-                "arrival_gate",
-            ]
-            writer = csv.DictWriter(f, col_names, delimiter=",")
-            writer.writeheader()
-            for fl in flights:
-                writer.writerow(fl.model_dump())
+        """Writes the given rows to datasets, in the format of each extension."""
+        await asyncio.gather(
+            asyncio.to_thread(
+                save_dataset, airports_new_path, models.Airport, airports
+            ),
+            asyncio.to_thread(
+                save_dataset, amenities_new_path, models.Amenity, amenities
+            ),
+            asyncio.to_thread(save_dataset, flights_new_path, models.Flight, flights),
+        )
 
     @abstractmethod
     async def initialize_data(
@@ -144,12 +412,69 @@ class Client(ABC, Generic[C]):
     ) -> tuple[list[models.Airport], list[models.Amenity], list[models.Flight]]:
         pass
 
+    async def export_rows(
+        self, table: Table, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> AsyncGenerator[list[dict[str, Any]], None]:
+        """Yields the rows of table ordered by id, in chunks of at most chunk_size.
+
+        Providers backed by a database override this to stream the rows from
+        a server-side cursor instead of loading the table with export_data.
+        """
+        airports, amenities, flights = await self.export_data()
+        tables: dict[str, list[Any]] = {
+            "airports": airports,
+            "amenities": amenities,
+            "flights": flights,
+        }
+        rows = tables[table]
+        for i in range(0, len(rows), chunk_size):
+            yield [row.model_dump() for row in rows[i : i + chunk_size]]
+
+    async def stream_dataset(
+        self,
+        airports_new_path,
+        amenities_new_path,
+        flights_new_path,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        """Exports the datastore contents to datasets.
+
+        The tables are streamed concurrently, each straight into its file, so
+        with a provider that streams export_rows memory use does not grow
+        with the size of the tables.
+        """
+        paths: list[tuple[Table, str]] = [
+            ("airports", airports_new_path),
+            ("amenities", amenities_new_path),
+            ("flights", flights_new_path),
+        ]
+        await asyncio.gather(
+            *(
+                write_dataset(
+                    path, TABLE_MODELS[table], self.export_rows(table, chunk_size)
+                )
+                for table, path in paths
+            )
+        )
+
     @abstractmethod
-    async def get_airport_by_id(self, id: int) -> Optional[models.Airport]:
+    async def get_airport_by_id(
+        self, id: int
+    ) -> tuple[Optional[models.Airport], Optional[str]]:
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
-    async def get_airport_by_iata(self, iata: str) -> Optional[models.Airport]:
+    async def get_airport_by_iata(
+        self, iata: str
+    ) -> tuple[Optional[models.Airport], Optional[str]]:
+        raise NotImplementedError("Subclass should implement this!")
+
+    @abstractmethod
+    async def get_airports_by_ids(self, ids: list[int]) -> list[models.Airport]:
+        """Returns the airports with the given ids in the order requested.
+
+        Unknown ids are skipped and duplicates are returned once.
+        """
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
@@ -158,21 +483,125 @@ class Client(ABC, Generic[C]):
         country: Optional[str] = None,
         city: Optional[str] = None,
         name: Optional[str] = None,
-    ) -> list[models.Airport]:
+    ) -> tuple[list[models.Airport], Optional[str]]:
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
-    async def get_amenity(self, id: int) -> Optional[models.Amenity]:
+    async def get_amenity(
+        self, id: int
+    ) -> tuple[Optional[models.Amenity], Optional[str]]:
+        raise NotImplementedError("Subclass should implement this!")
+
+    @abstractmethod
+    async def get_amenities_by_ids(self, ids: list[int]) -> list[models.Amenity]:
+        """Returns the amenities with the given ids, like get_airports_by_ids."""
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
     async def amenities_search(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> tuple[list[models.Amenity], Optional[str]]:
+        raise NotImplementedError("Subclass should implement this!")
+
+    async def amenities_search_many(
+        self,
+        query_embeddings: list[list[float]],
+        similarity_threshold: float,
+        top_k: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> list[list[models.Amenity]]:
+        """Runs amenities_search for each embedding, returning one list each.
+
+        Providers that can answer all the queries in one round trip should
+        override this; by default the searches run concurrently.
+        """
+        searches = await asyncio.gather(
+            *[
+                self.amenities_search(e, similarity_threshold, top_k, ef_search, probes)
+                for e in query_embeddings
+            ]
+        )
+        return [results for results, _ in searches]
+
+    async def amenities_name_search(self, name: str) -> list[models.Amenity]:
+        """Returns the amenities whose name equals name, ignoring case."""
+        raise NotImplementedError("Subclass should implement this!")
+
+    async def amenities_text_search(
+        self, query: str, top_k: int
+    ) -> list[models.Amenity]:
+        """Returns the top_k amenities by full-text relevance to query."""
+        raise NotImplementedError("Subclass should implement this!")
+
+    async def amenities_hybrid_search(
+        self,
+        query: str,
+        embed: Embed,
+        similarity_threshold: float,
+        top_k: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
     ) -> list[models.Amenity]:
+        """Fuses full-text and vector search results by reciprocal rank.
+
+        A query that is exactly the name of an amenity is answered by the
+        name lookup alone, without embedding it.
+        """
+        exact = await self.amenities_name_search(query)
+        if exact:
+            return exact[:top_k]
+
+        async def vector_search() -> list[models.Amenity]:
+            results, _ = await self.amenities_search(
+                await embed(query), similarity_threshold, top_k, ef_search, probes
+            )
+            return results
+
+        lexical, semantic = await asyncio.gather(
+            self.amenities_text_search(query, top_k), vector_search()
+        )
+        return fusion.reciprocal_rank_fusion([lexical, semantic], top_k)
+
+    async def policies_search(
+        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+    ) -> tuple[list[models.Policy], Optional[str]]:
         raise NotImplementedError("Subclass should implement this!")
 
+    async def policies_text_search(self, query: str, top_k: int) -> list[models.Policy]:
+        """Returns the top_k policies by full-text relevance to query."""
+        raise NotImplementedError("Subclass should implement this!")
+
+    async def policies_hybrid_search(
+        self, query: str, embed: Embed, similarity_threshold: float, top_k: int
+    ) -> list[models.Policy]:
+        """Fuses full-text and vector search results by reciprocal rank."""
+
+        async def vector_search() -> list[models.Policy]:
+            results, _ = await self.policies_search(
+                await embed(query), similarity_threshold, top_k
+            )
+            return results
+
+        lexical, semantic = await asyncio.gather(
+            self.policies_text_search(query, top_k), vector_search()
+        )
+        return fusion.reciprocal_rank_fusion([lexical, semantic], top_k)
+
     @abstractmethod
-    async def get_flight(self, flight_id: int) -> Optional[models.Flight]:
+    async def get_flight(
+        self, flight_id: int
+    ) -> tuple[Optional[models.Flight], Optional[str]]:
+        raise NotImplementedError("Subclass should implement this!")
+
+    @abstractmethod
+    async def get_flights_by_ids(self, ids: list[int]) -> list[models.Flight]:
+        """Returns the flights with the given ids, like get_airports_by_ids."""
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
@@ -180,7 +609,7 @@ class Client(ABC, Generic[C]):
         self,
         airline: str,
         flight_number: str,
-    ) -> list[models.Flight]:
+    ) -> tuple[list[models.Flight], Optional[str]]:
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
@@ -189,7 +618,22 @@ class Client(ABC, Generic[C]):
         date,
         departure_airport: Optional[str] = None,
         arrival_airport: Optional[str] = None,
-    ) -> list[models.Flight]:
+    ) -> tuple[list[models.Flight], Optional[str]]:
+        raise NotImplementedError("Subclass should implement this!")
+
+    @abstractmethod
+    async def validate_ticket(
+        self,
+        airline: str,
+        flight_number: str,
+        departure_airport: str,
+        departure_time: str,
+    ) -> tuple[list[models.Flight], Optional[str]]:
+        """Returns the flights a ticket with these details could be for.
+
+        departure_time is formatted as "%Y-%m-%d %H:%M:%S"; codes match in
+        any case.
+        """
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
@@ -211,7 +655,7 @@ class Client(ABC, Generic[C]):
     async def list_tickets(
         self,
         user_id: str,
-    ) -> list[models.Ticket]:
+    ) -> tuple[list[models.Ticket], Optional[str]]:
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
@@ -219,9 +663,15 @@ class Client(ABC, Generic[C]):
         pass
 
 
-async def create(config: AbstractConfig) -> Client:
+async def create(
+    config: AbstractConfig, cache_config: Optional[cache.Config] = None
+) -> Client:
     for cls in Client.__subclasses__():
         s = f"{config.kind} == {cls.kind}"
         if config.kind == cls.kind:
-            return await cls.create(config)  # type: ignore
+            client = await cls.create(config)  # type: ignore
+            if cache_config is not None:
+                # The cache delegates everything it does not cache
+                return cache.Client(client, cache_config)  # type: ignore
+            return client
     raise TypeError(f"No clients of kind '{config.kind}'")
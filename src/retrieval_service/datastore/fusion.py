@@ -0,0 +1,65 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from typing import Protocol, Sequence, TypeVar
+
+
+class _Identified(Protocol):
+    id: int
+
+
+T = TypeVar("T", bound=_Identified)
+
+# Damps the weight of the top ranks, as in the original RRF paper
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[T]], top_k: int, k: int = RRF_K
+) -> list[T]:
+    """Merges rankings of items with an id by reciprocal rank fusion.
+
+    Each item scores the sum of 1 / (k + rank) over the rankings it
+    appears in. Ties keep the order in which items were first seen.
+    """
+    scores: dict[int, float] = {}
+    items: dict[int, T] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item.id] = scores.get(item.id, 0.0) + 1.0 / (k + rank)
+            items.setdefault(item.id, item)
+    ranked = sorted(scores, key=lambda id: scores[id], reverse=True)
+    return [items[id] for id in ranked[:top_k]]
+
+
+def tokenize(text: str) -> set[str]:
+    return set(re.findall(r"\w+", text.casefold()))
+
+
+def text_rank(query: str, documents: Sequence[str], top_k: int) -> list[int]:
+    """Returns the offsets of the top_k documents sharing the most query words.
+
+    A simple stand-in for full-text search where there is no database.
+    """
+    words = tokenize(query)
+    if not words or top_k <= 0:
+        return []
+    scores = [len(words & tokenize(d)) for d in documents]
+    ranked = sorted(
+        (i for i, score in enumerate(scores) if score > 0),
+        key=lambda i: scores[i],
+        reverse=True,
+    )
+    return ranked[:top_k]
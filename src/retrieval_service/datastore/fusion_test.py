@@ -0,0 +1,39 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import models
+
+from .fusion import reciprocal_rank_fusion, text_rank
+
+
+def policy(id: int) -> models.Policy:
+    return models.Policy(id=id, content=f"policy {id}")
+
+
+def test_reciprocal_rank_fusion():
+    lexical = [policy(1), policy(2), policy(3)]
+    semantic = [policy(3), policy(4), policy(1)]
+
+    fused = reciprocal_rank_fusion([lexical, semantic], top_k=3)
+
+    # 1 and 3 appear in both rankings; 1 was seen first
+    assert [p.id for p in fused] == [1, 3, 2]
+
+
+def test_text_rank():
+    documents = ["Coffee shop", "Shoe shop", "Coffee and tea shop", "Bakery"]
+
+    assert text_rank("coffee SHOP", documents, 3) == [0, 2, 1]
+    assert text_rank("pizza", documents, 3) == []
+    assert text_rank("", documents, 3) == []
@@ -0,0 +1,162 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import os
+from pathlib import PurePath
+from typing import Any, Iterator, Optional, Union, get_args, get_origin
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pydantic import BaseModel
+
+PARQUET_SUFFIX = ".parquet"
+
+_ARROW_TYPES = {
+    int: pa.int64(),
+    str: pa.string(),
+    datetime.time: pa.time64("us"),
+    datetime.datetime: pa.timestamp("us"),
+}
+
+
+def is_parquet(path: str) -> bool:
+    """Whether path names a Parquet dataset, e.g. amenities.parquet(.new)."""
+    return PARQUET_SUFFIX in PurePath(path).suffixes
+
+
+def _arrow_type(annotation: Any, dimensions: int) -> pa.DataType:
+    if get_origin(annotation) is Union:
+        (annotation,) = [a for a in get_args(annotation) if a is not type(None)]
+    if get_origin(annotation) is list:
+        # Embeddings are fixed-size float32 vectors, like the .npy sidecars
+        return pa.list_(pa.float32(), dimensions)
+    return _ARROW_TYPES[annotation]
+
+
+def schema(model: type[BaseModel], dimensions: int) -> pa.Schema:
+    """The Arrow schema of a dataset of model rows, in field order."""
+    return pa.schema(
+        [
+            pa.field(
+                name,
+                _arrow_type(field.annotation, dimensions),
+                nullable=not field.is_required(),
+            )
+            for name, field in model.model_fields.items()
+        ]
+    )
+
+
+def read_rows(path: str, chunk_size: int) -> Iterator[list[dict[str, Any]]]:
+    """Yields the rows of a Parquet dataset in chunks of at most chunk_size."""
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield batch.to_pylist()
+
+
+class Writer:
+    """Writes rows of a model to a Parquet dataset a chunk at a time.
+
+    The embedding size is part of the schema, so chunks are held back until
+    one has an embedding or the writer is closed. The file is only
+    replaced if the writer is closed without error.
+    """
+
+    __path: str
+    __model: type[BaseModel]
+    __writer: Optional[pq.ParquetWriter]
+    __pending: list[list[dict[str, Any]]]
+
+    def __init__(self, path: str, model: type[BaseModel]):
+        self.__path = path
+        self.__model = model
+        self.__writer = None
+        self.__pending = []
+
+    def __enter__(self) -> "Writer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        if self.__writer is None:
+            self.__pending.append(rows)
+            dimensions = self.__dimensions(rows)
+            if dimensions is None:
+                return
+            self.__open(dimensions)
+            return
+        self.__write(rows)
+
+    def close(self) -> None:
+        if self.__writer is None:
+            self.__open(0)
+        assert self.__writer is not None
+        self.__writer.close()
+        os.replace(self.__path + ".tmp", self.__path)
+
+    def discard(self) -> None:
+        if self.__writer is not None:
+            self.__writer.close()
+            os.remove(self.__path + ".tmp")
+
+    def __dimensions(self, rows: list[dict[str, Any]]) -> Optional[int]:
+        if "embedding" not in self.__model.model_fields:
+            return 0
+        for row in rows:
+            if row.get("embedding") is not None:
+                return len(row["embedding"])
+        return None
+
+    def __open(self, dimensions: int) -> None:
+        # Parquet itself has no fixed-size lists; storing the Arrow schema
+        # would make readers expect them and reject null embeddings.
+        self.__writer = pq.ParquetWriter(
+            self.__path + ".tmp", schema(self.__model, dimensions), store_schema=False
+        )
+        for rows in self.__pending:
+            self.__write(rows)
+        self.__pending = []
+
+    def __write(self, rows: list[dict[str, Any]]) -> None:
+        assert self.__writer is not None
+        schema = self.__writer.schema
+        index = schema.get_field_index("embedding")
+        if index < 0:
+            self.__writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            return
+        table = pa.Table.from_pylist(rows, schema=schema.remove(index))
+        field = schema.field(index)
+        self.__writer.write_table(
+            table.add_column(index, field, _embeddings(rows, field.type.list_size))
+        )
+
+
+def _embeddings(rows: list[dict[str, Any]], dimensions: int) -> pa.Array:
+    # Built from one float32 matrix, with zeros behind the null entries
+    vectors = np.zeros((len(rows), dimensions), dtype=np.float32)
+    missing = []
+    for i, row in enumerate(rows):
+        embedding = row.get("embedding")
+        missing.append(embedding is None)
+        if embedding is not None:
+            vectors[i] = embedding
+    return pa.FixedSizeListArray.from_arrays(
+        pa.array(vectors.reshape(-1)), dimensions, mask=pa.array(missing)
+    )
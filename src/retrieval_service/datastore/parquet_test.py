@@ -0,0 +1,121 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime, time
+from typing import AsyncGenerator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import models
+
+from . import parquet
+from .datastore import read_dataset, save_dataset, write_dataset
+
+amenities = [
+    models.Amenity(
+        id=1,
+        name="Coffee",
+        description="Espresso bar",
+        location="Gate A1",
+        terminal="Terminal 1",
+        category="restaurant",
+        hour="daily 6am-10pm",
+        monday_start_hour=time(6),
+        monday_end_hour=time(22),
+        content="Coffee and pastries",
+        embedding=[0.5, 0.25, 0.125],
+    ),
+    models.Amenity(
+        id=2,
+        name="Lounge",
+        description="Quiet lounge",
+        location="Gate B2",
+        terminal="Terminal 2",
+        category="lounge",
+        hour="closed",
+    ),
+]
+
+
+def test_is_parquet():
+    assert parquet.is_parquet("../data/amenity_dataset.parquet")
+    assert parquet.is_parquet("../data/amenity_dataset.parquet.new")
+    assert not parquet.is_parquet("../data/amenity_dataset.csv.new")
+
+
+def test_schema():
+    schema = parquet.schema(models.Amenity, 768)
+    assert schema.names == list(models.Amenity.model_fields)
+    assert schema.field("embedding").type == pa.list_(pa.float32(), 768)
+    assert schema.field("monday_start_hour").type == pa.time64("us")
+    assert not schema.field("id").nullable
+    assert schema.field("content").nullable
+    assert parquet.schema(models.Flight, 0).field("departure_time").type == (
+        pa.timestamp("us")
+    )
+
+
+@pytest.mark.asyncio
+async def test_save_and_read_dataset(tmp_path):
+    path = str(tmp_path / "amenity_dataset.parquet")
+    save_dataset(path, models.Amenity, amenities)
+
+    read: list[models.Amenity] = []
+    async for chunk in read_dataset(path, models.Amenity, chunk_size=1):
+        read.extend(chunk)
+    assert read == amenities
+
+    flights = [
+        models.Flight(
+            id=1,
+            airline="UA",
+            flight_number="1158",
+            departure_airport="SFO",
+            arrival_airport="ORD",
+            departure_time=datetime(2024, 1, 1, 5, 57),
+            arrival_time=datetime(2024, 1, 1, 12, 13),
+            departure_gate="C38",
+            arrival_gate="D30",
+        )
+    ]
+    path = str(tmp_path / "flights_dataset.parquet")
+    save_dataset(path, models.Flight, flights)
+    async for chunk in read_dataset(path, models.Flight):
+        assert chunk == flights
+
+
+@pytest.mark.asyncio
+async def test_write_dataset_waits_for_embedding_size(tmp_path):
+    path = str(tmp_path / "amenity_dataset.parquet")
+
+    async def chunks() -> AsyncGenerator[list[dict], None]:
+        yield [amenities[1].model_dump()]
+        yield [amenities[0].model_dump()]
+
+    await write_dataset(path, models.Amenity, chunks())
+    table = pq.read_table(path)
+    assert table.column("id").to_pylist() == [2, 1]
+    assert table.column("embedding").type.value_type == pa.float32()
+    assert table.column("embedding").to_pylist() == [None, [0.5, 0.25, 0.125]]
+
+    async def failing() -> AsyncGenerator[list[dict], None]:
+        yield [amenities[0].model_dump()]
+        raise RuntimeError("export failed")
+
+    with pytest.raises(RuntimeError):
+        await write_dataset(path, models.Amenity, failing())
+    assert pq.read_table(path).num_rows == 2
+    assert [p.name for p in tmp_path.iterdir()] == ["amenity_dataset.parquet"]
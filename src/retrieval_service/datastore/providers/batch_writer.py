@@ -0,0 +1,208 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Callable, Optional, Sequence
+
+from google.api_core import exceptions
+
+logger = logging.getLogger(__name__)
+
+# Most writes a single Firestore batch commit accepts
+MAX_BATCH_SIZE = 500
+
+# Errors that mean "slow down and try again" rather than a bad request
+RETRYABLE_ERRORS = (
+    exceptions.Aborted,
+    exceptions.DeadlineExceeded,
+    exceptions.ResourceExhausted,
+    exceptions.ServiceUnavailable,
+)
+
+# A set of data, or None to delete the document
+Write = tuple[Any, Optional[dict]]
+
+Progress = Callable[[str, int, int], None]
+
+
+def log_progress(label: str, written: int, total: int) -> None:
+    logger.info("%s: %d/%d documents written", label, written, total)
+
+
+class ResizableSemaphore:
+    """Semaphore whose number of slots can change while slots are held.
+
+    Waiters are woken one at a time, first come first served, as slots
+    are released or added.
+    """
+
+    __slots: int
+    __held: int
+    __waiters: deque[asyncio.Future[None]]
+
+    def __init__(self, slots: int):
+        self.__slots = slots
+        self.__held = 0
+        self.__waiters = deque()
+
+    @property
+    def slots(self) -> int:
+        return self.__slots
+
+    def resize(self, slots: int) -> None:
+        self.__slots = slots
+        self.__wake()
+
+    async def acquire(self) -> None:
+        if self.__held < self.__slots and not self.__waiters:
+            self.__held += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.__waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Cancelled after the slot was handed over; pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.__held -= 1
+        self.__wake()
+
+    def __wake(self) -> None:
+        while self.__held < self.__slots and self.__waiters:
+            waiter = self.__waiters.popleft()
+            if not waiter.done():
+                self.__held += 1
+                waiter.set_result(None)
+
+
+class BatchWriter:
+    """Commits document writes in batches with adaptive concurrency.
+
+    Like Firestore's BulkWriter, it starts with a single batch in flight
+    and grows by half each time as many batches as are allowed in flight
+    succeed, up to max_concurrency. A throttling error halves the
+    concurrency and the batch is retried with exponential backoff. The
+    limit is shared by all concurrent write() calls.
+    """
+
+    __client: Any
+    __max_concurrency: int
+    __batch_size: int
+    __max_attempts: int
+    __backoff: float
+    __progress: Progress
+    __progress_interval: float
+    __successes: int
+    __limit: ResizableSemaphore
+
+    def __init__(
+        self,
+        client: Any,
+        max_concurrency: int = 16,
+        batch_size: int = MAX_BATCH_SIZE,
+        max_attempts: int = 5,
+        backoff: float = 1.0,
+        progress: Progress = log_progress,
+        progress_interval: float = 5.0,
+    ):
+        self.__client = client
+        self.__max_concurrency = max_concurrency
+        self.__batch_size = batch_size
+        self.__max_attempts = max_attempts
+        self.__backoff = backoff
+        self.__progress = progress
+        self.__progress_interval = progress_interval
+        self.__successes = 0
+        self.__limit = ResizableSemaphore(1)
+
+    @property
+    def concurrency(self) -> int:
+        return self.__limit.slots
+
+    async def write(self, label: str, writes: Sequence[Write]) -> None:
+        """Commits all writes, reporting progress under label."""
+        total = len(writes)
+        written = 0
+        reported_at = time.monotonic()
+        batches: asyncio.Queue[Sequence[Write]] = asyncio.Queue()
+        for i in range(0, total, self.__batch_size):
+            batches.put_nowait(writes[i : i + self.__batch_size])
+
+        # No more workers than batches could ever be in flight at once; the
+        # semaphore decides how many of them commit at a time.
+        async def worker() -> None:
+            nonlocal written, reported_at
+            while not batches.empty():
+                chunk = batches.get_nowait()
+                await self.__limit.acquire()
+                try:
+                    await self.__commit(chunk)
+                finally:
+                    self.__limit.release()
+                written += len(chunk)
+                now = time.monotonic()
+                if written == total or now - reported_at >= self.__progress_interval:
+                    reported_at = now
+                    self.__progress(label, written, total)
+
+        workers = [
+            asyncio.create_task(worker())
+            for _ in range(min(self.__max_concurrency, batches.qsize()))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            raise
+
+    async def __commit(self, chunk: Sequence[Write]) -> None:
+        for attempt in range(self.__max_attempts):
+            batch = self.__client.batch()
+            for ref, data in chunk:
+                if data is None:
+                    batch.delete(ref)
+                else:
+                    batch.set(ref, data)
+            try:
+                await batch.commit()
+            except RETRYABLE_ERRORS:
+                if attempt == self.__max_attempts - 1:
+                    raise
+                self.__throttle()
+                await asyncio.sleep(self.__backoff * 2**attempt)
+                continue
+            self.__ramp_up()
+            return
+
+    def __ramp_up(self) -> None:
+        self.__successes += 1
+        concurrency = self.__limit.slots
+        if self.__successes >= concurrency:
+            self.__successes = 0
+            self.__limit.resize(
+                min(self.__max_concurrency, math.ceil(concurrency * 1.5))
+            )
+
+    def __throttle(self) -> None:
+        self.__successes = 0
+        self.__limit.resize(max(1, self.__limit.slots // 2))
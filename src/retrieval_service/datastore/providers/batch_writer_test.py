@@ -0,0 +1,128 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import pytest
+from google.api_core import exceptions
+
+from .batch_writer import BatchWriter, ResizableSemaphore
+
+
+class FakeBatch:
+    def __init__(self, client: "FakeClient"):
+        self.client = client
+        self.writes: list[tuple[str, str]] = []
+
+    def set(self, ref, data):
+        self.writes.append(("set", ref))
+
+    def delete(self, ref):
+        self.writes.append(("delete", ref))
+
+    async def commit(self):
+        self.client.in_flight += 1
+        self.client.max_in_flight = max(
+            self.client.max_in_flight, self.client.in_flight
+        )
+        try:
+            await asyncio.sleep(0.001)
+            if self.client.failures:
+                self.client.failures -= 1
+                raise exceptions.ResourceExhausted("slow down")
+            self.client.committed.append(self.writes)
+        finally:
+            self.client.in_flight -= 1
+
+
+class FakeClient:
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.committed: list[list[tuple[str, str]]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+@pytest.mark.asyncio
+async def test_writes_in_batches_with_bounded_concurrency():
+    client = FakeClient()
+    progress = []
+    writer = BatchWriter(
+        client,
+        max_concurrency=4,
+        batch_size=10,
+        progress=lambda *args: progress.append(args),
+        progress_interval=0,
+    )
+    writes = [(f"doc{i}", {"i": i}) for i in range(95)] + [("old", None)]
+
+    await writer.write("docs", writes)
+
+    assert sorted(len(c) for c in client.committed) == [6] + [10] * 9
+    [last] = [c for c in client.committed if len(c) == 6]
+    assert last[-1] == ("delete", "old")
+    assert client.max_in_flight <= 4
+    assert writer.concurrency == 4
+    assert progress[-1] == ("docs", 96, 96)
+    assert [written for _, written, _ in progress] == sorted(
+        written for _, written, _ in progress
+    )
+
+
+def ignore_progress(label: str, written: int, total: int) -> None:
+    pass
+
+
+@pytest.mark.asyncio
+async def test_throttling_errors_back_off_and_retry():
+    client = FakeClient(failures=2)
+    writer = BatchWriter(client, batch_size=5, backoff=0.001, progress=ignore_progress)
+
+    await writer.write("docs", [(f"doc{i}", {}) for i in range(5)])
+    assert len(client.committed) == 1
+    assert client.failures == 0
+
+    client.failures = 3
+    writer = BatchWriter(
+        client, max_attempts=3, backoff=0.001, progress=ignore_progress
+    )
+    with pytest.raises(exceptions.ResourceExhausted):
+        await writer.write("docs", [("doc", {})])
+
+
+@pytest.mark.asyncio
+async def test_resizable_semaphore_wakes_waiters_in_order():
+    semaphore = ResizableSemaphore(1)
+    order = []
+
+    async def hold(name: str) -> None:
+        await semaphore.acquire()
+        order.append(name)
+
+    await semaphore.acquire()
+    waiters = [asyncio.create_task(hold(name)) for name in "abc"]
+    await asyncio.sleep(0)
+    assert order == []
+
+    semaphore.resize(2)
+    await asyncio.sleep(0)
+    assert order == ["a"]
+
+    semaphore.release()
+    semaphore.release()
+    await asyncio.gather(*waiters)
+    assert order == ["a", "b", "c"]
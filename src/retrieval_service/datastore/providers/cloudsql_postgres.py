@@ -13,20 +13,29 @@
 # limitations under the License.
 
 import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Any, Dict, Literal, Optional
+from itertools import product
+from typing import Any, AsyncGenerator, AsyncIterator, Literal, Optional, Sequence
 
 import asyncpg
 import sqlalchemy
 from google.cloud.sql.connector import Connector, IPTypes
 from pgvector.asyncpg import register_vector
 from pydantic import BaseModel
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy import TextClause, event, text
+from sqlalchemy.engine.interfaces import CacheStats
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 
 import models
 
-from .. import datastore
+from .. import datastore, timing
+from .utils import (
+    AMENITY_TSVECTOR,
+    CONTENT_HASH_COLUMN,
+    upsert_statement,
+    vector_index_ddl,
+)
 
 POSTGRES_IDENTIFIER = "cloudsql-postgres"
 
@@ -39,53 +48,321 @@ class Config(BaseModel, datastore.AbstractConfig):
     user: str
     password: str
     database: str
+    vector_index: Literal["hnsw", "ivfflat", "none"] = "hnsw"
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 64
+    ivfflat_lists: int = 100
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_pre_ping: bool = True
+    pool_recycle: int = 1800
+
+
+def _search_airports_query(country: bool, city: bool, name: bool) -> TextClause:
+    filters: list[str] = []
+    if country:
+        filters.append("lower(country) = lower(:country)")
+    if city:
+        filters.append("lower(city) = lower(:city)")
+    if name:
+        filters.append("name ILIKE '%' || :name || '%'")
+    query = "SELECT * FROM airports"
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    return text(query + " ORDER BY id")
+
+
+# One statement per combination of supplied filters, keyed by which of
+# (country, city, name) are set, so that each combination is planned against
+# the matching index instead of a generic ":country IS NULL OR ..." predicate.
+SEARCH_AIRPORTS_QUERIES = {
+    filters: _search_airports_query(*filters)
+    for filters in product((False, True), repeat=3)
+}
+
+
+def _search_flights_by_airports_query(departure: bool, arrival: bool) -> TextClause:
+    filters: list[str] = []
+    if departure:
+        filters.append("departure_airport = :departure_airport")
+    if arrival:
+        filters.append("arrival_airport = :arrival_airport")
+    filters.append("departure_time >= CAST(:datetime AS timestamp)")
+    filters.append("departure_time < CAST(:datetime AS timestamp) + interval '1 day'")
+    return text(
+        "SELECT * FROM flights WHERE "
+        + " AND ".join(filters)
+        + " ORDER BY departure_time, id"
+    )
+
+
+# Keyed by which of (departure_airport, arrival_airport) are set.
+SEARCH_FLIGHTS_BY_AIRPORTS_QUERIES = {
+    filters: _search_flights_by_airports_query(*filters)
+    for filters in product((False, True), repeat=2)
+}
+
+
+# Statements are built once at import time so SQLAlchemy's compiled cache and
+# the asyncpg dialect's prepared statement cache are hit on every call.
+GET_AIRPORT_BY_ID_QUERY = text("SELECT * FROM airports WHERE id = :id")
+
+GET_AIRPORT_BY_IATA_QUERY = text(
+    "SELECT * FROM airports WHERE lower(iata) = lower(:iata)"
+)
+
+# Whether a table stores row hashes for incremental imports
+HAS_CONTENT_HASH_QUERY = text(
+    f"""
+    SELECT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = :table AND column_name = '{CONTENT_HASH_COLUMN}'
+    )
+    """
+)
+
+# Batch lookups return rows in the order of the requested ids
+GET_AIRPORTS_BY_IDS_QUERY = text(
+    """
+    SELECT * FROM airports WHERE id = ANY(:ids)
+    ORDER BY array_position(:ids, id)
+    """
+)
+
+GET_AMENITY_QUERY = text(
+    """
+    SELECT id, name, description, location, terminal, category, hour
+    FROM amenities WHERE id = :id
+    """
+)
+
+GET_AMENITIES_BY_IDS_QUERY = text(
+    """
+    SELECT id, name, description, location, terminal, category, hour
+    FROM amenities WHERE id = ANY(:ids)
+    ORDER BY array_position(:ids, id)
+    """
+)
+
+AMENITIES_NAME_SEARCH_QUERY = text(
+    """
+    SELECT id, name, description, location, terminal, category, hour
+    FROM amenities WHERE lower(name) = lower(:name)
+    ORDER BY id
+    """
+)
+
+AMENITIES_TEXT_SEARCH_QUERY = text(
+    f"""
+    SELECT id, name, description, location, terminal, category, hour
+    FROM amenities, websearch_to_tsquery('english', :query) AS query
+    WHERE {AMENITY_TSVECTOR} @@ query
+    ORDER BY ts_rank({AMENITY_TSVECTOR}, query) DESC, id
+    LIMIT :top_k
+    """
+)
+
+SET_EF_SEARCH_QUERY = text("SELECT set_config('hnsw.ef_search', :ef_search, true)")
+
+SET_PROBES_QUERY = text("SELECT set_config('ivfflat.probes', :probes, true)")
+
+# Order by distance and limit first so the vector index can serve the scan;
+# the similarity threshold is applied to the k nearest rows.
+AMENITIES_SEARCH_QUERY = text(
+    """
+    SELECT id, name, description, location, terminal, category, hour
+    FROM (
+        SELECT id, name, description, location, terminal, category, hour,
+          embedding <=> :query_embedding AS distance
+        FROM amenities
+        ORDER BY embedding <=> :query_embedding
+        LIMIT :top_k
+    ) AS nearest_amenities
+    WHERE 1 - distance > :similarity_threshold
+    ORDER BY distance
+    """
+)
+
+# One k-NN scan per query vector, joined laterally so that every query
+# still uses the vector index; ord is the 1-based position of the query.
+# The vectors are sent as text literals, since asyncpg would encode a
+# nested list as a two dimensional float array.
+AMENITIES_SEARCH_MANY_QUERY = text(
+    """
+    SELECT q.ord, a.id, a.name, a.description, a.location, a.terminal,
+      a.category, a.hour
+    FROM unnest(CAST(:query_embeddings AS text[]))
+      WITH ORDINALITY AS q(query_embedding, ord)
+    CROSS JOIN LATERAL (
+        SELECT id, name, description, location, terminal, category, hour,
+          embedding <=> CAST(q.query_embedding AS vector) AS distance
+        FROM amenities
+        ORDER BY embedding <=> CAST(q.query_embedding AS vector)
+        LIMIT :top_k
+    ) AS a
+    WHERE 1 - a.distance > :similarity_threshold
+    ORDER BY q.ord, a.distance
+    """
+)
+
+GET_FLIGHT_QUERY = text("SELECT * FROM flights WHERE id = :flight_id")
+
+GET_FLIGHTS_BY_IDS_QUERY = text(
+    """
+    SELECT * FROM flights WHERE id = ANY(:ids)
+    ORDER BY array_position(:ids, id)
+    """
+)
+
+SEARCH_FLIGHTS_BY_NUMBER_QUERY = text(
+    """
+    SELECT * FROM flights
+    WHERE airline = :airline
+    AND flight_number = :number
+    ORDER BY departure_time, id
+    """
+)
+
+VALIDATE_TICKET_QUERY = text(
+    """
+    SELECT * FROM flights
+    WHERE airline = :airline
+    AND flight_number = :number
+    AND departure_airport = :departure_airport
+    AND departure_time = :departure_time
+    ORDER BY id
+    """
+)
+
+
+def _normalize_codes(row: BaseModel) -> BaseModel:
+    # Airline and airport codes are stored upper case so lookups can use
+    # plain equality on the indexed columns.
+    if not isinstance(row, models.Flight):
+        return row
+    return row.model_copy(
+        update={
+            "airline": row.airline.upper(),
+            "departure_airport": row.departure_airport.upper(),
+            "arrival_airport": row.arrival_airport.upper(),
+        }
+    )
+
+
+def _columns(model: type[BaseModel]) -> list[str]:
+    return list(model.model_fields) + [CONTENT_HASH_COLUMN]
+
+
+def _records(
+    rows: Sequence[BaseModel], hashes: Optional[Sequence[str]] = None
+) -> list[tuple]:
+    # Hashes are those of the rows as in the dataset, before normalization
+    if hashes is None:
+        hashes = [datastore.row_hash(r) for r in rows]
+    return [
+        tuple(getattr(r, c) for c in type(r).model_fields) + (h,)
+        for r, h in zip(map(_normalize_codes, rows), hashes)
+    ]
 
 
 class Client(datastore.Client[Config]):
     __pool: AsyncEngine
+    __config: Config
+    __connector: Connector
 
     @datastore.classproperty
     def kind(cls):
         return "cloudsql-postgres"
 
-    def __init__(self, pool: AsyncEngine):
+    def __init__(self, pool: AsyncEngine, config: Config, connector: Connector):
         self.__pool = pool
+        self.__config = config
+        self.__connector = connector
+        # Hits and misses of SQLAlchemy's compiled statement cache. The
+        # asyncpg dialect keeps a prepared statement per compiled string, so
+        # a compiled cache hit also reuses the prepared statement.
+        self.__statements = {"hits": 0, "misses": 0}
+        event.listen(pool.sync_engine, "after_cursor_execute", self.__count_statement)
+
+    def __count_statement(self, conn, cursor, statement, params, context, many):
+        if context.cache_hit == CacheStats.CACHE_HIT:
+            self.__statements["hits"] += 1
+        elif context.cache_hit == CacheStats.CACHE_MISS:
+            self.__statements["misses"] += 1
 
     @classmethod
     async def create(cls, config: Config) -> "Client":
-        loop = asyncio.get_running_loop()
+        # One connector for the lifetime of the engine, so its certificate
+        # refresh and instance metadata are shared by every connection.
+        connector = Connector(loop=asyncio.get_running_loop())
+
+        async def connect() -> asyncpg.Connection:
+            return await connector.connect_async(
+                # Cloud SQL instance connection name
+                f"{config.project}:{config.region}:{config.instance}",
+                "asyncpg",
+                user=f"{config.user}",
+                password=f"{config.password}",
+                db=f"{config.database}",
+                ip_type=IPTypes.PSC,
+            )
+
+        # The vector type must exist before register_vector can run on pooled
+        # connections, so the extensions are created once up front.
+        conn = await connect()
+        try:
+            await conn.execute("CREATE EXTENSION IF NOT EXISTS google_ml_integration")
+            await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        finally:
+            await conn.close()
 
         async def getconn() -> asyncpg.Connection:
-            async with Connector(loop=loop) as connector:
-                conn: asyncpg.Connection = await connector.connect_async(
-                    # Cloud SQL instance connection name
-                    f"{config.project}:{config.region}:{config.instance}",
-                    "asyncpg",
-                    user=f"{config.user}",
-                    password=f"{config.password}",
-                    db=f"{config.database}",
-                    ip_type=IPTypes.PSC,
-                )
-            await conn.execute('CREATE EXTENSION IF NOT EXISTS google_ml_integration')
-            await conn.execute('CREATE EXTENSION IF NOT EXISTS vector')
+            conn = await connect()
             await register_vector(conn)
             return conn
 
         pool = create_async_engine(
             "postgresql+asyncpg://",
             async_creator=getconn,
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            pool_pre_ping=config.pool_pre_ping,
+            pool_recycle=config.pool_recycle,
         )
         if pool is None:
             raise TypeError("pool not instantiated")
-        return cls(pool)
-
-    async def initialize_data(
-        self,
-        airports: list[models.Airport],
-        amenities: list[models.Amenity],
-        flights: list[models.Flight],
-    ) -> None:
+        return cls(pool, config, connector)
+
+    def pool_stats(self) -> dict[str, int]:
+        pool: Any = self.__pool.pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+
+    def statement_stats(self) -> dict[str, int]:
+        return dict(self.__statements)
+
+    @asynccontextmanager
+    async def __connect(self) -> AsyncIterator[AsyncConnection]:
+        # Checking out a pooled connection is timed separately from the query
+        conn = self.__pool.connect()
+        with timing.span("pool"):
+            await conn.start()
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+    async def __create_tables(self) -> None:
         async with self.__pool.connect() as conn:
+            await conn.execute(
+                text("CREATE EXTENSION IF NOT EXISTS google_ml_integration")
+            )
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
             # If the table already exists, drop it to avoid conflicts
             await conn.execute(text("DROP TABLE IF EXISTS airports CASCADE"))
             # Create a new table
@@ -93,34 +370,17 @@ class Client(datastore.Client[Config]):
                 text(
                     """
                     CREATE TABLE airports(
-                      id INT PRIMARY KEY,
+                      id INT,
                       iata TEXT,
                       name TEXT,
                       city TEXT,
-                      country TEXT
+                      country TEXT,
+                      content_hash TEXT
                     )
                     """
                 )
             )
-            # Insert all the data
-            await conn.execute(
-                text(
-                    """INSERT INTO airports VALUES (:id, :iata, :name, :city, :country)"""
-                ),
-                [
-                    {
-                        "id": a.id,
-                        "iata": a.iata,
-                        "name": a.name,
-                        "city": a.city,
-                        "country": a.country,
-                    }
-                    for a in airports
-                ],
-            )
 
-            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS google_ml_integration"))
-            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
             # If the table already exists, drop it to avoid conflicts
             await conn.execute(text("DROP TABLE IF EXISTS amenities CASCADE"))
             # Create a new table
@@ -128,7 +388,7 @@ class Client(datastore.Client[Config]):
                 text(
                     """
                     CREATE TABLE amenities(
-                      id INT PRIMARY KEY,
+                      id INT,
                       name TEXT,
                       description TEXT,
                       location TEXT,
@@ -150,52 +410,12 @@ class Client(datastore.Client[Config]):
                       saturday_start_hour TIME,
                       saturday_end_hour TIME,
                       content TEXT NOT NULL,
-                      embedding vector(768) NOT NULL
+                      embedding vector(768) NOT NULL,
+                      content_hash TEXT
                     )
                     """
                 )
             )
-            # Insert all the data
-            await conn.execute(
-                text(
-                    """
-                    INSERT INTO amenities VALUES (:id, :name, :description, :location,
-                      :terminal, :category, :hour, :sunday_start_hour, :sunday_end_hour,
-                      :monday_start_hour, :monday_end_hour, :tuesday_start_hour,
-                      :tuesday_end_hour, :wednesday_start_hour, :wednesday_end_hour,
-                      :thursday_start_hour, :thursday_end_hour, :friday_start_hour,
-                      :friday_end_hour, :saturday_start_hour, :saturday_end_hour, :content, :embedding)
-                    """
-                ),
-                [
-                    {
-                        "id": a.id,
-                        "name": a.name,
-                        "description": a.description,
-                        "location": a.location,
-                        "terminal": a.terminal,
-                        "category": a.category,
-                        "hour": a.hour,
-                        "sunday_start_hour": a.sunday_start_hour,
-                        "sunday_end_hour": a.sunday_end_hour,
-                        "monday_start_hour": a.monday_start_hour,
-                        "monday_end_hour": a.monday_end_hour,
-                        "tuesday_start_hour": a.tuesday_start_hour,
-                        "tuesday_end_hour": a.tuesday_end_hour,
-                        "wednesday_start_hour": a.wednesday_start_hour,
-                        "wednesday_end_hour": a.wednesday_end_hour,
-                        "thursday_start_hour": a.thursday_start_hour,
-                        "thursday_end_hour": a.thursday_end_hour,
-                        "friday_start_hour": a.friday_start_hour,
-                        "friday_end_hour": a.friday_end_hour,
-                        "saturday_start_hour": a.saturday_start_hour,
-                        "saturday_end_hour": a.saturday_end_hour,
-                        "content": a.content,
-                        "embedding": a.embedding,
-                    }
-                    for a in amenities
-                ],
-            )
 
             # If the table already exists, drop it to avoid conflicts
             await conn.execute(text("DROP TABLE IF EXISTS flights CASCADE"))
@@ -204,7 +424,7 @@ class Client(datastore.Client[Config]):
                 text(
                     """
                     CREATE TABLE flights(
-                      id INTEGER PRIMARY KEY,
+                      id INTEGER,
                       airline TEXT,
                       flight_number TEXT,
                       departure_airport TEXT,
@@ -212,83 +432,228 @@ class Client(datastore.Client[Config]):
                       departure_time TIMESTAMP,
                       arrival_time TIMESTAMP,
                       departure_gate TEXT,
-                      arrival_gate TEXT
+                      arrival_gate TEXT,
+                      content_hash TEXT
                     )
                     """
                 )
             )
-            # Insert all the data
-            await conn.execute(
-                text(
-                    """
-                    INSERT INTO flights VALUES (:id, :airline, :flight_number,
-                      :departure_airport, :arrival_airport, :departure_time,
-                      :arrival_time, :departure_gate, :arrival_gate)
-                    """
-                ),
-                [
-                    {
-                        "id": f.id,
-                        "airline": f.airline,
-                        "flight_number": f.flight_number,
-                        "departure_airport": f.departure_airport,
-                        "arrival_airport": f.arrival_airport,
-                        "departure_time": f.departure_time,
-                        "arrival_time": f.arrival_time,
-                        "departure_gate": f.departure_gate,
-                        "arrival_gate": f.arrival_gate,
-                    }
-                    for f in flights
-                ],
-            )
             await conn.commit()
 
-    async def export_data(
-        self,
-    ) -> tuple[list[models.Airport], list[models.Amenity], list[models.Flight]]:
+    async def __create_indexes(self) -> None:
+        index_statements = [
+            "ALTER TABLE airports ADD PRIMARY KEY (id)",
+            "ALTER TABLE amenities ADD PRIMARY KEY (id)",
+            "ALTER TABLE flights ADD PRIMARY KEY (id)",
+            "CREATE INDEX airports_iata_lower_idx ON airports (lower(iata))",
+            "CREATE INDEX airports_city_lower_idx ON airports (lower(city))",
+            "CREATE INDEX airports_country_lower_idx ON airports (lower(country))",
+            "CREATE INDEX airports_name_trgm_idx ON airports "
+            "USING gin (name gin_trgm_ops)",
+            "CREATE INDEX amenities_name_lower_idx ON amenities (lower(name))",
+            "CREATE INDEX amenities_text_idx ON amenities "
+            f"USING gin ({AMENITY_TSVECTOR})",
+            "CREATE INDEX flights_departure_idx ON flights "
+            "(departure_airport, departure_time)",
+            "CREATE INDEX flights_arrival_idx ON flights "
+            "(arrival_airport, departure_time)",
+            "CREATE INDEX flights_number_idx ON flights "
+            "(airline, flight_number, departure_time)",
+        ]
+        index_ddl = vector_index_ddl(
+            "amenities",
+            "embedding",
+            self.__config.vector_index,
+            self.__config.hnsw_m,
+            self.__config.hnsw_ef_construction,
+            self.__config.ivfflat_lists,
+        )
+        if index_ddl is not None:
+            index_statements.append(index_ddl)
+
+        async def create_index(statement: str) -> None:
+            async with self.__pool.begin() as conn:
+                await conn.execute(text(statement))
+
+        await asyncio.gather(*[create_index(i) for i in index_statements])
+
+    async def __copy_records(self, table: str, rows: Sequence[BaseModel]) -> None:
+        # Binary COPY on a dedicated pooled connection; vectors are encoded
+        # with the pgvector codec registered in getconn.
+        if not rows:
+            return
         async with self.__pool.connect() as conn:
-            airport_task = asyncio.create_task(
-                conn.execute(text("""SELECT * FROM airports"""))
+            raw_conn = await conn.get_raw_connection()
+            driver_conn: asyncpg.Connection = raw_conn.driver_connection
+            await driver_conn.copy_records_to_table(
+                table, records=_records(rows), columns=_columns(type(rows[0]))
             )
 
-            amenity_task = asyncio.create_task(
-                conn.execute(text("""SELECT * FROM amenities"""))
+    async def __copy_dataset(
+        self, table: str, path: str, model: type[BaseModel], chunk_size: int
+    ) -> None:
+        # Chunks are parsed ahead in a worker thread while the previous chunk
+        # is being written, all on one pooled connection per table.
+        async with self.__pool.connect() as conn:
+            raw_conn = await conn.get_raw_connection()
+            driver_conn: asyncpg.Connection = raw_conn.driver_connection
+            async for chunk in datastore.read_dataset(path, model, chunk_size):
+                await driver_conn.copy_records_to_table(
+                    table, records=_records(chunk), columns=_columns(model)
+                )
+
+    async def initialize_data(
+        self,
+        airports: list[models.Airport],
+        amenities: list[models.Amenity],
+        flights: list[models.Flight],
+    ) -> None:
+        await self.__create_tables()
+        # Load all the data in parallel, one connection per table
+        await asyncio.gather(
+            self.__copy_records("airports", airports),
+            self.__copy_records("amenities", amenities),
+            self.__copy_records("flights", flights),
+        )
+        # Build indexes once the data is in place
+        await self.__create_indexes()
+        # Pooled connections cache prepared statements of the old tables
+        await self.__pool.dispose()
+
+    async def import_dataset(
+        self,
+        airports_ds_path,
+        amenities_ds_path,
+        flights_ds_path,
+        chunk_size: int = datastore.DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        await self.__create_tables()
+        # Stream all the data in parallel, one connection per table
+        await asyncio.gather(
+            self.__copy_dataset(
+                "airports", airports_ds_path, models.Airport, chunk_size
+            ),
+            self.__copy_dataset(
+                "amenities", amenities_ds_path, models.Amenity, chunk_size
+            ),
+            self.__copy_dataset("flights", flights_ds_path, models.Flight, chunk_size),
+        )
+        # Build indexes once the data is in place
+        await self.__create_indexes()
+        # Pooled connections cache prepared statements of the old tables
+        await self.__pool.dispose()
+
+    async def row_hashes(self, table: datastore.Table) -> dict[int, Optional[str]]:
+        async with self.__pool.begin() as conn:
+            # Tables created before hashes were stored get the column, and
+            # all their rows count as updated on the first incremental import.
+            result = await conn.execute(HAS_CONTENT_HASH_QUERY, {"table": table})
+            missing = not result.scalar()
+            if missing:
+                await conn.execute(
+                    text(f"ALTER TABLE {table} ADD COLUMN {CONTENT_HASH_COLUMN} TEXT")
+                )
+            result = await conn.execute(
+                text(f"SELECT id, {CONTENT_HASH_COLUMN} FROM {table}")
             )
-            flights_task = asyncio.create_task(
-                conn.execute(text("""SELECT * FROM flights"""))
+            rows = result.mappings().fetchall()
+        if missing:
+            # Pooled connections cache prepared statements without the column
+            await self.__pool.dispose()
+        return {row["id"]: row[CONTENT_HASH_COLUMN] for row in rows}
+
+    async def upsert_rows(
+        self, table: datastore.Table, rows: Sequence[BaseModel], hashes: Sequence[str]
+    ) -> None:
+        columns = _columns(datastore.TABLE_MODELS[table])
+        query = upsert_statement(table, columns, [f":{c}" for c in columns])
+        # A batch is sent as one executemany in a single transaction
+        async with self.__pool.begin() as conn:
+            await conn.execute(
+                text(query), [dict(zip(columns, r)) for r in _records(rows, hashes)]
             )
 
-            airport_results = (await airport_task).mappings().fetchall()
-            amenity_results = (await amenity_task).mappings().fetchall()
-            flights_results = (await flights_task).mappings().fetchall()
-
-            airports = [models.Airport.model_validate(a) for a in airport_results]
-            amenities = [models.Amenity.model_validate(a) for a in amenity_results]
-            flights = [models.Flight.model_validate(f) for f in flights_results]
-            return airports, amenities, flights
+    async def delete_rows(self, table: datastore.Table, ids: Sequence[int]) -> None:
+        async with self.__pool.begin() as conn:
+            await conn.execute(
+                text(f"DELETE FROM {table} WHERE id = ANY(:ids)"), {"ids": list(ids)}
+            )
 
-    async def get_airport_by_id(self, id: int) -> Optional[models.Airport]:
+    async def export_data(
+        self,
+    ) -> tuple[list[models.Airport], list[models.Amenity], list[models.Flight]]:
+        # One connection per table; a connection runs one statement at a time
+        airports, amenities, flights = await asyncio.gather(
+            self.__export_models("airports", models.Airport),
+            self.__export_models("amenities", models.Amenity),
+            self.__export_models("flights", models.Flight),
+        )
+        return airports, amenities, flights
+
+    async def __export_models(
+        self, table: datastore.Table, model: type[datastore.M]
+    ) -> list[datastore.M]:
+        return [
+            model.model_validate(row)
+            async for chunk in self.export_rows(table)
+            for row in chunk
+        ]
+
+    async def export_rows(
+        self, table: datastore.Table, chunk_size: int = datastore.DEFAULT_CHUNK_SIZE
+    ) -> AsyncGenerator[list[dict[str, Any]], None]:
+        columns = ", ".join(datastore.TABLE_COLUMNS[table])
+        # stream() fetches through a server-side cursor, chunk_size rows at a
+        # time, on a connection of its own.
         async with self.__pool.connect() as conn:
-            s = text("""SELECT * FROM airports WHERE id=:id""")
+            result = await conn.stream(
+                text(f"SELECT {columns} FROM {table} ORDER BY id ASC"),
+                execution_options={"yield_per": chunk_size},
+            )
+            async for rows in result.mappings().partitions(chunk_size):
+                yield [dict(row) for row in rows]
+
+    async def get_airport_by_id(
+        self, id: int
+    ) -> tuple[Optional[models.Airport], Optional[str]]:
+        async with self.__connect() as conn:
+            s = GET_AIRPORT_BY_ID_QUERY
             params = {"id": id}
-            result = (await conn.execute(s, params)).mappings().fetchone()
+            with timing.span("db"):
+                result = (await conn.execute(s, params)).mappings().fetchone()
 
         if result is None:
-            return None
+            return None, None
 
-        res = models.Airport.model_validate(result)
-        return res
+        with timing.span("validate"):
+            res = models.Airport.model_validate(result)
+        return res, None
 
-    async def get_airport_by_iata(self, iata: str) -> Optional[models.Airport]:
-        async with self.__pool.connect() as conn:
-            s = text("""SELECT * FROM airports WHERE iata ILIKE :iata""")
+    async def get_airport_by_iata(
+        self, iata: str
+    ) -> tuple[Optional[models.Airport], Optional[str]]:
+        async with self.__connect() as conn:
+            s = GET_AIRPORT_BY_IATA_QUERY
             params = {"iata": iata}
-            result = (await conn.execute(s, params)).mappings().fetchone()
+            with timing.span("db"):
+                result = (await conn.execute(s, params)).mappings().fetchone()
 
         if result is None:
-            return None
+            return None, None
+
+        with timing.span("validate"):
+            res = models.Airport.model_validate(result)
+        return res, None
+
+    async def get_airports_by_ids(self, ids: list[int]) -> list[models.Airport]:
+        async with self.__connect() as conn:
+            s = GET_AIRPORTS_BY_IDS_QUERY
+            params = {"ids": list(dict.fromkeys(ids))}
+            with timing.span("db"):
+                results = (await conn.execute(s, params)).mappings().fetchall()
 
-        res = models.Airport.model_validate(result)
+        with timing.span("validate"):
+            res = [models.Airport.model_validate(r) for r in results]
         return res
 
     async def search_airports(
@@ -296,135 +661,232 @@ class Client(datastore.Client[Config]):
         country: Optional[str] = None,
         city: Optional[str] = None,
         name: Optional[str] = None,
-    ) -> list[models.Airport]:
-        async with self.__pool.connect() as conn:
-            s = text(
-                """
-                SELECT * FROM airports
-                  WHERE (CAST(:country AS TEXT) IS NULL OR country ILIKE :country)
-                  AND (CAST(:city AS TEXT) IS NULL OR city ILIKE :city)
-                  AND (CAST(:name AS TEXT) IS NULL OR name ILIKE '%' || :name || '%')
-                """
-            )
-            params = {
-                "country": country,
-                "city": city,
-                "name": name,
-            }
-            results = (await conn.execute(s, params)).mappings().fetchall()
-
-        res = [models.Airport.model_validate(r) for r in results]
-        return res
-
-    async def get_amenity(self, id: int) -> Optional[models.Amenity]:
-        async with self.__pool.connect() as conn:
-            s = text(
-                """
-                SELECT id, name, description, location, terminal, category, hour
-                FROM amenities WHERE id=:id
-                """
-            )
+    ) -> tuple[list[models.Airport], Optional[str]]:
+        params = {
+            "country": country,
+            "city": city,
+            "name": name,
+        }
+        s = SEARCH_AIRPORTS_QUERIES[tuple(v is not None for v in params.values())]
+        params = {k: v for k, v in params.items() if v is not None}
+        async with self.__connect() as conn:
+            with timing.span("db"):
+                results = (await conn.execute(s, params)).mappings().fetchall()
+
+        with timing.span("validate"):
+            res = [models.Airport.model_validate(r) for r in results]
+        return res, None
+
+    async def get_amenity(
+        self, id: int
+    ) -> tuple[Optional[models.Amenity], Optional[str]]:
+        async with self.__connect() as conn:
+            s = GET_AMENITY_QUERY
             params = {"id": id}
-            result = (await conn.execute(s, params)).mappings().fetchone()
+            with timing.span("db"):
+                result = (await conn.execute(s, params)).mappings().fetchone()
 
         if result is None:
-            return None
+            return None, None
+
+        with timing.span("validate"):
+            res = models.Amenity.model_validate(result)
+        return res, None
+
+    async def get_amenities_by_ids(self, ids: list[int]) -> list[models.Amenity]:
+        async with self.__connect() as conn:
+            s = GET_AMENITIES_BY_IDS_QUERY
+            params = {"ids": list(dict.fromkeys(ids))}
+            with timing.span("db"):
+                results = (await conn.execute(s, params)).mappings().fetchall()
 
-        res = models.Amenity.model_validate(result)
+        with timing.span("validate"):
+            res = [models.Amenity.model_validate(r) for r in results]
         return res
 
     async def amenities_search(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> tuple[list[models.Amenity], Optional[str]]:
+        params = {
+            "query_embedding": query_embedding,
+            "similarity_threshold": similarity_threshold,
+            "top_k": top_k,
+        }
+        async with self.__connect() as conn, conn.begin():
+            with timing.span("db"):
+                if ef_search is not None:
+                    await conn.execute(
+                        SET_EF_SEARCH_QUERY,
+                        {"ef_search": str(ef_search)},
+                    )
+                if probes is not None:
+                    await conn.execute(
+                        SET_PROBES_QUERY,
+                        {"probes": str(probes)},
+                    )
+                s = AMENITIES_SEARCH_QUERY
+                results = (await conn.execute(s, params)).mappings().fetchall()
+
+        with timing.span("validate"):
+            res = [models.Amenity.model_validate(r) for r in results]
+        return res, None
+
+    async def amenities_name_search(self, name: str) -> list[models.Amenity]:
+        async with self.__connect() as conn:
+            s = AMENITIES_NAME_SEARCH_QUERY
+            params = {"name": name}
+            with timing.span("db"):
+                results = (await conn.execute(s, params)).mappings().fetchall()
+
+        with timing.span("validate"):
+            res = [models.Amenity.model_validate(r) for r in results]
+        return res
+
+    async def amenities_text_search(
+        self, query: str, top_k: int
     ) -> list[models.Amenity]:
-        async with self.__pool.connect() as conn:
-            s = text(
-                """
-                SELECT id, name, description, location, terminal, category, hour
-                  FROM (
-                      SELECT id, name, description, location, terminal, category, hour,
-                        1 - (embedding <=> :query_embedding) AS similarity
-                      FROM amenities
-                      WHERE 1 - (embedding <=> :query_embedding) > :similarity_threshold
-                      ORDER BY similarity DESC
-                      LIMIT :top_k
-                  ) AS sorted_amenities
-                """
-            )
-            params = {
-                "query_embedding": query_embedding,
-                "similarity_threshold": similarity_threshold,
-                "top_k": top_k,
-            }
-            results = (await conn.execute(s, params)).mappings().fetchall()
+        async with self.__connect() as conn:
+            s = AMENITIES_TEXT_SEARCH_QUERY
+            params = {"query": query, "top_k": top_k}
+            with timing.span("db"):
+                results = (await conn.execute(s, params)).mappings().fetchall()
+
+        with timing.span("validate"):
+            res = [models.Amenity.model_validate(r) for r in results]
+        return res
 
-        res = [models.Amenity.model_validate(r) for r in results]
+    async def amenities_search_many(
+        self,
+        query_embeddings: list[list[float]],
+        similarity_threshold: float,
+        top_k: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> list[list[models.Amenity]]:
+        params = {
+            "query_embeddings": [str(e) for e in query_embeddings],
+            "similarity_threshold": similarity_threshold,
+            "top_k": top_k,
+        }
+        async with self.__connect() as conn, conn.begin():
+            with timing.span("db"):
+                if ef_search is not None:
+                    await conn.execute(
+                        SET_EF_SEARCH_QUERY,
+                        {"ef_search": str(ef_search)},
+                    )
+                if probes is not None:
+                    await conn.execute(
+                        SET_PROBES_QUERY,
+                        {"probes": str(probes)},
+                    )
+                s = AMENITIES_SEARCH_MANY_QUERY
+                rows = (await conn.execute(s, params)).mappings().fetchall()
+
+        res: list[list[models.Amenity]] = [[] for _ in query_embeddings]
+        with timing.span("validate"):
+            for r in rows:
+                amenity = dict(r)
+                ord = amenity.pop("ord")
+                res[ord - 1].append(models.Amenity.model_validate(amenity))
         return res
 
-    async def get_flight(self, flight_id: int) -> Optional[models.Flight]:
-        async with self.__pool.connect() as conn:
-            s = text(
-                """
-                SELECT * FROM flights
-                  WHERE id = :flight_id
-                """
-            )
+    async def get_flight(
+        self, flight_id: int
+    ) -> tuple[Optional[models.Flight], Optional[str]]:
+        async with self.__connect() as conn:
+            s = GET_FLIGHT_QUERY
             params = {"flight_id": flight_id}
-            result = (await conn.execute(s, params)).mappings().fetchone()
+            with timing.span("db"):
+                result = (await conn.execute(s, params)).mappings().fetchone()
 
         if result is None:
-            return None
+            return None, None
+
+        with timing.span("validate"):
+            res = models.Flight.model_validate(result)
+        return res, None
+
+    async def get_flights_by_ids(self, ids: list[int]) -> list[models.Flight]:
+        async with self.__connect() as conn:
+            s = GET_FLIGHTS_BY_IDS_QUERY
+            params = {"ids": list(dict.fromkeys(ids))}
+            with timing.span("db"):
+                results = (await conn.execute(s, params)).mappings().fetchall()
 
-        res = models.Flight.model_validate(result)
+        with timing.span("validate"):
+            res = [models.Flight.model_validate(r) for r in results]
         return res
 
     async def search_flights_by_number(
         self,
         airline: str,
         number: str,
-    ) -> list[models.Flight]:
-        async with self.__pool.connect() as conn:
-            s = text(
-                """
-                SELECT * FROM flights
-                  WHERE airline = :airline
-                  AND flight_number = :number
-                """
-            )
+    ) -> tuple[list[models.Flight], Optional[str]]:
+        async with self.__connect() as conn:
+            s = SEARCH_FLIGHTS_BY_NUMBER_QUERY
             params = {
-                "airline": airline,
+                "airline": airline.upper(),
                 "number": number,
             }
-            results = (await conn.execute(s, params)).mappings().fetchall()
+            with timing.span("db"):
+                results = (await conn.execute(s, params)).mappings().fetchall()
 
-        res = [models.Flight.model_validate(r) for r in results]
-        return res
+        with timing.span("validate"):
+            res = [models.Flight.model_validate(r) for r in results]
+        return res, None
 
     async def search_flights_by_airports(
         self,
         date: str,
         departure_airport: Optional[str] = None,
         arrival_airport: Optional[str] = None,
-    ) -> list[models.Flight]:
-        async with self.__pool.connect() as conn:
-            s = text(
-                """
-                SELECT * FROM flights
-                  WHERE (CAST(:departure_airport AS TEXT) IS NULL OR departure_airport ILIKE :departure_airport)
-                  AND (CAST(:arrival_airport AS TEXT) IS NULL OR arrival_airport ILIKE :arrival_airport)
-                  AND departure_time >= CAST(:datetime AS timestamp)
-                  AND departure_time < CAST(:datetime AS timestamp) + interval '1 day'
-                """
-            )
+    ) -> tuple[list[models.Flight], Optional[str]]:
+        params: dict[str, Any] = {
+            "departure_airport": departure_airport,
+            "arrival_airport": arrival_airport,
+        }
+        s = SEARCH_FLIGHTS_BY_AIRPORTS_QUERIES[
+            tuple(v is not None for v in params.values())
+        ]
+        params = {k: v.upper() for k, v in params.items() if v is not None}
+        params["datetime"] = datetime.strptime(date, "%Y-%m-%d")
+        async with self.__connect() as conn:
+            with timing.span("db"):
+                results = (await conn.execute(s, params)).mappings().fetchall()
+
+        with timing.span("validate"):
+            res = [models.Flight.model_validate(r) for r in results]
+        return res, None
+
+    async def validate_ticket(
+        self,
+        airline: str,
+        flight_number: str,
+        departure_airport: str,
+        departure_time: str,
+    ) -> tuple[list[models.Flight], Optional[str]]:
+        async with self.__connect() as conn:
+            s = VALIDATE_TICKET_QUERY
             params = {
-                "departure_airport": departure_airport,
-                "arrival_airport": arrival_airport,
-                "datetime": datetime.strptime(date, "%Y-%m-%d"),
+                "airline": airline.upper(),
+                "number": flight_number,
+                "departure_airport": departure_airport.upper(),
+                "departure_time": datetime.strptime(
+                    departure_time, "%Y-%m-%d %H:%M:%S"
+                ),
             }
+            with timing.span("db"):
+                results = (await conn.execute(s, params)).mappings().fetchall()
 
-            results = (await conn.execute(s, params)).mappings().fetchall()
-
-        res = [models.Flight.model_validate(r) for r in results]
-        return res
+        with timing.span("validate"):
+            res = [models.Flight.model_validate(r) for r in results]
+        return res, None
 
     async def insert_ticket(
         self,
@@ -443,8 +905,9 @@ class Client(datastore.Client[Config]):
     async def list_tickets(
         self,
         user_id: str,
-    ) -> list[models.Ticket]:
+    ) -> tuple[list[models.Ticket], Optional[str]]:
         raise NotImplementedError("Not Implemented")
 
     async def close(self):
         await self.__pool.dispose()
+        await self.__connector.close_async()
@@ -174,8 +174,43 @@ async def test_export_dataset(ds: cloudsql_postgres.Client):
     assert diff_flights["columns_removed"] == []
 
 
+async def test_stream_dataset(ds: cloudsql_postgres.Client):
+    ds_paths = [
+        "../data/airport_dataset.csv",
+        "../data/amenity_dataset.csv",
+        "../data/flights_dataset.csv",
+    ]
+    new_paths = [f"{path}.streamed" for path in ds_paths]
+
+    await ds.stream_dataset(
+        airports_new_path=new_paths[0],
+        amenities_new_path=new_paths[1],
+        flights_new_path=new_paths[2],
+        chunk_size=100,
+    )
+
+    for ds_path, new_path in zip(ds_paths, new_paths):
+        diff = compare(load_csv(open(ds_path), "id"), load_csv(open(new_path), "id"))
+        assert diff["added"] == []
+        assert diff["removed"] == []
+        assert diff["changed"] == []
+        assert diff["columns_added"] == []
+        assert diff["columns_removed"] == []
+
+
+async def test_sync_dataset_without_changes(ds: cloudsql_postgres.Client):
+    changes = await ds.sync_dataset(
+        "../data/airport_dataset.csv",
+        "../data/amenity_dataset.csv",
+        "../data/flights_dataset.csv",
+    )
+    assert set(changes) == {"airports", "amenities", "flights"}
+    for table_changes in changes.values():
+        assert table_changes == datastore.TableChanges()
+
+
 async def test_get_airport_by_id(ds: cloudsql_postgres.Client):
-    res = await ds.get_airport_by_id(1)
+    res, sql = await ds.get_airport_by_id(1)
     expected = models.Airport(
         id=1,
         iata="MAG",
@@ -186,6 +221,18 @@ async def test_get_airport_by_id(ds: cloudsql_postgres.Client):
     assert res == expected
 
 
+async def test_get_by_ids(ds: cloudsql_postgres.Client):
+    airports = await ds.get_airports_by_ids([3, 1, 3, -1])
+    assert [a.id for a in airports] == [3, 1]
+    assert (airports[1], None) == await ds.get_airport_by_id(1)
+
+    amenities = await ds.get_amenities_by_ids([2, -1, 1])
+    assert amenities == [(await ds.get_amenity(2))[0], (await ds.get_amenity(1))[0]]
+
+    flights = await ds.get_flights_by_ids([2, 1])
+    assert flights == [(await ds.get_flight(2))[0], (await ds.get_flight(1))[0]]
+
+
 @pytest.mark.parametrize(
     "iata",
     [
@@ -194,7 +241,7 @@ async def test_get_airport_by_id(ds: cloudsql_postgres.Client):
     ],
 )
 async def test_get_airport_by_iata(ds: cloudsql_postgres.Client, iata: str):
-    res = await ds.get_airport_by_iata(iata)
+    res, sql = await ds.get_airport_by_iata(iata)
     expected = models.Airport(
         id=3270,
         iata="SFO",
@@ -283,12 +330,12 @@ async def test_search_airports(
     name: str,
     expected: List[models.Airport],
 ):
-    res = await ds.search_airports(country, city, name)
+    res, sql = await ds.search_airports(country, city, name)
     assert res == expected
 
 
 async def test_get_amenity(ds: cloudsql_postgres.Client):
-    res = await ds.get_amenity(1)
+    res, sql = await ds.get_amenity(1)
     expected = models.Amenity(
         id=1,
         name="24th & Mission Taco House",
@@ -430,12 +477,36 @@ async def test_amenities_search(
     top_k: int,
     expected: List[models.Amenity],
 ):
-    res = await ds.amenities_search(query_embedding, similarity_threshold, top_k)
+    res, sql = await ds.amenities_search(query_embedding, similarity_threshold, top_k)
     assert res == expected
 
 
+async def test_amenities_search_many(ds: cloudsql_postgres.Client):
+    query_embeddings = [query_embedding1, query_embedding2, query_embedding3]
+    res = await ds.amenities_search_many(query_embeddings, 0.5, 2)
+    assert res == [(await ds.amenities_search(e, 0.5, 2))[0] for e in query_embeddings]
+
+
+async def test_amenities_search_many_queries_the_database(ds: cloudsql_postgres.Client):
+    # The provider runs the batch itself instead of the per-query fallback
+    assert type(ds).amenities_search_many is not datastore.Client.amenities_search_many
+    query_embeddings = [query_embedding2, query_embedding1, query_embedding2]
+    res = await ds.amenities_search_many(query_embeddings, 0.6, 3)
+    assert res == [(await ds.amenities_search(e, 0.6, 3))[0] for e in query_embeddings]
+    assert res[0] == res[2] and res[0]
+
+
+async def test_amenities_text_search(ds: cloudsql_postgres.Client):
+    amenity, _ = await ds.get_amenity(1)
+    assert amenity is not None
+    assert await ds.amenities_name_search(amenity.name.upper()) == [amenity]
+
+    res = await ds.amenities_text_search("mexican entrees", 3)
+    assert amenity in res
+
+
 async def test_get_flight(ds: cloudsql_postgres.Client):
-    res = await ds.get_flight(1)
+    res, sql = await ds.get_flight(1)
     expected = models.Flight(
         id=1,
         airline="UA",
@@ -450,6 +521,15 @@ async def test_get_flight(ds: cloudsql_postgres.Client):
     assert res == expected
 
 
+async def test_validate_ticket(ds: cloudsql_postgres.Client):
+    flight, _ = await ds.get_flight(1)
+    res, sql = await ds.validate_ticket("ua", "1158", "sfo", "2024-01-01 05:57:00")
+    assert res == [flight]
+
+    res, sql = await ds.validate_ticket("UA", "1158", "SFO", "2024-01-01 06:57:00")
+    assert res == []
+
+
 search_flights_by_number_test_data = [
     pytest.param(
         "UA",
@@ -506,7 +586,7 @@ async def test_search_flights_by_number(
     number: str,
     expected: List[models.Flight],
 ):
-    res = await ds.search_flights_by_number(airline, number)
+    res, sql = await ds.search_flights_by_number(airline, number)
     assert res == expected
 
 
@@ -630,5 +710,7 @@ async def test_search_flights_by_airports(
     arrival_airport: str,
     expected: List[models.Flight],
 ):
-    res = await ds.search_flights_by_airports(date, departure_airport, arrival_airport)
+    res, sql = await ds.search_flights_by_airports(
+        date, departure_airport, arrival_airport
+    )
     assert res == expected
@@ -14,36 +14,111 @@
 
 import asyncio
 from datetime import datetime, timedelta
-from typing import Literal, Optional
+from typing import Any, Callable, Literal, Optional, TypeVar
 
 from google.cloud import firestore
-from google.cloud.firestore_v1.async_collection import AsyncCollectionReference
 from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.watch import ChangeType
 from pydantic import BaseModel
 
 import models
 
 from .. import datastore
+from ..vector_index import VectorIndex
+from .batch_writer import BatchWriter
+
+# Fields returned by amenities_search, matching the other providers
+AMENITY_FIELDS = ("name", "description", "location", "terminal", "category", "hour")
+
+# Seconds warm() waits by default for the first snapshot of a collection
+WATCH_TIMEOUT = 60
+
+
+T = TypeVar("T")
+
+
+def _lookup(cache: dict[int, T], ids: list[int]) -> list[T]:
+    return [cache[id] for id in dict.fromkeys(ids) if id in cache]
+
+
+def _amenity(amenity_dict: dict) -> models.Amenity:
+    return models.Amenity.model_validate(
+        {f: amenity_dict.get(f) for f in AMENITY_FIELDS} | {"id": amenity_dict["id"]}
+    )
 
 
 class Config(BaseModel, datastore.AbstractConfig):
     kind: Literal["firestore"]
     projectId: Optional[str]
+    # Most write batches of 500 documents in flight while loading data
+    max_write_concurrency: int = 16
 
 
 class Client(datastore.Client[Config]):
     __client: firestore.AsyncClient
+    # Snapshot listeners are only available on the synchronous client
+    __watch_client: Optional[firestore.Client]
+    # The reference collections, kept in process from snapshot listeners
+    __airports: dict[int, models.Airport]
+    __amenities: dict[int, models.Amenity]
+    __amenities_index: VectorIndex[models.Amenity]
+    __watches: dict[str, asyncio.Event]
+    __watch_handles: list[Any]
+    __max_write_concurrency: int
 
     @datastore.classproperty
     def kind(cls):
         return "firestore"
 
-    def __init__(self, client: firestore.AsyncClient):
+    def __init__(
+        self,
+        client: firestore.AsyncClient,
+        watch_client: Optional[firestore.Client] = None,
+        max_write_concurrency: int = 16,
+    ):
         self.__client = client
+        self.__watch_client = watch_client
+        self.__max_write_concurrency = max_write_concurrency
+        self.__airports = {}
+        self.__amenities = {}
+        self.__amenities_index = VectorIndex()
+        self.__watches = {}
+        self.__watch_handles = []
 
     @classmethod
     async def create(cls, config: Config) -> "Client":
-        return cls(firestore.AsyncClient(project=config.projectId))
+        client = cls(
+            firestore.AsyncClient(project=config.projectId),
+            firestore.Client(project=config.projectId),
+            config.max_write_concurrency,
+        )
+        # The listeners load the collections in the background, so startup
+        # does not wait. Until the first snapshots arrive, lookups read the
+        # documents and semantic search is unavailable.
+        client.__follow("airports", client.__apply_airport_changes)
+        client.__follow("amenities", client.__apply_amenity_changes)
+        return client
+
+    async def warm(self, timeout: float = WATCH_TIMEOUT) -> None:
+        """Waits until the watched collections are loaded in process.
+
+        Raises TimeoutError if a collection's first snapshot does not arrive
+        within timeout seconds.
+        """
+        for collection, apply in (
+            ("airports", self.__apply_airport_changes),
+            ("amenities", self.__apply_amenity_changes),
+        ):
+            ready = self.__follow(collection, apply)
+            if ready is None:
+                continue
+            try:
+                await asyncio.wait_for(ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(
+                    f"No snapshot of the Firestore '{collection}' collection "
+                    f"within {timeout} seconds"
+                )
 
     async def initialize_data(
         self,
@@ -51,47 +126,22 @@ class Client(datastore.Client[Config]):
         amenities: list[models.Amenity],
         flights: list[models.Flight],
     ) -> None:
-        async def delete_collections(collection_list: list[AsyncCollectionReference]):
-            # Checks if colelction exists and deletes all documents
-            delete_tasks = []
-            for collection_ref in collection_list:
-                collection_exists = collection_ref.limit(1).stream()
-                if not collection_exists:
-                    continue
-
-                docs = collection_ref.stream()
-                async for doc in docs:
-                    delete_tasks.append(asyncio.create_task(doc.reference.delete()))
-            asyncio.gather(*delete_tasks)
-
-        # Check if the collections already exist; if so, delete collections
-        airports_ref = self.__client.collection("airports")
-        amenities_ref = self.__client.collection("amenities")
-        flights_ref = self.__client.collection("flights")
-        await delete_collections([airports_ref, amenities_ref, flights_ref])
-
-        # initialize collections
-        create_airports_tasks = []
-        for airport in airports:
-            create_airports_tasks.append(
-                self.__client.collection("airports")
-                .document(str(airport.id))
-                .set(
+        collections: dict[str, list[tuple[str, dict]]] = {
+            "airports": [
+                (
+                    str(airport.id),
                     {
                         "iata": airport.iata,
                         "name": airport.name,
                         "city": airport.city,
                         "country": airport.country,
-                    }
+                    },
                 )
-            )
-        await asyncio.gather(*create_airports_tasks)
-        create_amenities_tasks = []
-        for amenity in amenities:
-            create_amenities_tasks.append(
-                self.__client.collection("amenities")
-                .document(str(amenity.id))
-                .set(
+                for airport in airports
+            ],
+            "amenities": [
+                (
+                    str(amenity.id),
                     {
                         "name": amenity.name,
                         "description": amenity.description,
@@ -101,16 +151,13 @@ class Client(datastore.Client[Config]):
                         "hour": amenity.hour,
                         "content": amenity.content,
                         "embedding": amenity.embedding,
-                    }
+                    },
                 )
-            )
-        await asyncio.gather(*create_amenities_tasks)
-        create_flights_tasks = []
-        for flight in flights:
-            create_flights_tasks.append(
-                self.__client.collection("flights")
-                .document(str(flight.id))
-                .set(
+                for amenity in amenities
+            ],
+            "flights": [
+                (
+                    str(flight.id),
                     {
                         "airline": flight.airline,
                         "flight_number": flight.flight_number,
@@ -120,14 +167,30 @@ class Client(datastore.Client[Config]):
                         "arrival_time": flight.arrival_time,
                         "departure_gate": flight.departure_gate,
                         "arrival_gate": flight.arrival_gate,
-                    }
+                    },
                 )
+                for flight in flights
+            ],
+        }
+        # One writer for both phases, so its concurrency limit applies to
+        # the whole load and the ramp-up carries over from the deletes.
+        writer = BatchWriter(self.__client, self.__max_write_concurrency)
+
+        async def delete_collection(name: str) -> None:
+            # Listing references reads no document data
+            collection_ref = self.__client.collection(name)
+            refs = [ref async for ref in collection_ref.list_documents()]
+            await writer.write(f"delete {name}", [(ref, None) for ref in refs])
+
+        # Wipe the existing collections in parallel
+        await asyncio.gather(*[delete_collection(name) for name in collections])
+
+        for name, documents in collections.items():
+            collection_ref = self.__client.collection(name)
+            await writer.write(
+                name,
+                [(collection_ref.document(id), data) for id, data in documents],
             )
-            if len(create_flights_tasks) % 10000 == 0:
-                # avoid gRPC batch write timeout error
-                await asyncio.gather(*create_flights_tasks)
-                create_flights_tasks.clear()
-        await asyncio.gather(*create_flights_tasks)
 
     async def export_data(
         self,
@@ -157,28 +220,62 @@ class Client(datastore.Client[Config]):
 
         return airports, amenities, flights
 
-    async def get_airport_by_id(self, id: int) -> Optional[models.Airport]:
-        query = self.__client.collection("airports").where(
-            filter=FieldFilter("id", "==", id)
-        )
-        airport_doc = await query.get()
-        airport_dict = airport_doc.to_dict() | {"id": airport_doc.id}
-        return models.Airport.model_validate(airport_dict)
-
-    async def get_airport_by_iata(self, iata: str) -> Optional[models.Airport]:
-        query = self.__client.collection("airports").where(
-            filter=FieldFilter("iata", "==", iata)
+    async def get_airport_by_id(
+        self, id: int
+    ) -> tuple[Optional[models.Airport], Optional[str]]:
+        if self.__watch("airports", self.__apply_airport_changes):
+            return self.__airports.get(id), None
+        airport_dict = await self.__get_by_id("airports", id)
+        if airport_dict is None:
+            return None, None
+        return models.Airport.model_validate(airport_dict), None
+
+    async def get_airport_by_iata(
+        self, iata: str
+    ) -> tuple[Optional[models.Airport], Optional[str]]:
+        # Codes are stored upper case; the other providers match any case
+        query = (
+            self.__client.collection("airports")
+            .where(filter=FieldFilter("iata", "==", iata.upper()))
+            .limit(1)
         )
-        airport_doc = await query.get()
-        airport_dict = airport_doc.to_dict() | {"id": airport_doc.id}
-        return models.Airport.model_validate(airport_dict)
+        docs = await query.get()
+        if not docs:
+            return None, None
+        airport_dict = (docs[0].to_dict() or {}) | {"id": docs[0].id}
+        return models.Airport.model_validate(airport_dict), None
+
+    async def __get_by_id(self, collection: str, id: int) -> Optional[dict]:
+        # Documents are keyed by id, so this is a point read, not a query
+        doc = await self.__client.collection(collection).document(str(id)).get()
+        if not doc.exists:
+            return None
+        return (doc.to_dict() or {}) | {"id": doc.id}
+
+    async def __get_by_ids(self, collection: str, ids: list[int]) -> list[dict]:
+        # Documents are keyed by id, so one get_all round trip fetches them
+        # all; it yields in arbitrary order and includes missing documents.
+        ids = list(dict.fromkeys(ids))
+        collection_ref = self.__client.collection(collection)
+        refs = [collection_ref.document(str(id)) for id in ids]
+        docs = {}
+        async for doc in self.__client.get_all(refs):
+            if doc.exists:
+                docs[doc.id] = (doc.to_dict() or {}) | {"id": doc.id}
+        return [docs[str(id)] for id in ids if str(id) in docs]
+
+    async def get_airports_by_ids(self, ids: list[int]) -> list[models.Airport]:
+        if self.__watch("airports", self.__apply_airport_changes):
+            return _lookup(self.__airports, ids)
+        docs = await self.__get_by_ids("airports", ids)
+        return [models.Airport.model_validate(d) for d in docs]
 
     async def search_airports(
         self,
         country: Optional[str] = None,
         city: Optional[str] = None,
         name: Optional[str] = None,
-    ) -> list[models.Airport]:
+    ) -> tuple[list[models.Airport], Optional[str]]:
         query = self.__client.collection("airports")
 
         if country is not None:
@@ -195,34 +292,126 @@ class Client(datastore.Client[Config]):
         async for doc in docs:
             airport_dict = doc.to_dict() | {"id": doc.id}
             airports.append(models.Airport.model_validate(airport_dict))
-        return airports
+        return airports, None
+
+    async def get_amenity(
+        self, id: int
+    ) -> tuple[Optional[models.Amenity], Optional[str]]:
+        if self.__watch("amenities", self.__apply_amenity_changes):
+            return self.__amenities.get(id), None
+        amenity_dict = await self.__get_by_id("amenities", id)
+        if amenity_dict is None:
+            return None, None
+        return _amenity(amenity_dict), None
+
+    async def get_amenities_by_ids(self, ids: list[int]) -> list[models.Amenity]:
+        if self.__watch("amenities", self.__apply_amenity_changes):
+            return _lookup(self.__amenities, ids)
+        docs = await self.__get_by_ids("amenities", ids)
+        return [_amenity(d) for d in docs]
 
-    async def get_amenity(self, id: int) -> Optional[models.Amenity]:
-        query = self.__client.collection("amenities").where(
-            filter=FieldFilter("id", "==", id)
+    async def amenities_search(
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> tuple[list[models.Amenity], Optional[str]]:
+        # Exact search in process; ef_search and probes only tune indexes.
+        if self.__watch_client is None:
+            raise NotImplementedError(
+                "Semantic search requires a synchronous Firestore client."
+            )
+        if not self.__watch("amenities", self.__apply_amenity_changes):
+            raise NotImplementedError(
+                "Semantic search is unavailable until the amenities are loaded."
+            )
+        results = self.__amenities_index.search(
+            query_embedding, similarity_threshold, top_k
         )
-        amenity_doc = await query.get()
-        amenity_dict = amenity_doc.to_dict() | {"id": amenity_doc.id}
-        return models.Amenity.model_validate(amenity_dict)
+        return results, None
+
+    def __watch(self, collection: str, apply: Callable[[list], None]) -> bool:
+        """Returns whether collection is loaded in process.
+
+        The documents are loaded once from the first snapshot of the
+        collection, then kept up to date from the changes that follow.
+        """
+        ready = self.__follow(collection, apply)
+        return ready is not None and ready.is_set()
+
+    def __follow(
+        self, collection: str, apply: Callable[[list], None]
+    ) -> Optional[asyncio.Event]:
+        """Starts following collection, or returns None if it cannot.
+
+        The returned event is set once the first snapshot is applied.
+        """
+        if self.__watch_client is None:
+            return None
+        ready = self.__watches.get(collection)
+        if ready is None:
+            loop = asyncio.get_running_loop()
+            ready = self.__watches[collection] = asyncio.Event()
+
+            def on_snapshot(docs, changes, read_time):
+                # Called on the listener thread; the caches are only touched
+                # from the event loop.
+                loop.call_soon_threadsafe(self.__apply_changes, apply, changes, ready)
+
+            self.__watch_handles.append(
+                self.__watch_client.collection(collection).on_snapshot(on_snapshot)
+            )
+        return ready
 
-    async def amenities_search(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
-    ) -> list[models.Amenity]:
-        raise NotImplementedError("Semantic search not yet supported in Firestore.")
+    def __apply_changes(
+        self, apply: Callable[[list], None], changes: list, ready: asyncio.Event
+    ) -> None:
+        apply(changes)
+        ready.set()
+
+    def __apply_airport_changes(self, changes: list) -> None:
+        for change in changes:
+            doc = change.document
+            id = int(doc.id)
+            if change.type == ChangeType.REMOVED:
+                self.__airports.pop(id, None)
+                continue
+            self.__airports[id] = models.Airport.model_validate(
+                doc.to_dict() | {"id": id}
+            )
 
-    async def get_flight(self, flight_id: int) -> Optional[models.Flight]:
-        query = self.__client.collection("flights").where(
-            filter=FieldFilter("id", "==", flight_id)
-        )
-        flight_doc = await query.get()
-        flight_dict = flight_doc.to_dict() | {"id": flight_doc.id}
-        return models.Flight.model_validate(flight_dict)
+    def __apply_amenity_changes(self, changes: list) -> None:
+        for change in changes:
+            doc = change.document
+            id = int(doc.id)
+            if change.type == ChangeType.REMOVED:
+                self.__amenities.pop(id, None)
+                self.__amenities_index.remove(id)
+                continue
+            amenity_dict = doc.to_dict()
+            amenity = _amenity(amenity_dict | {"id": id})
+            self.__amenities[id] = amenity
+            self.__amenities_index.upsert(id, amenity, amenity_dict.get("embedding"))
+
+    async def get_flight(
+        self, flight_id: int
+    ) -> tuple[Optional[models.Flight], Optional[str]]:
+        flight_dict = await self.__get_by_id("flights", flight_id)
+        if flight_dict is None:
+            return None, None
+        return models.Flight.model_validate(flight_dict), None
+
+    async def get_flights_by_ids(self, ids: list[int]) -> list[models.Flight]:
+        docs = await self.__get_by_ids("flights", ids)
+        return [models.Flight.model_validate(d) for d in docs]
 
     async def search_flights_by_number(
         self,
         airline: str,
         number: str,
-    ) -> list[models.Flight]:
+    ) -> tuple[list[models.Flight], Optional[str]]:
         query = (
             self.__client.collection("flights")
             .where(filter=FieldFilter("airline", "==", airline))
@@ -234,14 +423,14 @@ class Client(datastore.Client[Config]):
         async for doc in docs:
             flight_dict = doc.to_dict() | {"id": doc.id}
             flights.append(models.Flight.model_validate(flight_dict))
-        return flights
+        return flights, None
 
     async def search_flights_by_airports(
         self,
         date: str,
         departure_airport: Optional[str] = None,
         arrival_airport: Optional[str] = None,
-    ) -> list[models.Flight]:
+    ) -> tuple[list[models.Flight], Optional[str]]:
         date_obj = datetime.strptime(date, "%Y-%m-%d").date()
         date_timestamp = datetime.combine(date_obj, datetime.min.time())
         query = (
@@ -260,7 +449,37 @@ class Client(datastore.Client[Config]):
         async for doc in docs:
             flight_dict = doc.to_dict() | {"id": doc.id}
             flights.append(models.Flight.model_validate(flight_dict))
-        return flights
+        return flights, None
+
+    async def validate_ticket(
+        self,
+        airline: str,
+        flight_number: str,
+        departure_airport: str,
+        departure_time: str,
+    ) -> tuple[list[models.Flight], Optional[str]]:
+        # Codes are stored upper case; the other providers match any case
+        query = (
+            self.__client.collection("flights")
+            .where(filter=FieldFilter("airline", "==", airline.upper()))
+            .where(filter=FieldFilter("flight_number", "==", flight_number))
+            .where(
+                filter=FieldFilter("departure_airport", "==", departure_airport.upper())
+            )
+            .where(
+                filter=FieldFilter(
+                    "departure_time",
+                    "==",
+                    datetime.strptime(departure_time, "%Y-%m-%d %H:%M:%S"),
+                )
+            )
+        )
+
+        flights = []
+        async for doc in query.stream():
+            flight_dict = (doc.to_dict() or {}) | {"id": doc.id}
+            flights.append(models.Flight.model_validate(flight_dict))
+        return flights, None
 
     async def insert_ticket(
         self,
@@ -279,8 +498,12 @@ class Client(datastore.Client[Config]):
     async def list_tickets(
         self,
         user_id: str,
-    ) -> list[models.Ticket]:
+    ) -> tuple[list[models.Ticket], Optional[str]]:
         raise NotImplementedError("Not Implemented")
 
     async def close(self):
+        for handle in self.__watch_handles:
+            handle.unsubscribe()
+        if self.__watch_client is not None:
+            self.__watch_client.close()
         self.__client.close()
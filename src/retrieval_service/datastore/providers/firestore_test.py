@@ -12,9 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import os
 from datetime import datetime
 from typing import Dict
 
+import pytest
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 
@@ -92,7 +95,7 @@ async def test_get_airport_by_id():
     mock_firestore_client.collection["airports"] = mock_collection
 
     mock_client = await mock_client(mock_firestore_client)
-    res = await mock_client.get_airport_by_id(fake_id)
+    res, sql = await mock_client.get_airport_by_id(fake_id)
     expected_res = models.Airport(
         id=fake_id,
         iata="Fake iata",
@@ -121,7 +124,7 @@ async def test_get_airport_by_iata():
     mock_firestore_client.collection["airports"] = mock_collection
 
     mock_client = await mock_client(mock_firestore_client)
-    res = await mock_client.get_airport_by_iata(fake_iata)
+    res, sql = await mock_client.get_airport_by_iata(fake_iata)
     expected_res = models.Airport(
         id=fake_id,
         iata=fake_iata,
@@ -152,7 +155,7 @@ async def test_search_airports():
     mock_firestore_client.collection["airports"] = mock_collection
 
     mock_client = await mock_client(mock_firestore_client)
-    res = await mock_client.search_airports(fake_country, fake_city, fake_name)
+    res, sql = await mock_client.search_airports(fake_country, fake_city, fake_name)
     expected_res = [
         models.Airport(
             id=fake_id,
@@ -191,7 +194,7 @@ async def test_get_amenity():
     mock_firestore_client.collection["amenities"] = mock_collection
 
     mock_client = await mock_client(mock_firestore_client)
-    res = await mock_client.get_amenity(fake_id)
+    res, sql = await mock_client.get_amenity(fake_id)
     expected_res = models.Amenity(
         id=fake_id,
         name="Fake name",
@@ -223,7 +226,7 @@ async def test_amenities_search():
     mock_firestore_client.collection["amenities"] = mock_collection
 
     mock_client = await mock_client(mock_firestore_client)
-    res = await mock_client.amenities_search(1, 0.7, 1)
+    res, sql = await mock_client.amenities_search(1, 0.7, 1)
     expected_res = [
         models.Amenity(
             id=fake_id,
@@ -260,7 +263,7 @@ async def test_get_flight():
     mock_firestore_client.collection["flights"] = mock_collection
 
     mock_client = await mock_client(mock_firestore_client)
-    res = await mock_client.get_flight(fake_id)
+    res, sql = await mock_client.get_flight(fake_id)
     expected_res = models.Flight(
         id=fake_id,
         airline="Fake airline",
@@ -298,7 +301,7 @@ async def test_search_flights_by_airports():
     mock_firestore_client.collection["flights"] = mock_collection
 
     mock_client = await mock_client(mock_firestore_client)
-    res = await mock_client.search_flights_by_airport(
+    res, sql = await mock_client.search_flights_by_airport(
         fake_date, "Fake departure airport", "Fake arrival airport"
     )
     expected_res = [
@@ -315,3 +318,147 @@ async def test_search_flights_by_airports():
         )
     ]
     assert res == expected_res
+
+
+class MockWatchCollection:
+    """
+    Mock collection of the synchronous client; on_snapshot delivers docs
+    at once, or never if docs is None.
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def on_snapshot(self, callback):
+        if self.docs is not None:
+            callback(self.docs, [], None)
+        return self
+
+
+class MockWatchClient:
+    """
+    Mock synchronous firestore client for snapshot listeners.
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def collection(self, collection_name: str):
+        return MockWatchCollection(self.docs)
+
+
+@pytest.mark.asyncio
+async def test_warm_loads_watched_collections():
+    ds = firestore_provider.Client(MockFirestoreClient(), MockWatchClient([]))
+    await ds.warm(timeout=0.1)
+    assert await ds.get_airport_by_id(1) == (None, None)
+    assert await ds.amenities_search([1.0, 0.0], 0.5, 1) == ([], None)
+
+    ds = firestore_provider.Client(MockFirestoreClient(), MockWatchClient(None))
+    with pytest.raises(TimeoutError, match="No snapshot of the Firestore"):
+        await ds.warm(timeout=0.1)
+
+
+@pytest.mark.asyncio
+async def test_amenities_search_while_loading():
+    ds = firestore_provider.Client(MockFirestoreClient(), MockWatchClient(None))
+    with pytest.raises(NotImplementedError, match="until the amenities are loaded"):
+        await ds.amenities_search([1.0, 0.0], 0.5, 1)
+
+
+def emulator_amenity(id: int, name: str, embedding: list[float]) -> models.Amenity:
+    return models.Amenity(
+        id=id,
+        name=name,
+        description="Fake description",
+        location="Fake location",
+        terminal="Fake terminal",
+        category="Fake category",
+        hour="Fake hour",
+        content="Fake content",
+        embedding=embedding,
+    )
+
+
+@pytest.mark.skipif(
+    "FIRESTORE_EMULATOR_HOST" not in os.environ,
+    reason="requires the Firestore emulator",
+)
+@pytest.mark.asyncio
+async def test_amenities_search_follows_changes():
+    project = "test-project"
+    async_client = firestore.AsyncClient(project=project)
+    ds = firestore_provider.Client(async_client, firestore.Client(project=project))
+    await ds.initialize_data(
+        [],
+        [
+            emulator_amenity(1, "East", [1.0, 0.0, 0.0]),
+            emulator_amenity(2, "North", [0.0, 1.0, 0.0]),
+        ],
+        [],
+    )
+    await ds.warm()
+
+    res, sql = await ds.amenities_search([1.0, 0.1, 0.0], 0.5, 2)
+    assert [a.id for a in res] == [1]
+    assert res[0].embedding is None
+
+    await async_client.collection("amenities").document("3").set(
+        {f: "Fake" for f in firestore_provider.AMENITY_FIELDS}
+        | {"embedding": [0.0, 0.0, 1.0]}
+    )
+    await async_client.collection("amenities").document("1").delete()
+
+    async def search() -> list[list[int]]:
+        return [
+            [a.id for a in (await ds.amenities_search(e, 0.5, 2))[0]]
+            for e in ([0.0, 0.0, 1.0], [1.0, 0.1, 0.0])
+        ]
+
+    # Changes reach the index asynchronously through the snapshot listener
+    for _ in range(50):
+        if await search() == [[3], []]:
+            break
+        await asyncio.sleep(0.1)
+    assert await search() == [[3], []]
+
+    await ds.close()
+
+
+@pytest.mark.skipif(
+    "FIRESTORE_EMULATOR_HOST" not in os.environ,
+    reason="requires the Firestore emulator",
+)
+@pytest.mark.asyncio
+async def test_get_by_id_reads_documents_and_cache():
+    project = "test-project"
+    async_client = firestore.AsyncClient(project=project)
+    airports = [
+        models.Airport(id=1, iata="SFO", name="SFO", city="SF", country="US"),
+        models.Airport(id=2, iata="LAX", name="LAX", city="LA", country="US"),
+    ]
+    ds = firestore_provider.Client(async_client)
+    await ds.initialize_data(airports, [emulator_amenity(1, "East", [1.0])], [])
+
+    assert await ds.get_airport_by_iata("lax") == (airports[1], None)
+    assert await ds.get_airport_by_iata("JFK") == (None, None)
+
+    # Without a listener, lookups are point reads of the documents
+    assert await ds.get_airport_by_id(2) == (airports[1], None)
+    assert await ds.get_airport_by_id(3) == (None, None)
+    assert await ds.get_airports_by_ids([2, 3, 1]) == [airports[1], airports[0]]
+    amenity, _ = await ds.get_amenity(1)
+    assert amenity is not None and amenity.embedding is None
+
+    cached = firestore_provider.Client(async_client, firestore.Client(project=project))
+    await cached.warm()
+    assert await cached.get_airports_by_ids([2, 3, 1]) == [airports[1], airports[0]]
+    await async_client.collection("airports").document("2").delete()
+    for _ in range(50):
+        if await cached.get_airport_by_id(2) == (None, None):
+            break
+        await asyncio.sleep(0.1)
+    assert await cached.get_airport_by_id(2) == (None, None)
+    assert await cached.get_amenities_by_ids([1]) == [amenity]
+
+    await cached.close()
@@ -0,0 +1,427 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime, timedelta
+from typing import Literal, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel
+
+import models
+
+from .. import datastore, fusion
+
+MEMORY_IDENTIFIER = "memory"
+
+EMBEDDING_DIMENSIONS = 768
+
+# Columns returned by get_amenity and amenities_search, matching the
+# projection used by the Postgres providers.
+AMENITY_FIELDS = {
+    "id",
+    "name",
+    "description",
+    "location",
+    "terminal",
+    "category",
+    "hour",
+}
+
+
+class Config(BaseModel, datastore.AbstractConfig):
+    kind: Literal["memory"]
+    airports_ds_path: Optional[str] = None
+    amenities_ds_path: Optional[str] = None
+    flights_ds_path: Optional[str] = None
+    policies_ds_path: Optional[str] = None
+
+
+class Client(datastore.Client[Config]):
+    __airports: dict[int, models.Airport]
+    __amenities: list[models.Amenity]
+    __flights: dict[int, models.Flight]
+    __policies: list[models.Policy]
+    __tickets: list[models.Ticket]
+    # Amenity rows followed by policy rows, L2-normalized so that a single
+    # matrix-vector product yields cosine similarities.
+    __embeddings: np.ndarray
+
+    @datastore.classproperty
+    def kind(cls):
+        return "memory"
+
+    def __init__(self):
+        self.__airports = {}
+        self.__amenities = []
+        self.__flights = {}
+        self.__policies = []
+        self.__tickets = []
+        self.__embeddings = np.zeros((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+
+    @classmethod
+    async def create(cls, config: Config) -> "Client":
+        client = cls()
+        if (
+            config.airports_ds_path is None
+            or config.amenities_ds_path is None
+            or config.flights_ds_path is None
+        ):
+            return client
+
+        airports, amenities, flights = await client.load_dataset(
+            config.airports_ds_path, config.amenities_ds_path, config.flights_ds_path
+        )
+        policies: list[models.Policy] = []
+        if config.policies_ds_path is not None:
+            policies = await datastore.read_all(config.policies_ds_path, models.Policy)
+        await client.initialize_data(airports, amenities, flights, policies)
+        return client
+
+    async def initialize_data(
+        self,
+        airports: list[models.Airport],
+        amenities: list[models.Amenity],
+        flights: list[models.Flight],
+        policies: Optional[list[models.Policy]] = None,
+    ) -> None:
+        policies = policies or []
+        self.__airports = {a.id: a for a in airports}
+        self.__amenities = list(amenities)
+        self.__flights = {f.id: f for f in flights}
+        self.__policies = list(policies)
+        self.__tickets = []
+        self.__index_embeddings()
+
+    def __index_embeddings(self) -> None:
+        vectors = [a.embedding for a in self.__amenities] + [
+            p.embedding for p in self.__policies
+        ]
+        dimensions = next((len(v) for v in vectors if v), EMBEDDING_DIMENSIONS)
+        embeddings = np.zeros((len(vectors), dimensions), dtype=np.float32)
+        for i, v in enumerate(vectors):
+            if v:
+                embeddings[i] = v
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.where(norms == 0, 1, norms)
+        self.__embeddings = embeddings
+
+    async def export_data(
+        self,
+    ) -> tuple[list[models.Airport], list[models.Amenity], list[models.Flight]]:
+        airports = [self.__airports[id] for id in sorted(self.__airports)]
+        amenities = sorted(self.__amenities, key=lambda a: a.id)
+        flights = [self.__flights[id] for id in sorted(self.__flights)]
+        return airports, amenities, flights
+
+    def __rows(self, table: datastore.Table) -> list[BaseModel]:
+        if table == "airports":
+            return list(self.__airports.values())
+        if table == "amenities":
+            return list(self.__amenities)
+        return list(self.__flights.values())
+
+    async def row_hashes(self, table: datastore.Table) -> dict[int, Optional[str]]:
+        # Rows are kept as validated, so their hashes are computed on demand
+        return {
+            getattr(row, "id"): datastore.row_hash(row) for row in self.__rows(table)
+        }
+
+    async def upsert_rows(
+        self, table: datastore.Table, rows: Sequence[BaseModel], hashes: Sequence[str]
+    ) -> None:
+        if table == "airports":
+            self.__airports.update(
+                {r.id: r for r in rows if isinstance(r, models.Airport)}
+            )
+        elif table == "flights":
+            self.__flights.update(
+                {r.id: r for r in rows if isinstance(r, models.Flight)}
+            )
+        else:
+            offsets = {a.id: i for i, a in enumerate(self.__amenities)}
+            for row in rows:
+                if not isinstance(row, models.Amenity):
+                    continue
+                if row.id in offsets:
+                    self.__amenities[offsets[row.id]] = row
+                else:
+                    self.__amenities.append(row)
+            self.__index_embeddings()
+
+    async def delete_rows(self, table: datastore.Table, ids: Sequence[int]) -> None:
+        if table == "airports":
+            for id in ids:
+                self.__airports.pop(id, None)
+        elif table == "flights":
+            for id in ids:
+                self.__flights.pop(id, None)
+        else:
+            deleted = set(ids)
+            self.__amenities = [a for a in self.__amenities if a.id not in deleted]
+            self.__index_embeddings()
+
+    def __nearest(
+        self,
+        rows: slice,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+    ) -> list[int]:
+        """Returns the row offsets within `rows` of the top_k most similar vectors."""
+        matrix = self.__embeddings[rows]
+        if top_k <= 0 or len(matrix) == 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+
+        similarities = matrix @ (query / norm)
+        k = min(top_k, len(similarities))
+        candidates = np.argpartition(-similarities, k - 1)[:k]
+        candidates = candidates[np.argsort(-similarities[candidates], kind="stable")]
+        return [int(i) for i in candidates if similarities[i] > similarity_threshold]
+
+    async def get_airport_by_id(
+        self, id: int
+    ) -> tuple[Optional[models.Airport], Optional[str]]:
+        return self.__airports.get(id), None
+
+    async def get_airports_by_ids(self, ids: list[int]) -> list[models.Airport]:
+        return [
+            self.__airports[id] for id in dict.fromkeys(ids) if id in self.__airports
+        ]
+
+    async def get_airport_by_iata(
+        self, iata: str
+    ) -> tuple[Optional[models.Airport], Optional[str]]:
+        iata = iata.lower()
+        for airport in self.__airports.values():
+            if airport.iata.lower() == iata:
+                return airport, None
+        return None, None
+
+    async def search_airports(
+        self,
+        country: Optional[str] = None,
+        city: Optional[str] = None,
+        name: Optional[str] = None,
+    ) -> tuple[list[models.Airport], Optional[str]]:
+        results = []
+        for airport in self.__airports.values():
+            if country is not None and airport.country.lower() != country.lower():
+                continue
+            if city is not None and airport.city.lower() != city.lower():
+                continue
+            if name is not None and name.lower() not in airport.name.lower():
+                continue
+            results.append(airport)
+        return results, None
+
+    async def get_amenity(
+        self, id: int
+    ) -> tuple[Optional[models.Amenity], Optional[str]]:
+        for amenity in self.__amenities:
+            if amenity.id == id:
+                return (
+                    models.Amenity.model_validate(
+                        amenity.model_dump(include=AMENITY_FIELDS)
+                    ),
+                    None,
+                )
+        return None, None
+
+    async def get_amenities_by_ids(self, ids: list[int]) -> list[models.Amenity]:
+        amenities = {a.id: a for a in self.__amenities}
+        return [
+            models.Amenity.model_validate(
+                amenities[id].model_dump(include=AMENITY_FIELDS)
+            )
+            for id in dict.fromkeys(ids)
+            if id in amenities
+        ]
+
+    async def amenities_name_search(self, name: str) -> list[models.Amenity]:
+        name = name.casefold()
+        return [
+            models.Amenity.model_validate(a.model_dump(include=AMENITY_FIELDS))
+            for a in self.__amenities
+            if a.name.casefold() == name
+        ]
+
+    async def amenities_text_search(
+        self, query: str, top_k: int
+    ) -> list[models.Amenity]:
+        documents = [
+            f"{a.name} {a.description} {a.content or ''}" for a in self.__amenities
+        ]
+        return [
+            models.Amenity.model_validate(
+                self.__amenities[i].model_dump(include=AMENITY_FIELDS)
+            )
+            for i in fusion.text_rank(query, documents, top_k)
+        ]
+
+    async def amenities_search(
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> tuple[list[models.Amenity], Optional[str]]:
+        # Exact search; ef_search and probes only tune approximate indexes.
+        rows = slice(0, len(self.__amenities))
+        results = self.__nearest(rows, query_embedding, similarity_threshold, top_k)
+        amenities = [
+            models.Amenity.model_validate(
+                self.__amenities[i].model_dump(include=AMENITY_FIELDS)
+            )
+            for i in results
+        ]
+        return amenities, None
+
+    async def policies_search(
+        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+    ) -> tuple[list[models.Policy], Optional[str]]:
+        offset = len(self.__amenities)
+        rows = slice(offset, offset + len(self.__policies))
+        results = self.__nearest(rows, query_embedding, similarity_threshold, top_k)
+        policies = [
+            models.Policy(id=self.__policies[i].id, content=self.__policies[i].content)
+            for i in results
+        ]
+        return policies, None
+
+    async def policies_text_search(self, query: str, top_k: int) -> list[models.Policy]:
+        documents = [p.content for p in self.__policies]
+        return [
+            models.Policy(id=self.__policies[i].id, content=self.__policies[i].content)
+            for i in fusion.text_rank(query, documents, top_k)
+        ]
+
+    async def get_flight(
+        self, flight_id: int
+    ) -> tuple[Optional[models.Flight], Optional[str]]:
+        return self.__flights.get(flight_id), None
+
+    async def get_flights_by_ids(self, ids: list[int]) -> list[models.Flight]:
+        return [self.__flights[id] for id in dict.fromkeys(ids) if id in self.__flights]
+
+    async def search_flights_by_number(
+        self,
+        airline: str,
+        number: str,
+    ) -> tuple[list[models.Flight], Optional[str]]:
+        airline = airline.lower()
+        results = [
+            f
+            for f in self.__flights.values()
+            if f.airline.lower() == airline and f.flight_number == number
+        ]
+        return results, None
+
+    async def search_flights_by_airports(
+        self,
+        date: str,
+        departure_airport: Optional[str] = None,
+        arrival_airport: Optional[str] = None,
+    ) -> tuple[list[models.Flight], Optional[str]]:
+        start = datetime.strptime(date, "%Y-%m-%d")
+        end = start + timedelta(days=1)
+        results = []
+        for flight in self.__flights.values():
+            if not start <= flight.departure_time < end:
+                continue
+            if (
+                departure_airport is not None
+                and flight.departure_airport.lower() != departure_airport.lower()
+            ):
+                continue
+            if (
+                arrival_airport is not None
+                and flight.arrival_airport.lower() != arrival_airport.lower()
+            ):
+                continue
+            results.append(flight)
+        return results, None
+
+    async def validate_ticket(
+        self,
+        airline: str,
+        flight_number: str,
+        departure_airport: str,
+        departure_time: str,
+    ) -> tuple[list[models.Flight], Optional[str]]:
+        departure_time_datetime = datetime.strptime(departure_time, "%Y-%m-%d %H:%M:%S")
+        results = [
+            f
+            for f in self.__flights.values()
+            if f.airline.lower() == airline.lower()
+            and f.flight_number.lower() == flight_number.lower()
+            and f.departure_airport.lower() == departure_airport.lower()
+            and f.departure_time == departure_time_datetime
+        ]
+        return results, None
+
+    async def insert_ticket(
+        self,
+        user_id: str,
+        user_name: str,
+        user_email: str,
+        airline: str,
+        flight_number: str,
+        departure_airport: str,
+        arrival_airport: str,
+        departure_time: str,
+        arrival_time: str,
+    ):
+        departure_time_datetime = datetime.strptime(departure_time, "%Y-%m-%d %H:%M:%S")
+        arrival_time_datetime = datetime.strptime(arrival_time, "%Y-%m-%d %H:%M:%S")
+        flights, _ = await self.validate_ticket(
+            airline, flight_number, departure_airport, departure_time
+        )
+        flights = [
+            f
+            for f in flights
+            if f.arrival_airport.lower() == arrival_airport.lower()
+            and f.arrival_time == arrival_time_datetime
+        ]
+        if len(flights) != 1:
+            raise Exception("Flight information not in database")
+        self.__tickets.append(
+            models.Ticket.model_validate(
+                {
+                    "user_id": user_id,
+                    "user_name": user_name,
+                    "user_email": user_email,
+                    "airline": airline,
+                    "flight_number": flight_number,
+                    "departure_airport": departure_airport,
+                    "arrival_airport": arrival_airport,
+                    "departure_time": departure_time_datetime,
+                    "arrival_time": arrival_time_datetime,
+                }
+            )
+        )
+
+    async def list_tickets(
+        self,
+        user_id: str,
+    ) -> tuple[list[models.Ticket], Optional[str]]:
+        results = [t for t in self.__tickets if str(t.user_id) == str(user_id)]
+        return results, None
+
+    async def close(self):
+        pass
@@ -0,0 +1,323 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+from datetime import datetime
+from typing import AsyncGenerator, List
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+
+import models
+
+from .. import datastore, sidecar
+from ..fusion import reciprocal_rank_fusion
+from . import memory
+from .test_data import query_embedding1, query_embedding2, query_embedding3
+
+pytestmark = pytest.mark.asyncio(scope="module")
+
+flights = [
+    models.Flight(
+        id=1,
+        airline="UA",
+        flight_number="1158",
+        departure_airport="SFO",
+        arrival_airport="ORD",
+        departure_time=datetime.strptime("2024-01-01 05:57:00", "%Y-%m-%d %H:%M:%S"),
+        arrival_time=datetime.strptime("2024-01-01 12:13:00", "%Y-%m-%d %H:%M:%S"),
+        departure_gate="C38",
+        arrival_gate="D30",
+    ),
+    models.Flight(
+        id=2,
+        airline="AA",
+        flight_number="242",
+        departure_airport="SFO",
+        arrival_airport="JFK",
+        departure_time=datetime.strptime("2024-01-02 08:18:00", "%Y-%m-%d %H:%M:%S"),
+        arrival_time=datetime.strptime("2024-01-02 16:26:00", "%Y-%m-%d %H:%M:%S"),
+        departure_gate="E30",
+        arrival_gate="C1",
+    ),
+]
+
+
+@pytest_asyncio.fixture(scope="module")
+async def ds(tmp_path_factory) -> AsyncGenerator[datastore.Client, None]:
+    flights_ds_path = tmp_path_factory.mktemp("data") / "flights_dataset.csv"
+    with open(flights_ds_path, "w") as f:
+        writer = csv.DictWriter(f, list(models.Flight.model_fields), delimiter=",")
+        writer.writeheader()
+        for fl in flights:
+            writer.writerow(fl.model_dump())
+
+    cfg = memory.Config(
+        kind="memory",
+        airports_ds_path="../data/airport_dataset.csv",
+        amenities_ds_path="../data/amenity_dataset.csv",
+        flights_ds_path=str(flights_ds_path),
+        policies_ds_path="../data/cymbalair_policy.csv",
+    )
+    ds = await datastore.create(cfg)
+    if ds is None:
+        raise TypeError("datastore creation failure")
+    yield ds
+    await ds.close()
+
+
+async def test_export_data(ds: memory.Client):
+    airports, amenities, res = await ds.export_data()
+    assert len(airports) > 0
+    assert len(amenities) > 0
+    assert res == flights
+
+
+async def test_stream_dataset(ds: memory.Client, tmp_path):
+    exported = [str(tmp_path / f"exported_{name}.csv") for name in ("a", "m", "f")]
+    streamed = [str(tmp_path / f"streamed_{name}.csv") for name in ("a", "m", "f")]
+    await ds.export_dataset(*await ds.export_data(), *exported)
+    await ds.stream_dataset(
+        airports_new_path=streamed[0],
+        amenities_new_path=streamed[1],
+        flights_new_path=streamed[2],
+        chunk_size=7,
+    )
+
+    for exported_path, streamed_path in zip(exported, streamed):
+        assert open(streamed_path).read() == open(exported_path).read()
+    exported_embeddings = sidecar.load_embeddings(exported[1])
+    streamed_embeddings = sidecar.load_embeddings(streamed[1])
+    assert exported_embeddings is not None and streamed_embeddings is not None
+    assert len(streamed_embeddings) == len(exported_embeddings) > 0
+    streamed_first, exported_first = streamed_embeddings.get(
+        0
+    ), exported_embeddings.get(0)
+    assert streamed_first is not None and exported_first is not None
+    assert streamed_first.tolist() == exported_first.tolist()
+
+
+async def test_sync_dataset(tmp_path):
+    def amenity(id: int, name: str, embedding: list[float]) -> models.Amenity:
+        return models.Amenity(
+            id=id,
+            name=name,
+            description=name,
+            location="Gate A1",
+            terminal="Terminal 1",
+            category="shop",
+            hour="daily",
+            content=name,
+            embedding=embedding,
+        )
+
+    airport = models.Airport(id=1, iata="SFO", name="SFO", city="SF", country="US")
+    amenities = [amenity(1, "East", [1.0, 0.0]), amenity(2, "North", [0.0, 1.0])]
+    ds = memory.Client()
+    await ds.initialize_data([airport], amenities, flights)
+
+    paths = [str(tmp_path / name) for name in ("a.csv", "m.parquet", "f.csv")]
+    moved = flights[1].model_copy(update={"departure_gate": "E31"})
+    datastore.save_dataset(paths[0], models.Airport, [airport])
+    datastore.save_dataset(
+        paths[1], models.Amenity, [amenities[0], amenity(3, "West", [-1.0, 0.0])]
+    )
+    datastore.save_dataset(paths[2], models.Flight, [flights[0], moved])
+
+    changes = await ds.sync_dataset(*paths, chunk_size=1)
+    assert changes == {
+        "airports": datastore.TableChanges(),
+        "amenities": datastore.TableChanges(inserted=[3], deleted=[2]),
+        "flights": datastore.TableChanges(updated=[2]),
+    }
+    assert await ds.get_flight(2) == (moved, None)
+    assert await ds.get_amenity(2) == (None, None)
+    res, sql = await ds.amenities_search([-1.0, 0.1], 0.5, 2)
+    assert [a.id for a in res] == [3]
+
+    changes = await ds.sync_dataset(*paths)
+    assert all(c == datastore.TableChanges() for c in changes.values())
+
+
+@pytest.mark.parametrize(
+    "iata",
+    [
+        pytest.param("SFO", id="upper_case"),
+        pytest.param("sfo", id="lower_case"),
+    ],
+)
+async def test_get_airport_by_iata(ds: memory.Client, iata: str):
+    res, sql = await ds.get_airport_by_iata(iata)
+    expected = models.Airport(
+        id=3270,
+        iata="SFO",
+        name="San Francisco International Airport",
+        city="San Francisco",
+        country="United States",
+    )
+    assert res == expected
+
+
+async def test_search_airports(ds: memory.Client):
+    res, sql = await ds.search_airports("Philippines", "San jose", None)
+    assert [a.id for a in res] == [2299, 2313]
+
+    res, sql = await ds.search_airports(None, "San Jose", "San Jose")
+    assert [a.id for a in res] == [2299, 3548]
+
+    res, sql = await ds.search_airports("Foo", "FOO BAR", "Foo bar")
+    assert res == []
+
+
+async def test_get_amenity(ds: memory.Client):
+    res, sql = await ds.get_amenity(1)
+    expected = models.Amenity(
+        id=1,
+        name="24th & Mission Taco House",
+        description="Fresh made-to-order Mexican entrees with beer & wine",
+        location="Marketplace G (near entrance to G Gates)",
+        terminal="Ed Lee International Main Hall",
+        category="restaurant",
+        hour="Sunday- Saturday 7:00 am-8:00 pm",
+    )
+    assert res == expected
+
+
+amenities_search_test_data = [
+    pytest.param(
+        # "Where can I get coffee near gate A6?"
+        query_embedding1,
+        0.7,
+        1,
+        [27],
+        id="search_coffee_shop",
+    ),
+    pytest.param(
+        # "Where can I look for luxury goods?"
+        query_embedding2,
+        0.65,
+        2,
+        [90, 100],
+        id="search_luxury_goods",
+    ),
+    pytest.param(
+        # "FOO BAR"
+        query_embedding3,
+        0.9,
+        1,
+        [],
+        id="no_results",
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "query_embedding, similarity_threshold, top_k, expected", amenities_search_test_data
+)
+async def test_amenities_search(
+    ds: memory.Client,
+    query_embedding: List[float],
+    similarity_threshold: float,
+    top_k: int,
+    expected: List[int],
+):
+    res, sql = await ds.amenities_search(query_embedding, similarity_threshold, top_k)
+    assert [a.id for a in res] == expected
+    assert all(a.embedding is None for a in res)
+
+
+async def test_amenities_search_many(ds: memory.Client):
+    query_embeddings = [query_embedding1, query_embedding2, query_embedding3]
+    res = await ds.amenities_search_many(query_embeddings, 0.5, 2)
+    assert res == [(await ds.amenities_search(e, 0.5, 2))[0] for e in query_embeddings]
+
+
+async def test_amenities_hybrid_search(ds: memory.Client):
+    embed = AsyncMock(return_value=query_embedding1)
+    amenity, _ = await ds.get_amenity(1)
+    assert amenity is not None
+
+    res = await ds.amenities_hybrid_search(amenity.name.upper(), embed, 0.5, 3)
+    assert res == [amenity]
+    embed.assert_not_awaited()
+
+    res = await ds.amenities_hybrid_search("mexican food", embed, 0.5, 3)
+    lexical = await ds.amenities_text_search("mexican food", 3)
+    semantic, _ = await ds.amenities_search(query_embedding1, 0.5, 3)
+    assert lexical and semantic
+    assert res == reciprocal_rank_fusion([lexical, semantic], 3)
+    embed.assert_awaited_once_with("mexican food")
+
+
+async def test_policies_search(ds: memory.Client):
+    with open("../data/cymbalair_policy.csv", "r") as f:
+        policy = models.Policy.model_validate(next(csv.DictReader(f)))
+    assert policy.embedding is not None
+
+    res, sql = await ds.policies_search(policy.embedding, 0.5, 3)
+    assert len(res) == 3
+    assert res[0] == models.Policy(id=policy.id, content=policy.content)
+
+
+async def test_search_flights(ds: memory.Client):
+    res, sql = await ds.search_flights_by_airports("2024-01-01", "sfo", None)
+    assert res == flights[:1]
+
+    res, sql = await ds.search_flights_by_number("AA", "242")
+    assert res == flights[1:]
+
+    res, sql = await ds.search_flights_by_number("aa", "242")
+    assert res == flights[1:]
+
+
+async def test_insert_and_list_tickets(ds: memory.Client):
+    await ds.insert_ticket(
+        "1",
+        "Foo",
+        "foo@example.com",
+        "UA",
+        "1158",
+        "SFO",
+        "ORD",
+        "2024-01-01 05:57:00",
+        "2024-01-01 12:13:00",
+    )
+    res, sql = await ds.list_tickets("1")
+    assert [(t.airline, t.flight_number) for t in res] == [("UA", "1158")]
+
+    with pytest.raises(Exception):
+        await ds.insert_ticket(
+            "1",
+            "Foo",
+            "foo@example.com",
+            "UA",
+            "0000",
+            "SFO",
+            "ORD",
+            "2024-01-01 05:57:00",
+            "2024-01-01 12:13:00",
+        )
+
+
+async def test_get_by_ids(ds: memory.Client):
+    airports = await ds.get_airports_by_ids([3, 1, 3, -1])
+    assert [a.id for a in airports] == [3, 1]
+    assert (airports[1], None) == await ds.get_airport_by_id(1)
+
+    amenities = await ds.get_amenities_by_ids([2, -1, 1])
+    assert amenities == [(await ds.get_amenity(2))[0], (await ds.get_amenity(1))[0]]
+
+    flights = await ds.get_flights_by_ids([1, -1])
+    assert flights == [(await ds.get_flight(1))[0]]
@@ -13,9 +13,11 @@
 # limitations under the License.
 
 import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 from ipaddress import IPv4Address, IPv6Address
-from typing import Literal, Optional
+from itertools import product
+from typing import Any, AsyncGenerator, AsyncIterator, Literal, Optional, Sequence
 
 import asyncpg
 from pgvector.asyncpg import register_vector
@@ -23,7 +25,14 @@ from pydantic import BaseModel
 
 import models
 
-from .. import datastore
+from .. import datastore, timing
+from .statements import Connection, StatementRegistry
+from .utils import (
+    AMENITY_TSVECTOR,
+    CONTENT_HASH_COLUMN,
+    upsert_statement,
+    vector_index_ddl,
+)
 
 POSTGRES_IDENTIFIER = "postgres"
 
@@ -35,22 +44,241 @@ class Config(BaseModel, datastore.AbstractConfig):
     user: str
     password: str
     database: str
+    vector_index: Literal["hnsw", "ivfflat", "none"] = "hnsw"
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 64
+    ivfflat_lists: int = 100
+
+
+def _search_airports_query(country: bool, city: bool, name: bool) -> str:
+    filters: list[str] = []
+    if country:
+        filters.append(f"lower(country) = lower(${len(filters) + 1})")
+    if city:
+        filters.append(f"lower(city) = lower(${len(filters) + 1})")
+    if name:
+        filters.append(f"name ILIKE '%' || ${len(filters) + 1} || '%'")
+    query = "SELECT * FROM airports"
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    return query + " ORDER BY id"
+
+
+# One statement per combination of supplied filters, keyed by which of
+# (country, city, name) are set, so that each combination is planned against
+# the matching index instead of a generic "$1 IS NULL OR ..." predicate.
+SEARCH_AIRPORTS_QUERIES = {
+    filters: _search_airports_query(*filters)
+    for filters in product((False, True), repeat=3)
+}
+
+
+def _search_flights_by_airports_query(departure: bool, arrival: bool) -> str:
+    filters: list[str] = []
+    if departure:
+        filters.append(f"departure_airport = ${len(filters) + 1}")
+    if arrival:
+        filters.append(f"arrival_airport = ${len(filters) + 1}")
+    date = f"${len(filters) + 1}::timestamp"
+    filters.append(f"departure_time >= {date}")
+    filters.append(f"departure_time < {date} + interval '1 day'")
+    return (
+        "SELECT * FROM flights WHERE "
+        + " AND ".join(filters)
+        + " ORDER BY departure_time, id"
+    )
+
+
+# Keyed by which of (departure_airport, arrival_airport) are set.
+SEARCH_FLIGHTS_BY_AIRPORTS_QUERIES = {
+    filters: _search_flights_by_airports_query(*filters)
+    for filters in product((False, True), repeat=2)
+}
+
+
+GET_AIRPORT_BY_ID_QUERY = "SELECT * FROM airports WHERE id = $1"
+
+GET_AIRPORT_BY_IATA_QUERY = "SELECT * FROM airports WHERE lower(iata) = lower($1)"
+
+# Whether a table stores row hashes for incremental imports
+HAS_CONTENT_HASH_QUERY = f"""
+    SELECT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = $1 AND column_name = '{CONTENT_HASH_COLUMN}'
+    )
+"""
+
+# Batch lookups return rows in the order of the requested ids
+GET_AIRPORTS_BY_IDS_QUERY = """
+    SELECT * FROM airports WHERE id = ANY($1)
+    ORDER BY array_position($1, id)
+"""
+
+GET_AMENITY_QUERY = """
+    SELECT id, name, description, location, terminal, category, hour
+    FROM amenities WHERE id = $1
+"""
+
+GET_AMENITIES_BY_IDS_QUERY = """
+    SELECT id, name, description, location, terminal, category, hour
+    FROM amenities WHERE id = ANY($1)
+    ORDER BY array_position($1, id)
+"""
+
+AMENITIES_NAME_SEARCH_QUERY = """
+    SELECT id, name, description, location, terminal, category, hour
+    FROM amenities WHERE lower(name) = lower($1)
+    ORDER BY id
+"""
+
+AMENITIES_TEXT_SEARCH_QUERY = f"""
+    SELECT id, name, description, location, terminal, category, hour
+    FROM amenities, websearch_to_tsquery('english', $1) AS query
+    WHERE {AMENITY_TSVECTOR} @@ query
+    ORDER BY ts_rank({AMENITY_TSVECTOR}, query) DESC, id
+    LIMIT $2
+"""
+
+SET_EF_SEARCH_QUERY = "SELECT set_config('hnsw.ef_search', $1, true)"
+
+SET_PROBES_QUERY = "SELECT set_config('ivfflat.probes', $1, true)"
+
+# Order by distance and limit first so the vector index can serve the scan;
+# the similarity threshold is applied to the k nearest rows.
+AMENITIES_SEARCH_QUERY = """
+    SELECT id, name, description, location, terminal, category, hour
+    FROM (
+        SELECT id, name, description, location, terminal, category,
+          hour, embedding <=> $1 AS distance
+        FROM amenities
+        ORDER BY embedding <=> $1
+        LIMIT $3
+    ) AS nearest_amenities
+    WHERE 1 - distance > $2
+    ORDER BY distance
+"""
+
+# One k-NN scan per query vector, joined laterally so that every query
+# still uses the vector index; ord is the 1-based position of the query.
+# The vectors are sent as text literals, since asyncpg would encode a
+# nested list as a two dimensional float array.
+AMENITIES_SEARCH_MANY_QUERY = """
+    SELECT q.ord, a.id, a.name, a.description, a.location, a.terminal,
+      a.category, a.hour
+    FROM unnest($1::text[]) WITH ORDINALITY AS q(query_embedding, ord)
+    CROSS JOIN LATERAL (
+        SELECT id, name, description, location, terminal, category,
+          hour, embedding <=> q.query_embedding::vector AS distance
+        FROM amenities
+        ORDER BY embedding <=> q.query_embedding::vector
+        LIMIT $3
+    ) AS a
+    WHERE 1 - a.distance > $2
+    ORDER BY q.ord, a.distance
+"""
+
+GET_FLIGHT_QUERY = "SELECT * FROM flights WHERE id = $1"
+
+GET_FLIGHTS_BY_IDS_QUERY = """
+    SELECT * FROM flights WHERE id = ANY($1)
+    ORDER BY array_position($1, id)
+"""
+
+SEARCH_FLIGHTS_BY_NUMBER_QUERY = """
+    SELECT * FROM flights
+    WHERE airline = $1
+    AND flight_number = $2
+    ORDER BY departure_time, id
+"""
+
+VALIDATE_TICKET_QUERY = """
+    SELECT * FROM flights
+    WHERE airline = $1
+    AND flight_number = $2
+    AND departure_airport = $3
+    AND departure_time = $4::timestamp
+    ORDER BY id
+"""
+
+LIST_TICKETS_QUERY = "SELECT * FROM tickets WHERE user_id = $1"
+
+# Read queries prepared on every pooled connection.
+PREPARED_QUERIES = [
+    GET_AIRPORT_BY_ID_QUERY,
+    GET_AIRPORT_BY_IATA_QUERY,
+    GET_AIRPORTS_BY_IDS_QUERY,
+    *SEARCH_AIRPORTS_QUERIES.values(),
+    GET_AMENITY_QUERY,
+    GET_AMENITIES_BY_IDS_QUERY,
+    AMENITIES_NAME_SEARCH_QUERY,
+    AMENITIES_TEXT_SEARCH_QUERY,
+    SET_EF_SEARCH_QUERY,
+    SET_PROBES_QUERY,
+    AMENITIES_SEARCH_QUERY,
+    AMENITIES_SEARCH_MANY_QUERY,
+    GET_FLIGHT_QUERY,
+    GET_FLIGHTS_BY_IDS_QUERY,
+    SEARCH_FLIGHTS_BY_NUMBER_QUERY,
+    *SEARCH_FLIGHTS_BY_AIRPORTS_QUERIES.values(),
+    VALIDATE_TICKET_QUERY,
+    LIST_TICKETS_QUERY,
+]
+
+
+def _normalize_codes(row: BaseModel) -> BaseModel:
+    # Airline and airport codes are stored upper case so lookups can use
+    # plain equality on the indexed columns.
+    if not isinstance(row, models.Flight):
+        return row
+    return row.model_copy(
+        update={
+            "airline": row.airline.upper(),
+            "departure_airport": row.departure_airport.upper(),
+            "arrival_airport": row.arrival_airport.upper(),
+        }
+    )
+
+
+def _columns(model: type[BaseModel]) -> list[str]:
+    return list(model.model_fields) + [CONTENT_HASH_COLUMN]
+
+
+def _records(
+    rows: Sequence[BaseModel], hashes: Optional[Sequence[str]] = None
+) -> list[tuple]:
+    # Hashes are those of the rows as in the dataset, before normalization
+    if hashes is None:
+        hashes = [datastore.row_hash(r) for r in rows]
+    return [
+        tuple(getattr(r, c) for c in type(r).model_fields) + (h,)
+        for r, h in zip(map(_normalize_codes, rows), hashes)
+    ]
 
 
 class Client(datastore.Client[Config]):
     __pool: asyncpg.Pool
+    __config: Config
+    __statements: StatementRegistry
 
     @datastore.classproperty
     def kind(cls):
         return "postgres"
 
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(
+        self, pool: asyncpg.Pool, config: Config, statements: StatementRegistry
+    ):
         self.__pool = pool
+        self.__config = config
+        self.__statements = statements
 
     @classmethod
     async def create(cls, config: Config) -> "Client":
+        statements = StatementRegistry(PREPARED_QUERIES)
+
         async def init(conn):
             await register_vector(conn)
+            # Prepared after the vector codec so parameters use it
+            await statements.prepare_all(conn)
 
         pool = await asyncpg.create_pool(
             host=str(config.host),
@@ -59,38 +287,90 @@ class Client(datastore.Client[Config]):
             database=config.database,
             port=config.port,
             init=init,
+            connection_class=Connection,
         )
         if pool is None:
             raise TypeError("pool not instantiated")
-        return cls(pool)
-
-    async def initialize_data(
-        self,
-        airports: list[models.Airport],
-        amenities: list[models.Amenity],
-        flights: list[models.Flight],
-    ) -> None:
+        return cls(pool, config, statements)
+
+    def pool_stats(self) -> dict[str, int]:
+        return {
+            "size": self.__pool.get_size(),
+            "idle": self.__pool.get_idle_size(),
+            "max_size": self.__pool.get_max_size(),
+        }
+
+    def statement_stats(self) -> dict[str, int]:
+        """Returns prepared statement cache hits and misses."""
+        return self.__statements.stats()
+
+    @asynccontextmanager
+    async def __connection(self) -> AsyncIterator[Connection]:
+        # Waiting for a pooled connection is timed separately from the query
+        with timing.span("pool"):
+            conn = await self.__pool.acquire()
+        try:
+            yield conn
+        finally:
+            await self.__pool.release(conn)
+
+    async def __fetch(
+        self, query: str, *args, timeout: Optional[float] = None
+    ) -> list[asyncpg.Record]:
+        async with self.__connection() as conn:
+            with timing.span("db"):
+                statement = await self.__statements.get(conn, query)
+                return await statement.fetch(*args, timeout=timeout)
+
+    async def __fetchrow(
+        self, query: str, *args, timeout: Optional[float] = None
+    ) -> Optional[asyncpg.Record]:
+        async with self.__connection() as conn:
+            with timing.span("db"):
+                statement = await self.__statements.get(conn, query)
+                return await statement.fetchrow(*args, timeout=timeout)
+
+    @asynccontextmanager
+    async def __vector_search(
+        self, ef_search: Optional[int], probes: Optional[int]
+    ) -> AsyncIterator[Connection]:
+        # The settings only last until the end of the transaction, so one is
+        # only opened when there is a setting to apply.
+        async with self.__connection() as conn:
+            if ef_search is None and probes is None:
+                yield conn
+                return
+            async with conn.transaction():
+                with timing.span("db"):
+                    if ef_search is not None:
+                        statement = await self.__statements.get(
+                            conn, SET_EF_SEARCH_QUERY
+                        )
+                        await statement.fetch(str(ef_search))
+                    if probes is not None:
+                        statement = await self.__statements.get(conn, SET_PROBES_QUERY)
+                        await statement.fetch(str(probes))
+                yield conn
+
+    async def __create_tables(self) -> None:
         async with self.__pool.acquire() as conn:
             await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            await conn.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
             # If the table already exists, drop it to avoid conflicts
             await conn.execute("DROP TABLE IF EXISTS airports CASCADE")
             # Create a new table
             await conn.execute(
                 """
                 CREATE TABLE airports(
-                  id INT PRIMARY KEY,
+                  id INT,
                   iata TEXT,
                   name TEXT,
                   city TEXT,
-                  country TEXT
+                  country TEXT,
+                  content_hash TEXT
                 )
                 """
             )
-            # Insert all the data
-            await conn.executemany(
-                """INSERT INTO airports VALUES ($1, $2, $3, $4, $5)""",
-                [(a.id, a.iata, a.name, a.city, a.country) for a in airports],
-            )
 
             # If the table already exists, drop it to avoid conflicts
             await conn.execute("DROP TABLE IF EXISTS amenities CASCADE")
@@ -98,7 +378,7 @@ class Client(datastore.Client[Config]):
             await conn.execute(
                 """
                 CREATE TABLE amenities(
-                  id INT PRIMARY KEY,
+                  id INT,
                   name TEXT,
                   description TEXT,
                   location TEXT,
@@ -120,49 +400,11 @@ class Client(datastore.Client[Config]):
                   saturday_start_hour TIME,
                   saturday_end_hour TIME,
                   content TEXT NOT NULL,
-                  embedding vector(768) NOT NULL
+                  embedding vector(768) NOT NULL,
+                  content_hash TEXT
                 )
                 """
             )
-            # Insert all the data
-            await conn.executemany(
-                """
-                INSERT INTO amenities VALUES (
-                  $1, $2, $3, $4, $5,
-                  $6, $7, $8, $9, $10,
-                  $11, $12, $13, $14, $15,
-                  $16, $17, $18, $19, $20,
-                  $21, $22, $23)
-                """,
-                [
-                    (
-                        a.id,
-                        a.name,
-                        a.description,
-                        a.location,
-                        a.terminal,
-                        a.category,
-                        a.hour,
-                        a.sunday_start_hour,
-                        a.sunday_end_hour,
-                        a.monday_start_hour,
-                        a.monday_end_hour,
-                        a.tuesday_start_hour,
-                        a.tuesday_end_hour,
-                        a.wednesday_start_hour,
-                        a.wednesday_end_hour,
-                        a.thursday_start_hour,
-                        a.thursday_end_hour,
-                        a.friday_start_hour,
-                        a.friday_end_hour,
-                        a.saturday_start_hour,
-                        a.saturday_end_hour,
-                        a.content,
-                        a.embedding,
-                    )
-                    for a in amenities
-                ],
-            )
 
             # If the table already exists, drop it to avoid conflicts
             await conn.execute("DROP TABLE IF EXISTS flights CASCADE")
@@ -170,7 +412,7 @@ class Client(datastore.Client[Config]):
             await conn.execute(
                 """
                 CREATE TABLE flights(
-                  id INTEGER PRIMARY KEY,
+                  id INTEGER,
                   airline TEXT,
                   flight_number TEXT,
                   departure_airport TEXT,
@@ -178,28 +420,11 @@ class Client(datastore.Client[Config]):
                   departure_time TIMESTAMP,
                   arrival_time TIMESTAMP,
                   departure_gate TEXT,
-                  arrival_gate TEXT
+                  arrival_gate TEXT,
+                  content_hash TEXT
                 )
                 """
             )
-            # Insert all the data
-            await conn.executemany(
-                """INSERT INTO flights VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)""",
-                [
-                    (
-                        f.id,
-                        f.airline,
-                        f.flight_number,
-                        f.departure_airport,
-                        f.arrival_airport,
-                        f.departure_time,
-                        f.arrival_time,
-                        f.departure_gate,
-                        f.arrival_gate,
-                    )
-                    for f in flights
-                ],
-            )
 
             # If the table already exists, drop it to avoid conflicts
             await conn.execute("DROP TABLE IF EXISTS tickets CASCADE")
@@ -220,6 +445,132 @@ class Client(datastore.Client[Config]):
                 """
             )
 
+    async def __create_indexes(self) -> None:
+        index_statements = [
+            "ALTER TABLE airports ADD PRIMARY KEY (id)",
+            "ALTER TABLE amenities ADD PRIMARY KEY (id)",
+            "ALTER TABLE flights ADD PRIMARY KEY (id)",
+            "CREATE INDEX airports_iata_lower_idx ON airports (lower(iata))",
+            "CREATE INDEX airports_city_lower_idx ON airports (lower(city))",
+            "CREATE INDEX airports_country_lower_idx ON airports (lower(country))",
+            "CREATE INDEX airports_name_trgm_idx ON airports "
+            "USING gin (name gin_trgm_ops)",
+            "CREATE INDEX amenities_name_lower_idx ON amenities (lower(name))",
+            "CREATE INDEX amenities_text_idx ON amenities "
+            f"USING gin ({AMENITY_TSVECTOR})",
+            "CREATE INDEX flights_departure_idx ON flights "
+            "(departure_airport, departure_time)",
+            "CREATE INDEX flights_arrival_idx ON flights "
+            "(arrival_airport, departure_time)",
+            "CREATE INDEX flights_number_idx ON flights "
+            "(airline, flight_number, departure_time)",
+        ]
+        index_ddl = vector_index_ddl(
+            "amenities",
+            "embedding",
+            self.__config.vector_index,
+            self.__config.hnsw_m,
+            self.__config.hnsw_ef_construction,
+            self.__config.ivfflat_lists,
+        )
+        if index_ddl is not None:
+            index_statements.append(index_ddl)
+        await asyncio.gather(*[self.__pool.execute(i) for i in index_statements])
+
+    async def __copy_records(self, table: str, rows: Sequence[BaseModel]) -> None:
+        # Binary COPY on a dedicated pooled connection; vectors are encoded
+        # with the pgvector codec registered in the pool init hook.
+        if not rows:
+            return
+        async with self.__pool.acquire() as conn:
+            await conn.copy_records_to_table(
+                table, records=_records(rows), columns=_columns(type(rows[0]))
+            )
+
+    async def __copy_dataset(
+        self, table: str, path: str, model: type[BaseModel], chunk_size: int
+    ) -> None:
+        # Chunks are parsed ahead in a worker thread while the previous chunk
+        # is being written, all on one pooled connection per table.
+        async with self.__pool.acquire() as conn:
+            async for chunk in datastore.read_dataset(path, model, chunk_size):
+                await conn.copy_records_to_table(
+                    table, records=_records(chunk), columns=_columns(model)
+                )
+
+    async def initialize_data(
+        self,
+        airports: list[models.Airport],
+        amenities: list[models.Amenity],
+        flights: list[models.Flight],
+    ) -> None:
+        await self.__create_tables()
+        # Load all the data in parallel, one connection per table
+        await asyncio.gather(
+            self.__copy_records("airports", airports),
+            self.__copy_records("amenities", amenities),
+            self.__copy_records("flights", flights),
+        )
+        # Build indexes once the data is in place
+        await self.__create_indexes()
+        # Statements prepared before the tables were recreated are stale
+        await self.__pool.expire_connections()
+
+    async def import_dataset(
+        self,
+        airports_ds_path,
+        amenities_ds_path,
+        flights_ds_path,
+        chunk_size: int = datastore.DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        await self.__create_tables()
+        # Stream all the data in parallel, one connection per table
+        await asyncio.gather(
+            self.__copy_dataset(
+                "airports", airports_ds_path, models.Airport, chunk_size
+            ),
+            self.__copy_dataset(
+                "amenities", amenities_ds_path, models.Amenity, chunk_size
+            ),
+            self.__copy_dataset("flights", flights_ds_path, models.Flight, chunk_size),
+        )
+        # Build indexes once the data is in place
+        await self.__create_indexes()
+        # Statements prepared before the tables were recreated are stale
+        await self.__pool.expire_connections()
+
+    async def row_hashes(self, table: datastore.Table) -> dict[int, Optional[str]]:
+        async with self.__pool.acquire() as conn:
+            # Tables created before hashes were stored get the column, and
+            # all their rows count as updated on the first incremental import.
+            missing = not await conn.fetchval(HAS_CONTENT_HASH_QUERY, table)
+            if missing:
+                await conn.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {CONTENT_HASH_COLUMN} TEXT"
+                )
+            rows = await conn.fetch(f"SELECT id, {CONTENT_HASH_COLUMN} FROM {table}")
+        if missing:
+            # Statements prepared before the column was added are stale
+            await self.__pool.expire_connections()
+        return {row["id"]: row[CONTENT_HASH_COLUMN] for row in rows}
+
+    async def upsert_rows(
+        self, table: datastore.Table, rows: Sequence[BaseModel], hashes: Sequence[str]
+    ) -> None:
+        columns = _columns(datastore.TABLE_MODELS[table])
+        query = upsert_statement(
+            table, columns, [f"${i}" for i in range(1, len(columns) + 1)]
+        )
+        # A batch is pipelined in one transaction; unchanged indexes stay warm
+        async with self.__pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany(query, _records(rows, hashes))
+
+    async def delete_rows(self, table: datastore.Table, ids: Sequence[int]) -> None:
+        await self.__pool.execute(
+            f"DELETE FROM {table} WHERE id = ANY($1::int[])", list(ids)
+        )
+
     async def export_data(
         self,
     ) -> tuple[list[models.Airport], list[models.Amenity], list[models.Flight]]:
@@ -238,181 +589,227 @@ class Client(datastore.Client[Config]):
         flights = [models.Flight.model_validate(dict(f)) for f in await flight_task]
         return airports, amenities, flights
 
-    async def get_airport_by_id(self, id: int) -> Optional[models.Airport]:
-        result = await self.__pool.fetchrow(
-            """
-              SELECT * FROM airports WHERE id=$1
-            """,
-            id,
-        )
+    async def export_rows(
+        self, table: datastore.Table, chunk_size: int = datastore.DEFAULT_CHUNK_SIZE
+    ) -> AsyncGenerator[list[dict[str, Any]], None]:
+        columns = ", ".join(datastore.TABLE_COLUMNS[table])
+        # Each table streams from its own connection, through a server-side
+        # cursor that only lives as long as its transaction.
+        async with self.__pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(
+                    f"SELECT {columns} FROM {table} ORDER BY id ASC"
+                )
+                while rows := await cursor.fetch(chunk_size):
+                    yield [dict(row) for row in rows]
+
+    async def get_airport_by_id(
+        self, id: int
+    ) -> tuple[Optional[models.Airport], Optional[str]]:
+        result = await self.__fetchrow(GET_AIRPORT_BY_ID_QUERY, id)
 
         if result is None:
-            return None
+            return None, None
 
-        result = models.Airport.model_validate(dict(result))
-        return result
+        with timing.span("validate"):
+            result = models.Airport.model_validate(dict(result))
+        return result, None
 
-    async def get_airport_by_iata(self, iata: str) -> Optional[models.Airport]:
-        result = await self.__pool.fetchrow(
-            """
-              SELECT * FROM airports WHERE iata ILIKE $1
-            """,
-            iata,
-        )
+    async def get_airport_by_iata(
+        self, iata: str
+    ) -> tuple[Optional[models.Airport], Optional[str]]:
+        result = await self.__fetchrow(GET_AIRPORT_BY_IATA_QUERY, iata)
 
         if result is None:
-            return None
+            return None, None
+
+        with timing.span("validate"):
+            result = models.Airport.model_validate(dict(result))
+        return result, None
 
-        result = models.Airport.model_validate(dict(result))
-        return result
+    async def get_airports_by_ids(self, ids: list[int]) -> list[models.Airport]:
+        results = await self.__fetch(
+            GET_AIRPORTS_BY_IDS_QUERY, list(dict.fromkeys(ids))
+        )
+
+        with timing.span("validate"):
+            results = [models.Airport.model_validate(dict(r)) for r in results]
+        return results
 
     async def search_airports(
         self,
         country: Optional[str] = None,
         city: Optional[str] = None,
         name: Optional[str] = None,
-    ) -> list[models.Airport]:
-        results = await self.__pool.fetch(
-            """
-            SELECT * FROM airports
-            WHERE ($1::TEXT IS NULL OR country ILIKE $1)
-            AND ($2::TEXT IS NULL OR city ILIKE $2)
-            AND ($3::TEXT IS NULL OR name ILIKE '%' || $3 || '%')
-            """,
-            country,
-            city,
-            name,
+    ) -> tuple[list[models.Airport], Optional[str]]:
+        filters = (country, city, name)
+        results = await self.__fetch(
+            SEARCH_AIRPORTS_QUERIES[tuple(f is not None for f in filters)],
+            *[f for f in filters if f is not None],
             timeout=10,
         )
 
-        results = [models.Airport.model_validate(dict(r)) for r in results]
-        return results
+        with timing.span("validate"):
+            results = [models.Airport.model_validate(dict(r)) for r in results]
+        return results, None
 
-    async def get_amenity(self, id: int) -> Optional[models.Amenity]:
-        result = await self.__pool.fetchrow(
-            """
-            SELECT id, name, description, location, terminal, category, hour
-            FROM amenities WHERE id=$1
-            """,
-            id,
-        )
+    async def get_amenity(
+        self, id: int
+    ) -> tuple[Optional[models.Amenity], Optional[str]]:
+        result = await self.__fetchrow(GET_AMENITY_QUERY, id)
 
         if result is None:
-            return None
+            return None, None
+
+        with timing.span("validate"):
+            result = models.Amenity.model_validate(dict(result))
+        return result, None
 
-        result = models.Amenity.model_validate(dict(result))
-        return result
+    async def get_amenities_by_ids(self, ids: list[int]) -> list[models.Amenity]:
+        results = await self.__fetch(
+            GET_AMENITIES_BY_IDS_QUERY, list(dict.fromkeys(ids))
+        )
+
+        with timing.span("validate"):
+            results = [models.Amenity.model_validate(dict(r)) for r in results]
+        return results
 
     async def amenities_search(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> tuple[list[models.Amenity], Optional[str]]:
+        async with self.__vector_search(ef_search, probes) as conn:
+            with timing.span("db"):
+                statement = await self.__statements.get(conn, AMENITIES_SEARCH_QUERY)
+                results = await statement.fetch(
+                    query_embedding, similarity_threshold, top_k, timeout=10
+                )
+
+        with timing.span("validate"):
+            results = [models.Amenity.model_validate(dict(r)) for r in results]
+        return results, None
+
+    async def amenities_name_search(self, name: str) -> list[models.Amenity]:
+        results = await self.__fetch(AMENITIES_NAME_SEARCH_QUERY, name, timeout=10)
+
+        with timing.span("validate"):
+            results = [models.Amenity.model_validate(dict(r)) for r in results]
+        return results
+
+    async def amenities_text_search(
+        self, query: str, top_k: int
     ) -> list[models.Amenity]:
-        results = await self.__pool.fetch(
-            """
-            SELECT id, name, description, location, terminal, category, hour
-            FROM (
-                SELECT id, name, description, location, terminal, category,
-                  hour, 1 - (embedding <=> $1) AS similarity
-                FROM amenities
-                WHERE 1 - (embedding <=> $1) > $2
-                ORDER BY similarity DESC
-                LIMIT $3
-            ) AS sorted_amenities
-            """,
-            query_embedding,
-            similarity_threshold,
-            top_k,
-            timeout=10,
+        results = await self.__fetch(
+            AMENITIES_TEXT_SEARCH_QUERY, query, top_k, timeout=10
         )
 
-        results = [models.Amenity.model_validate(dict(r)) for r in results]
+        with timing.span("validate"):
+            results = [models.Amenity.model_validate(dict(r)) for r in results]
         return results
 
-    async def get_flight(self, flight_id: int) -> Optional[models.Flight]:
-        result = await self.__pool.fetchrow(
-            """
-                SELECT * FROM flights
-                WHERE id = $1
-            """,
-            flight_id,
-            timeout=10,
-        )
+    async def amenities_search_many(
+        self,
+        query_embeddings: list[list[float]],
+        similarity_threshold: float,
+        top_k: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> list[list[models.Amenity]]:
+        async with self.__vector_search(ef_search, probes) as conn:
+            with timing.span("db"):
+                statement = await self.__statements.get(
+                    conn, AMENITIES_SEARCH_MANY_QUERY
+                )
+                rows = await statement.fetch(
+                    [str(e) for e in query_embeddings],
+                    similarity_threshold,
+                    top_k,
+                    timeout=10,
+                )
+
+        results: list[list[models.Amenity]] = [[] for _ in query_embeddings]
+        with timing.span("validate"):
+            for r in rows:
+                amenity = dict(r)
+                ord = amenity.pop("ord")
+                results[ord - 1].append(models.Amenity.model_validate(amenity))
+        return results
+
+    async def get_flight(
+        self, flight_id: int
+    ) -> tuple[Optional[models.Flight], Optional[str]]:
+        result = await self.__fetchrow(GET_FLIGHT_QUERY, flight_id, timeout=10)
 
         if result is None:
-            return None
+            return None, None
+
+        with timing.span("validate"):
+            result = models.Flight.model_validate(dict(result))
+        return result, None
 
-        result = models.Flight.model_validate(dict(result))
-        return result
+    async def get_flights_by_ids(self, ids: list[int]) -> list[models.Flight]:
+        results = await self.__fetch(
+            GET_FLIGHTS_BY_IDS_QUERY, list(dict.fromkeys(ids)), timeout=10
+        )
+
+        with timing.span("validate"):
+            results = [models.Flight.model_validate(dict(r)) for r in results]
+        return results
 
     async def search_flights_by_number(
         self,
         airline: str,
         number: str,
-    ) -> list[models.Flight]:
-        results = await self.__pool.fetch(
-            """
-                SELECT * FROM flights
-                WHERE airline = $1
-                AND flight_number = $2;
-            """,
-            airline,
+    ) -> tuple[list[models.Flight], Optional[str]]:
+        results = await self.__fetch(
+            SEARCH_FLIGHTS_BY_NUMBER_QUERY,
+            airline.upper(),
             number,
             timeout=10,
         )
-        results = [models.Flight.model_validate(dict(r)) for r in results]
-        return results
+        with timing.span("validate"):
+            results = [models.Flight.model_validate(dict(r)) for r in results]
+        return results, None
 
     async def search_flights_by_airports(
         self,
         date: str,
         departure_airport: Optional[str] = None,
         arrival_airport: Optional[str] = None,
-    ) -> list[models.Flight]:
-        results = await self.__pool.fetch(
-            """
-                SELECT * FROM flights
-                WHERE ($1::TEXT IS NULL OR departure_airport ILIKE $1)
-                AND ($2::TEXT IS NULL OR arrival_airport ILIKE $2)
-                AND departure_time >= $3::timestamp
-                AND departure_time < $3::timestamp + interval '1 day';
-            """,
-            departure_airport,
-            arrival_airport,
+    ) -> tuple[list[models.Flight], Optional[str]]:
+        airports = (departure_airport, arrival_airport)
+        results = await self.__fetch(
+            SEARCH_FLIGHTS_BY_AIRPORTS_QUERIES[tuple(a is not None for a in airports)],
+            *[a.upper() for a in airports if a is not None],
             datetime.strptime(date, "%Y-%m-%d"),
             timeout=10,
         )
-        results = [models.Flight.model_validate(dict(r)) for r in results]
-        return results
+        with timing.span("validate"):
+            results = [models.Flight.model_validate(dict(r)) for r in results]
+        return results, None
 
     async def validate_ticket(
         self,
         airline: str,
         flight_number: str,
         departure_airport: str,
-        arrival_airport: str,
-        departure_time: datetime,
-        arrival_time: datetime,
-    ) -> bool:
-        results = await self.__pool.fetch(
-            """
-                SELECT * FROM flights
-                WHERE airline ILIKE $1
-                AND flight_number ILIKE $2
-                AND departure_airport ILIKE $3
-                AND arrival_airport ILIKE $4
-                AND departure_time = $5::timestamp
-                AND arrival_time = $6::timestamp;
-            """,
-            airline,
+        departure_time: str,
+    ) -> tuple[list[models.Flight], Optional[str]]:
+        results = await self.__fetch(
+            VALIDATE_TICKET_QUERY,
+            airline.upper(),
             flight_number,
-            departure_airport,
-            arrival_airport,
-            departure_time,
-            arrival_time,
+            departure_airport.upper(),
+            datetime.strptime(departure_time, "%Y-%m-%d %H:%M:%S"),
             timeout=10,
         )
-        if len(results) == 1:
-            return True
-        return False
+        with timing.span("validate"):
+            results = [models.Flight.model_validate(dict(r)) for r in results]
+        return results, None
 
     async def insert_ticket(
         self,
@@ -428,14 +825,16 @@ class Client(datastore.Client[Config]):
     ):
         departure_time_datetime = datetime.strptime(departure_time, "%Y-%m-%d %H:%M:%S")
         arrival_time_datetime = datetime.strptime(arrival_time, "%Y-%m-%d %H:%M:%S")
-        if not await self.validate_ticket(
-            airline,
-            flight_number,
-            departure_airport,
-            arrival_airport,
-            departure_time_datetime,
-            arrival_time_datetime,
-        ):
+        flights, _ = await self.validate_ticket(
+            airline, flight_number, departure_airport, departure_time
+        )
+        flights = [
+            f
+            for f in flights
+            if f.arrival_airport == arrival_airport.upper()
+            and f.arrival_time == arrival_time_datetime
+        ]
+        if len(flights) != 1:
             raise Exception("Flight information not in database")
         results = await self.__pool.execute(
             """
@@ -456,10 +855,10 @@ class Client(datastore.Client[Config]):
             user_id,
             user_name,
             user_email,
-            airline,
+            airline.upper(),
             flight_number,
-            departure_airport,
-            arrival_airport,
+            departure_airport.upper(),
+            arrival_airport.upper(),
             departure_time_datetime,
             arrival_time_datetime,
             timeout=10,
@@ -470,17 +869,11 @@ class Client(datastore.Client[Config]):
     async def list_tickets(
         self,
         user_id: str,
-    ) -> list[models.Ticket]:
-        results = await self.__pool.fetch(
-            """
-                SELECT * FROM tickets
-                WHERE user_id = $1
-            """,
-            user_id,
-            timeout=10,
-        )
-        results = [models.Ticket.model_validate(dict(r)) for r in results]
-        return results
+    ) -> tuple[list[models.Ticket], Optional[str]]:
+        results = await self.__fetch(LIST_TICKETS_QUERY, user_id, timeout=10)
+        with timing.span("validate"):
+            results = [models.Ticket.model_validate(dict(r)) for r in results]
+        return results, None
 
     async def close(self):
         await self.__pool.close()
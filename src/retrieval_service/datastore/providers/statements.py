@@ -0,0 +1,74 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Iterable
+
+import asyncpg
+from asyncpg.prepared_stmt import PreparedStatement
+
+# Errors from statements whose schema does not exist yet, e.g. before
+# initialize_data has created the tables, their columns or the extensions.
+UNDEFINED_SCHEMA_ERRORS = (
+    asyncpg.UndefinedTableError,
+    asyncpg.UndefinedColumnError,
+    asyncpg.UndefinedObjectError,
+    asyncpg.UndefinedFunctionError,
+)
+
+
+class Connection(asyncpg.Connection):
+    """asyncpg connection that keeps the statements prepared on it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements: dict[str, PreparedStatement] = {}
+
+
+class StatementRegistry:
+    """Prepares a fixed set of queries on every pooled connection.
+
+    Pools using the registry must be created with connection_class=Connection
+    and call prepare_all from their init hook. Statements that cannot be
+    prepared yet, because their tables, columns, types or operators do not
+    exist, are prepared on first use instead.
+    """
+
+    __queries: tuple[str, ...]
+    hits: int
+    misses: int
+
+    def __init__(self, queries: Iterable[str]):
+        self.__queries = tuple(dict.fromkeys(queries))
+        self.hits = 0
+        self.misses = 0
+
+    async def prepare_all(self, conn: Connection) -> None:
+        for query in self.__queries:
+            try:
+                conn.prepared_statements[query] = await conn.prepare(query)
+            except UNDEFINED_SCHEMA_ERRORS:
+                pass
+
+    async def get(self, conn: Connection, query: str) -> PreparedStatement:
+        statement = conn.prepared_statements.get(query)
+        if statement is not None:
+            self.hits += 1
+            return statement
+        self.misses += 1
+        statement = await conn.prepare(query)
+        conn.prepared_statements[query] = statement
+        return statement
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,84 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any
+
+import asyncpg
+import pytest
+
+from .statements import StatementRegistry
+
+
+class FakeConnection:
+    def __init__(self, missing_tables: tuple[str, ...] = ()):
+        self.prepared_statements: dict[str, Any] = {}
+        self.prepare_calls: list[str] = []
+        self.missing_tables = missing_tables
+
+    async def prepare(self, query: str) -> Any:
+        self.prepare_calls.append(query)
+        if any(t in query for t in self.missing_tables):
+            raise asyncpg.UndefinedTableError(f"relation does not exist: {query}")
+        return f"prepared: {query}"
+
+
+@pytest.mark.asyncio
+async def test_prepare_all_then_hit():
+    queries = ["SELECT 1", "SELECT 2", "SELECT 1"]
+    registry = StatementRegistry(queries)
+    conn = FakeConnection()
+
+    await registry.prepare_all(conn)  # type: ignore
+    assert conn.prepare_calls == ["SELECT 1", "SELECT 2"]
+
+    assert await registry.get(conn, "SELECT 2") == "prepared: SELECT 2"  # type: ignore
+    assert registry.stats() == {"hits": 1, "misses": 0}
+    assert conn.prepare_calls == ["SELECT 1", "SELECT 2"]
+
+
+@pytest.mark.asyncio
+async def test_missing_tables_are_prepared_on_first_use():
+    registry = StatementRegistry(["SELECT * FROM flights"])
+    conn = FakeConnection(missing_tables=("flights",))
+
+    await registry.prepare_all(conn)  # type: ignore
+    assert conn.prepared_statements == {}
+
+    conn.missing_tables = ()
+    await registry.get(conn, "SELECT * FROM flights")  # type: ignore
+    await registry.get(conn, "SELECT * FROM flights")  # type: ignore
+    assert registry.stats() == {"hits": 1, "misses": 1}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "error",
+    [
+        asyncpg.UndefinedColumnError,
+        asyncpg.UndefinedObjectError,
+        asyncpg.UndefinedFunctionError,
+    ],
+)
+async def test_statements_of_a_missing_schema_are_skipped(error):
+    class MissingSchemaConnection(FakeConnection):
+        async def prepare(self, query: str) -> Any:
+            if "vector" in query:
+                raise error(f"does not exist: {query}")
+            return await super().prepare(query)
+
+    registry = StatementRegistry(["SELECT $1::vector", "SELECT 1"])
+    conn = MissingSchemaConnection()
+
+    await registry.prepare_all(conn)  # type: ignore
+    assert list(conn.prepared_statements) == ["SELECT 1"]
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import os
+from typing import Optional
 
 
 def get_env_var(key: str, desc: str) -> str:
@@ -20,3 +21,47 @@ def get_env_var(key: str, desc: str) -> str:
     if v is None:
         raise ValueError(f"Must set env var {key} to: {desc}")
     return v
+
+
+# Full-text document of an amenity; the GIN index and the text search
+# queries must use the exact same expression for the index to be used.
+AMENITY_TSVECTOR = (
+    "to_tsvector('english', coalesce(name, '') || ' ' || "
+    "coalesce(description, '') || ' ' || content)"
+)
+
+
+def vector_index_ddl(
+    table: str,
+    column: str,
+    index: str,
+    hnsw_m: int,
+    hnsw_ef_construction: int,
+    ivfflat_lists: int,
+) -> Optional[str]:
+    """Returns the CREATE INDEX statement for a cosine-distance vector index."""
+    name = f"{table}_{column}_{index}_idx"
+    if index == "hnsw":
+        return (
+            f"CREATE INDEX {name} ON {table} USING hnsw ({column} vector_cosine_ops) "
+            f"WITH (m = {int(hnsw_m)}, ef_construction = {int(hnsw_ef_construction)})"
+        )
+    if index == "ivfflat":
+        return (
+            f"CREATE INDEX {name} ON {table} USING ivfflat ({column} vector_cosine_ops) "
+            f"WITH (lists = {int(ivfflat_lists)})"
+        )
+    return None
+
+
+# Column holding datastore.row_hash of each dataset row, for incremental imports
+CONTENT_HASH_COLUMN = "content_hash"
+
+
+def upsert_statement(table: str, columns: list[str], params: list[str]) -> str:
+    """Returns an INSERT that replaces the row with the same id, if any."""
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns if c != "id")
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(params)}) "
+        f"ON CONFLICT (id) DO UPDATE SET {updates}"
+    )
@@ -0,0 +1,138 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+from typing import BinaryIO, Iterable, Optional, Sequence
+
+import numpy as np
+
+SIDECAR_SUFFIX = ".npy"
+
+
+def sidecar_path(ds_path: str) -> str:
+    return ds_path + SIDECAR_SUFFIX
+
+
+def _records_dtype(dimensions: int) -> np.dtype:
+    return np.dtype([("id", "<i8"), ("embedding", "<f4", (dimensions,))])
+
+
+class Embeddings:
+    """Float32 embeddings stored next to a dataset, keyed by row id.
+
+    The records are a structured array of (id, embedding) pairs, usually
+    memory-mapped straight from the .npy file.
+    """
+
+    __records: np.ndarray
+    __rows: dict[int, int]
+
+    def __init__(self, records: np.ndarray):
+        self.__records = records
+        self.__rows = {int(id): row for row, id in enumerate(records["id"])}
+
+    def __len__(self) -> int:
+        return len(self.__records)
+
+    def get(self, id: int) -> Optional[np.ndarray]:
+        """Returns a view of the embedding of id into the records, not a copy."""
+        row = self.__rows.get(id)
+        if row is None:
+            return None
+        return self.__records["embedding"][row]
+
+
+def load_embeddings(ds_path: str) -> Optional[Embeddings]:
+    """Memory-maps the sidecar of ds_path, if there is one."""
+    path = sidecar_path(ds_path)
+    if not os.path.exists(path):
+        return None
+    return Embeddings(np.load(path, mmap_mode="r"))
+
+
+def write_embeddings(
+    ds_path: str, ids: Iterable[int], embeddings: Sequence[Sequence[float]]
+) -> None:
+    """Writes the sidecar of ds_path, replacing any existing one."""
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    dimensions = vectors.shape[1] if vectors.ndim == 2 else 0
+    records = np.empty(len(vectors), dtype=_records_dtype(dimensions))
+    records["id"] = list(ids)
+    records["embedding"] = vectors.reshape(len(vectors), dimensions)
+    np.save(sidecar_path(ds_path), records)
+
+
+class EmbeddingsWriter:
+    """Writes the sidecar of a dataset a chunk of embeddings at a time.
+
+    The .npy header holds the number of records, so records are appended
+    to a temporary file and copied behind the header once all are known.
+    The sidecar is only replaced if the writer is closed without error.
+    """
+
+    __path: str
+    __records: BinaryIO
+    __dimensions: Optional[int]
+    __count: int
+
+    def __init__(self, ds_path: str):
+        self.__path = sidecar_path(ds_path)
+        self.__records = open(self.__path + ".tmp", "wb")
+        self.__dimensions = None
+        self.__count = 0
+
+    def __enter__(self) -> "EmbeddingsWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write(self, ids: Sequence[int], embeddings: Sequence[Sequence[float]]) -> None:
+        if len(ids) == 0:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.__dimensions is None:
+            self.__dimensions = vectors.shape[1]
+        elif vectors.shape[1] != self.__dimensions:
+            raise ValueError(
+                f"Embedding has {vectors.shape[1]} dimensions, "
+                f"sidecar has {self.__dimensions}"
+            )
+        records = np.empty(len(vectors), dtype=_records_dtype(self.__dimensions))
+        records["id"] = ids
+        records["embedding"] = vectors
+        self.__records.write(records.tobytes())
+        self.__count += len(records)
+
+    def close(self) -> None:
+        self.__records.close()
+        header = {
+            "descr": np.lib.format.dtype_to_descr(
+                _records_dtype(self.__dimensions or 0)
+            ),
+            "fortran_order": False,
+            "shape": (self.__count,),
+        }
+        with open(self.__path, "wb") as f, open(self.__records.name, "rb") as records:
+            np.lib.format.write_array_header_1_0(f, header)
+            shutil.copyfileobj(records, f)
+        os.remove(self.__records.name)
+
+    def discard(self) -> None:
+        self.__records.close()
+        os.remove(self.__records.name)
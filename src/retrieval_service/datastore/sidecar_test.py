@@ -0,0 +1,85 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+
+import numpy as np
+import pytest
+
+import models
+
+from . import sidecar
+from .datastore import read_dataset
+
+
+def test_write_and_load_embeddings(tmp_path):
+    ds_path = str(tmp_path / "policy_dataset.csv")
+    assert sidecar.load_embeddings(ds_path) is None
+
+    sidecar.write_embeddings(ds_path, [3, 7], [[0.5, 1.5], [2.5, 3.5]])
+    embeddings = sidecar.load_embeddings(ds_path)
+
+    assert embeddings is not None
+    assert len(embeddings) == 2
+    assert embeddings.get(7).dtype == np.float32
+    assert embeddings.get(7).tolist() == [2.5, 3.5]
+    assert not embeddings.get(7).flags.owndata
+    assert embeddings.get(4) is None
+
+
+def test_embeddings_writer(tmp_path):
+    ds_path = str(tmp_path / "amenity_dataset.csv")
+    with sidecar.EmbeddingsWriter(ds_path) as writer:
+        writer.write([3, 7], [[0.5, 1.5], [2.5, 3.5]])
+        writer.write([], [])
+        writer.write([9], [[4.5, 5.5]])
+        with pytest.raises(ValueError):
+            writer.write([10], [[1.0]])
+
+    embeddings = sidecar.load_embeddings(ds_path)
+    assert embeddings is not None
+    assert len(embeddings) == 3
+    assert embeddings.get(9).tolist() == [4.5, 5.5]
+    assert embeddings.get(3).tolist() == [0.5, 1.5]
+    assert [p.name for p in tmp_path.iterdir()] == ["amenity_dataset.csv.npy"]
+
+    with pytest.raises(RuntimeError):
+        with sidecar.EmbeddingsWriter(ds_path) as writer:
+            writer.write([1], [[1.0, 2.0]])
+            raise RuntimeError("export failed")
+    assert len(sidecar.load_embeddings(ds_path)) == 3
+
+    with sidecar.EmbeddingsWriter(ds_path):
+        pass
+    assert len(sidecar.load_embeddings(ds_path)) == 0
+
+
+@pytest.mark.asyncio
+async def test_read_dataset_prefers_sidecar(tmp_path):
+    ds_path = str(tmp_path / "policy_dataset.csv")
+    with open(ds_path, "w") as f:
+        writer = csv.DictWriter(f, ["id", "content", "embedding"], delimiter=",")
+        writer.writeheader()
+        writer.writerow({"id": 0, "content": "foo", "embedding": "[0.0, 0.0]"})
+        writer.writerow({"id": 1, "content": "bar", "embedding": ""})
+    sidecar.write_embeddings(ds_path, [1], [[0.25, 0.75]])
+
+    policies: list[models.Policy] = []
+    async for chunk in read_dataset(ds_path, models.Policy, chunk_size=1):
+        policies.extend(chunk)
+
+    assert policies == [
+        models.Policy(id=0, content="foo", embedding=[0.0, 0.0]),
+        models.Policy(id=1, content="bar", embedding=[0.25, 0.75]),
+    ]
@@ -0,0 +1,66 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class Timings:
+    """Time spent per phase of one request, in seconds."""
+
+    durations: dict[str, float]
+
+    def __init__(self):
+        self.durations = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def as_dict(self) -> dict[str, float]:
+        """Returns the durations in milliseconds."""
+        return {name: round(s * 1000, 3) for name, s in self.durations.items()}
+
+    def header(self) -> str:
+        """Returns the durations as a Server-Timing header value."""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.as_dict().items())
+
+
+_timings: ContextVar[Optional[Timings]] = ContextVar("timings", default=None)
+
+
+def start() -> Timings:
+    """Starts collecting timings for the current request."""
+    timings = Timings()
+    _timings.set(timings)
+    return timings
+
+
+def current() -> Optional[Timings]:
+    return _timings.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Adds the time spent in the block to the current request, if any."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
@@ -0,0 +1,116 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Generic, Optional, Sequence, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+
+class VectorIndex(Generic[T]):
+    """Exact cosine-similarity index over L2-normalized float32 rows.
+
+    Rows can be added, replaced and removed one at a time, so the index can
+    follow a stream of changes without being rebuilt. The matrix grows by
+    doubling and removals move the last row into the hole.
+    """
+
+    __matrix: np.ndarray
+    __items: list[T]
+    __ids: list[int]
+    __rows: dict[int, int]
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def upsert(self, id: int, item: T, embedding: Optional[Sequence[float]]) -> None:
+        """Adds or replaces the row of id; items without embedding are dropped."""
+        if embedding is None or len(embedding) == 0:
+            self.remove(id)
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+
+        row = self.__rows.get(id)
+        if row is None:
+            row = len(self.__ids)
+            self.__reserve(row + 1, len(vector))
+            self.__rows[id] = row
+            self.__ids.append(id)
+            self.__items.append(item)
+        else:
+            self.__items[row] = item
+        self.__matrix[row] = vector
+
+    def remove(self, id: int) -> None:
+        row = self.__rows.pop(id, None)
+        if row is None:
+            return
+        last = len(self.__ids) - 1
+        if row != last:
+            self.__matrix[row] = self.__matrix[last]
+            self.__items[row] = self.__items[last]
+            self.__ids[row] = self.__ids[last]
+            self.__rows[self.__ids[row]] = row
+        self.__ids.pop()
+        self.__items.pop()
+
+    def clear(self) -> None:
+        self.__matrix = np.zeros((0, 0), dtype=np.float32)
+        self.__items = []
+        self.__ids = []
+        self.__rows = {}
+
+    def search(
+        self, query_embedding: Sequence[float], similarity_threshold: float, top_k: int
+    ) -> list[T]:
+        """Returns up to top_k items more similar than the threshold, best first."""
+        matrix = self.__matrix[: len(self.__ids)]
+        if top_k <= 0 or len(matrix) == 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0 or len(query) != matrix.shape[1]:
+            return []
+
+        similarities = matrix @ (query / norm)
+        k = min(top_k, len(similarities))
+        candidates = np.argpartition(-similarities, k - 1)[:k]
+        candidates = candidates[np.argsort(-similarities[candidates], kind="stable")]
+        return [
+            self.__items[i]
+            for i in candidates
+            if similarities[i] > similarity_threshold
+        ]
+
+    def __reserve(self, rows: int, dimensions: int) -> None:
+        capacity, current = self.__matrix.shape
+        if len(self.__ids) == 0 and current != dimensions:
+            capacity = 0
+        elif current != dimensions:
+            raise ValueError(
+                f"Embedding has {dimensions} dimensions, index has {current}"
+            )
+        if rows <= capacity:
+            return
+        matrix = np.zeros((max(rows, 2 * capacity, 16), dimensions), dtype=np.float32)
+        if self.__ids:
+            matrix[: len(self.__ids)] = self.__matrix[: len(self.__ids)]
+        self.__matrix = matrix
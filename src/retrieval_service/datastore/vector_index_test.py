@@ -0,0 +1,51 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from .vector_index import VectorIndex
+
+
+def test_search_ranks_by_cosine_similarity():
+    index: VectorIndex[str] = VectorIndex()
+    index.upsert(1, "east", [1.0, 0.0])
+    index.upsert(2, "north", [0.0, 2.0])
+    index.upsert(3, "north-east", [1.0, 1.0])
+    index.upsert(4, "none", None)
+
+    assert len(index) == 3
+    assert index.search([2.0, 0.1], 0.5, 3) == ["east", "north-east"]
+    assert index.search([2.0, 0.1], 0.5, 1) == ["east"]
+    assert index.search([0.0, 0.0], 0.5, 3) == []
+
+
+def test_upsert_and_remove_keep_rows_consistent():
+    index: VectorIndex[str] = VectorIndex()
+    for id in range(40):
+        index.upsert(id, f"item {id}", [1.0, float(id)])
+
+    index.remove(0)
+    index.remove(0)
+    index.upsert(39, "moved", [1.0, 0.0])
+    index.upsert(5, "dropped", None)
+
+    assert len(index) == 38
+    assert index.search([1.0, 0.0], 0.99, 1) == ["moved"]
+    assert "item 5" not in index.search([0.0, 1.0], -1.0, 40)
+
+    with pytest.raises(ValueError):
+        index.upsert(100, "wrong dimensions", [1.0, 0.0, 0.0])
+    index.clear()
+    index.upsert(100, "new dimensions", [1.0, 0.0, 0.0])
+    assert index.search([1.0, 0.0, 0.0], 0.5, 1) == ["new dimensions"]
@@ -12,7 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import ast
 import datetime
 from decimal import Decimal
 from typing import Optional
@@ -20,6 +19,14 @@ from typing import Optional
 from pydantic import BaseModel, ConfigDict, FieldValidationInfo, field_validator
 
 
+def parse_embedding(v: str) -> Optional[list[float]]:
+    """Parses a "[0.1, 0.2, ...]" embedding without evaluating it as Python."""
+    v = v.strip().strip("[]")
+    if not v:
+        return None
+    return [float(f) for f in v.split(",")]
+
+
 class Airport(BaseModel):
     id: int
     iata: str
@@ -78,8 +85,7 @@ class Amenity(BaseModel):
     @field_validator("embedding", mode="before")
     def validate(cls, v):
         if type(v) == str:
-            v = ast.literal_eval(v)
-            v = [float(f) for f in v]
+            v = parse_embedding(v)
         return v
 
 
@@ -105,3 +111,15 @@ class Ticket(BaseModel):
     arrival_airport: str
     departure_time: datetime.datetime
     arrival_time: datetime.datetime
+
+
+class Policy(BaseModel):
+    id: int
+    content: str
+    embedding: Optional[list[float]] = None
+
+    @field_validator("embedding", mode="before")
+    def validate(cls, v):
+        if type(v) == str:
+            v = parse_embedding(v)
+        return v
@@ -0,0 +1,118 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import asyncio
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import httpx
+import yaml
+
+import benchmark
+from app.app import AppConfig
+from datastore.providers import memory
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the retrieval service.")
+    parser.add_argument(
+        "--config",
+        help="YAML app config to benchmark; defaults to the in-memory datastore",
+    )
+    parser.add_argument(
+        "--load",
+        action="store_true",
+        help="import the generated dataset into the configured datastore first",
+    )
+    parser.add_argument(
+        "--url", help="benchmark a running service instead of an in-process app"
+    )
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    return parser.parse_args()
+
+
+def app_config(args: argparse.Namespace, dataset: benchmark.Dataset) -> AppConfig:
+    if args.config is None:
+        return AppConfig(
+            datastore=memory.Config(
+                kind="memory",
+                airports_ds_path=dataset.airports_ds_path,
+                amenities_ds_path=dataset.amenities_ds_path,
+                flights_ds_path=dataset.flights_ds_path,
+                policies_ds_path=dataset.policies_ds_path,
+            ),
+            embedding_backend="hashing",
+        )
+    with open(args.config, "r") as f:
+        config = yaml.safe_load(f)
+    # Keep the embeddings offline unless the config asks otherwise
+    config.setdefault("embedding_backend", "hashing")
+    return AppConfig.model_validate(config)
+
+
+@asynccontextmanager
+async def client(
+    args: argparse.Namespace, dataset: benchmark.Dataset
+) -> AsyncIterator[httpx.AsyncClient]:
+    if args.url is not None:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60) as c:
+            yield c
+        return
+    async with benchmark.serve(
+        app_config(args, dataset), dataset if args.load else None
+    ) as c:
+        yield c
+
+
+async def main() -> int:
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as out_dir:
+        dataset = benchmark.generate_dataset(
+            args.data_dir, out_dir, args.scale, args.seed
+        )
+        async with client(args, dataset) as c:
+            report = await benchmark.run_benchmark(
+                c,
+                benchmark.build_operations(dataset),
+                args.scale,
+                args.requests,
+                args.concurrency,
+                args.seed,
+            )
+
+    output = report.model_dump_json(indent=2)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+    # Latencies of failed requests say nothing about the route, so any
+    # non-2xx response fails the run.
+    failed = [name for name, stats in report.routes.items() if stats.errors]
+    if failed:
+        print(f"Non-2xx responses from: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -25,22 +25,19 @@ async def main():
     cfg = parse_config()
     ds = await datastore.create(cfg.datastore)
 
-    airports, amenities, flights = await ds.export_data()
-
-    await ds.close()
-
     airports_new_path = "../data/airport_dataset.csv.new"
     amenities_new_path = "../data/amenity_dataset.csv.new"
     flights_new_path = "../data/flights_dataset.csv.new"
 
-    await ds.export_dataset(
-        airports,
-        amenities,
-        flights,
-        airports_new_path,
-        amenities_new_path,
-        flights_new_path,
-    )
+    # Rows are streamed into the files, so tables may be larger than memory
+    try:
+        await ds.stream_dataset(
+            airports_new_path,
+            amenities_new_path,
+            flights_new_path,
+        )
+    finally:
+        await ds.close()
 
     print("database export done.")
 
@@ -12,24 +12,38 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import argparse
 import asyncio
 
 import datastore
 from app import parse_config
 
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load the datasets.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only apply the rows that changed instead of recreating the tables",
+    )
+    return parser.parse_args()
+
+
 async def main() -> None:
+    args = parse_args()
     airports_ds_path = "../data/airport_dataset.csv"
     amenities_ds_path = "../data/amenity_dataset.csv"
     flights_ds_path = "../data/flights_dataset.csv"
-    policies_ds_path = "../data/cymbalair_policy.csv"
 
     cfg = parse_config("config.yml")
     ds = await datastore.create(cfg.datastore)
-    airports, amenities, flights, policies = await ds.load_dataset(
-        airports_ds_path, amenities_ds_path, flights_ds_path, policies_ds_path
-    )
-    await ds.initialize_data(airports, amenities, flights, policies)
+    if args.incremental:
+        changes = await ds.sync_dataset(
+            airports_ds_path, amenities_ds_path, flights_ds_path
+        )
+        datastore.print_changes(changes)
+    else:
+        await ds.import_dataset(airports_ds_path, amenities_ds_path, flights_ds_path)
     await ds.close()
 
     print("database init done.")
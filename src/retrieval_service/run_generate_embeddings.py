@@ -13,60 +13,35 @@
 # limitations under the License.
 
 import asyncio
-import csv
-
-from langchain_google_vertexai import VertexAIEmbeddings
+import os
 
+import datastore
 import models
-from app import EMBEDDING_MODEL_NAME
+from app import EMBEDDING_MODEL_NAME, create_embeddings, parse_backend
 
 
 async def main() -> None:
-    embed_service = VertexAIEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    embed_service = create_embeddings(
+        parse_backend(os.environ.get("EMBEDDING_BACKEND", "vertexai")),
+        EMBEDDING_MODEL_NAME,
+    )
+
+    amenities_ds_path = "../data/amenity_dataset.csv"
+    amenities_new_path = "../data/amenity_dataset.csv.new"
 
     amenities: list[models.Amenity] = []
-    with open("../data/amenity_dataset.csv", "r") as f:
-        reader = csv.DictReader(f, delimiter=",")
-        for line in reader:
-            amenity = models.Amenity.model_validate(line)
+    async for chunk in datastore.read_dataset(amenities_ds_path, models.Amenity):
+        for amenity in chunk:
             if amenity.content:
                 amenity.embedding = embed_service.embed_query(amenity.content)
                 amenities.append(amenity)
 
     print("Completed embedding generation.")
 
-    with open("../data/amenity_dataset.csv.new", "w") as f:
-        col_names = [
-            "id",
-            "name",
-            "description",
-            "location",
-            "terminal",
-            "category",
-            "hour",
-            "sunday_start_hour",
-            "sunday_end_hour",
-            "monday_start_hour",
-            "monday_end_hour",
-            "tuesday_start_hour",
-            "tuesday_end_hour",
-            "wednesday_start_hour",
-            "wednesday_end_hour",
-            "thursday_start_hour",
-            "thursday_end_hour",
-            "friday_start_hour",
-            "friday_end_hour",
-            "saturday_start_hour",
-            "saturday_end_hour",
-            "content",
-            "embedding",
-        ]
-        writer = csv.DictWriter(f, col_names, delimiter=",")
-        writer.writeheader()
-        for amenity in amenities:
-            writer.writerow(amenity.model_dump())
+    # The format follows the extension; CSV embeddings also go to a sidecar
+    datastore.save_dataset(amenities_new_path, models.Amenity, amenities)
 
-    print("Wrote data to CSV.")
+    print(f"Wrote data to {amenities_new_path}.")
 
 
 if __name__ == "__main__":
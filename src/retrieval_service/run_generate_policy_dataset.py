@@ -12,16 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import time
 
 import pandas as pd
-from langchain_google_vertexai import VertexAIEmbeddings
 from langchain_text_splitters import (
     MarkdownHeaderTextSplitter,
     RecursiveCharacterTextSplitter,
 )
 
-from app import EMBEDDING_MODEL_NAME
+import datastore
+import models
+from app import EMBEDDING_MODEL_NAME, create_embeddings, parse_backend
 
 
 def main() -> None:
@@ -29,7 +31,12 @@ def main() -> None:
 
     chunked = text_split(_POLICY)
     data_embeddings = vectorize(chunked)
-    data_embeddings.to_csv(policies_ds_path, index=True, index_label="id")
+    policies = [
+        models.Policy(id=id, **policy)
+        for id, policy in zip(data_embeddings.index, data_embeddings.to_dict("records"))
+    ]
+    # The format follows the extension; CSV embeddings also go to a sidecar
+    datastore.save_dataset(policies_ds_path, models.Policy, policies)
 
     print("Done generating policy dataset.")
 
@@ -53,7 +60,10 @@ def text_split(data):
 
 
 def vectorize(chunked):
-    embed_service = VertexAIEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    embed_service = create_embeddings(
+        parse_backend(os.environ.get("EMBEDDING_BACKEND", "vertexai")),
+        EMBEDDING_MODEL_NAME,
+    )
 
     def retry_with_backoff(func, *args, retry_delay=5, backoff_factor=2, **kwargs):
         max_attempts = 3